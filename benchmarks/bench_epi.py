@@ -0,0 +1,102 @@
+"""Benchmarks for outbreak simulation and regression in `src.models.epi`."""
+
+from collections import OrderedDict
+
+import numpy as np
+import xarray as xr
+
+from src.models import epi
+
+
+class SimulateAndRegress:
+    params = ([10, 100], [30, 60], [[0], list(range(8)), list(range(15))])
+    param_names = ["n_samples", "n_days", "reg_lag_days"]
+    timeout = 600
+
+    def run(self, n_samples, n_days, reg_lag_days):
+        epi.simulate_and_regress(
+            1e6,
+            0.4,
+            [-0.05, -0.1, -0.2],
+            [[], [], []],
+            [5, n_days // 2],
+            n_days,
+            4,
+            n_samples,
+            ["I", "EI", "IR", "EIR"],
+            reg_lag_days,
+            [0.2, 0.33],
+            10,
+            sigma_to_test=[0.2, 0.33],
+            measurement_noise_on="normal",
+            measurement_noise_sd=0.05,
+            beta_noise_on="exponential",
+            gamma_noise_on="normal",
+            gamma_noise_sd=0.01,
+            sigma_noise_on="normal",
+            sigma_noise_sd=0.03,
+            kind="SEIR",
+            random_end=True,
+        )
+
+    def time_simulate_and_regress(self, *args):
+        self.run(*args)
+
+    def peakmem_simulate_and_regress(self, *args):
+        self.run(*args)
+
+
+class RunModels:
+    params = ([20, 200], [60 * 24])
+    param_names = ["n_samples", "n_steps"]
+
+    def setup(self, n_samples, n_steps):
+        coords = OrderedDict(
+            sample=range(n_samples),
+            t=np.arange(n_steps) / 24,
+            gamma=[0.05, 0.2, 0.33],
+            sigma=[0.2, 0.33, 0.5],
+        )
+        shape = tuple(len(v) for v in coords.values())
+        rng = np.random.RandomState(0)
+
+        def rate(scale):
+            return xr.DataArray(
+                rng.exponential(scale, shape), coords=coords, dims=coords.keys()
+            )
+
+        self.ds = xr.Dataset(
+            {
+                "beta_stoch": rate(0.02),
+                "gamma_stoch": rate(0.01),
+                "sigma_stoch": rate(0.01),
+            }
+        )
+
+    def time_run_SIR(self, *args):
+        epi.run_SIR(1e-6, 0, self.ds)
+
+    def time_run_SEIR(self, *args):
+        epi.run_SEIR(1e-6, 0, 0, self.ds)
+
+
+class InitPolicyDummies:
+    params = ([100, 1000], [3, 10], [[], [0.5, 0.75]])
+    param_names = ["n_samples", "n_policies", "lag"]
+
+    def setup(self, n_samples, n_policies, lag):
+        self.t = np.linspace(0, 60, 60 * 24 + 1)
+        self.policy_ds = xr.Dataset(
+            coords={
+                "policy": [f"p{i+1}" for i in range(n_policies)],
+                "time": ["start", "end"],
+                "lag_num": range(len(lag)),
+            },
+            data_vars={
+                "lag": (("policy", "lag_num"), [lag] * n_policies),
+                "interval": (("time",), [5, 5 + 3 * n_policies]),
+            },
+        )
+
+    def time_init_policy_dummies(self, n_samples, *args):
+        epi.init_policy_dummies(self.policy_ds, n_samples, self.t, random_end=True)
@@ -0,0 +1,18 @@
+"""Benchmarks for removal-rate (gamma) estimation in ``code/models/get_gamma.py``."""
+
+import src.utils as cutil
+
+from .common import load_script_module, make_gamma_panel
+
+get_gamma = load_script_module(cutil.CODE / "models" / "get_gamma.py", "get_gamma")
+
+
+class EstimateGamma:
+    params = ([20, 200, 2000], [60, 120])
+    param_names = ["n_units", "n_days"]
+
+    def setup(self, n_units, n_days):
+        self.df = make_gamma_panel(n_units, n_days)
+
+    def time_estimate_gamma(self, *args):
+        get_gamma.estimate_gamma(self.df)
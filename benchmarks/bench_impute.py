@@ -0,0 +1,21 @@
+"""Benchmarks for imputation of cumulative counts in `src.impute`."""
+
+from src import impute as cimpute
+
+from .common import make_cumulative_panel
+
+
+class ImputeCumulativeDF:
+    params = ([10, 100, 1000], [60, 240])
+    param_names = ["n_units", "n_days"]
+
+    def setup(self, n_units, n_days):
+        self.df = make_cumulative_panel(n_units, n_days)
+
+    def time_impute_cumulative_df(self, *args):
+        cimpute.impute_cumulative_df(
+            self.df.copy(),
+            "cum_confirmed_cases",
+            "cum_confirmed_cases_imputed",
+            "adm_name",
+        )
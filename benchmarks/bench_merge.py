@@ -0,0 +1,81 @@
+"""Benchmarks for assigning policies to case panels in `src.merge`."""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+from src import merge as cmerge
+from src import pop as cpop
+from src import synthetic
+
+
+class AssignPoliciesToPanel:
+    params = ([(5, 2), (10, 5), (20, 10)], [30, 90], [5, 15], ["ITA", "USA"])
+    param_names = ["n_adm1_x_n_adm2", "n_days", "n_policies", "method"]
+    timeout = 900
+
+    def setup(self, n_units, n_days, n_policies, method):
+        n_adm1, n_adm2 = n_units
+        adm_tables, self.cases, self.policies = synthetic.make_panel_inputs(
+            n_adm1, n_adm2, n_days, n_policies=n_policies, density=0.5
+        )
+        self.adm_dir = tempfile.mkdtemp()
+        synthetic.write_adm_tables(adm_tables, self.adm_dir)
+        self.old_adm_dir = cpop.ADM_DIR
+        cpop.ADM_DIR = Path(self.adm_dir)
+
+    def teardown(self, *args):
+        cpop.ADM_DIR = self.old_adm_dir
+        shutil.rmtree(self.adm_dir)
+
+    def run(self, n_units, n_days, n_policies, method):
+        cmerge.assign_policies_to_panel(
+            self.cases, self.policies, 2, get_latlons=False, method=method
+        )
+
+    def time_assign_policies_to_panel(self, *args):
+        self.run(*args)
+
+    def peakmem_assign_policies_to_panel(self, *args):
+        self.run(*args)
+
+
+class AssignPoliciesToCountyPanel:
+    """US-scale county panels: about 3,000 adm2 units, with names repeated across adm1
+    units and a few adm3 (city) policies"""
+
+    params = ([100, 300],)
+    param_names = ["n_days"]
+    timeout = 1800
+
+    def setup(self, n_days):
+        adm_tables, self.cases, self.policies = synthetic.make_panel_inputs(
+            50,
+            60,
+            n_days,
+            n_adm3=1,
+            cases_level=2,
+            unique_names=False,
+            n_policies=15,
+            density=0.5,
+            level_weights=[1, 1, 0.05, 0.05],
+        )
+        self.adm_dir = tempfile.mkdtemp()
+        synthetic.write_adm_tables(adm_tables, self.adm_dir)
+        self.old_adm_dir = cpop.ADM_DIR
+        cpop.ADM_DIR = Path(self.adm_dir)
+
+    def teardown(self, *args):
+        cpop.ADM_DIR = self.old_adm_dir
+        shutil.rmtree(self.adm_dir)
+
+    def run(self, n_days):
+        cmerge.assign_policies_to_panel(
+            self.cases, self.policies, 2, get_latlons=False, method="USA"
+        )
+
+    def time_assign_policies_to_panel(self, *args):
+        self.run(*args)
+
+    def peakmem_assign_policies_to_panel(self, *args):
+        self.run(*args)
@@ -0,0 +1,64 @@
+"""
+Synthetic inputs shared by the benchmark suite.
+
+All generators are seeded so that every commit is benchmarked on identical inputs.
+"""
+
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+
+START_DATE = "2020-02-15"
+
+
+def load_script_module(path, name):
+    """Import one of the pipeline scripts (which are not part of the ``src`` package)
+    as a module."""
+    spec = importlib.util.spec_from_file_location(name, str(path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_cumulative_panel(n_units, n_days, seed=0):
+    """Long panel of cumulative counts with occasional drops and missing values, as
+    fed to `src.impute.impute_cumulative_df`."""
+    rng = np.random.RandomState(seed)
+    counts = rng.poisson(5, (n_units, n_days)).cumsum(axis=1).astype(float)
+    drops = rng.uniform(size=counts.shape) < 0.05
+    counts[drops] = counts[drops] * 0.8
+    counts[rng.uniform(size=counts.shape) < 0.05] = np.nan
+    return pd.DataFrame(
+        {
+            "adm_name": np.repeat([f"unit_{i}" for i in range(n_units)], n_days),
+            "date": np.tile(pd.date_range(START_DATE, periods=n_days), n_units),
+            "cum_confirmed_cases": counts.flatten(),
+        }
+    )
+
+
+def make_gamma_panel(n_units, n_days, seed=0):
+    """Panel in the format expected by ``get_gamma.estimate_gamma``, with half of the
+    units labelled as CHN and half as KOR."""
+    rng = np.random.RandomState(seed)
+    shape = (n_units, n_days)
+    confirmed = rng.poisson(20, shape).cumsum(axis=1)
+    deaths = (confirmed * rng.uniform(0, 0.02, shape)).astype(int)
+    recoveries = (
+        np.maximum.accumulate(confirmed * rng.uniform(0, 0.5, shape), axis=1)
+    ).astype(int)
+    names = [f"{'CHN' if i % 2 else 'KOR'}_unit_{i}" for i in range(n_units)]
+    index = pd.MultiIndex.from_product(
+        [names, pd.date_range(START_DATE, periods=n_days)], names=["name", "date"]
+    )
+    return pd.DataFrame(
+        {
+            "cum_confirmed_cases": confirmed.flatten(),
+            "cum_deaths": deaths.flatten(),
+            "cum_recoveries": recoveries.flatten(),
+            "active_cases": (confirmed - deaths - recoveries).flatten(),
+        },
+        index=index,
+    )
@@ -1,61 +1,15 @@
+import argparse
 from os.path import join
 
 import numpy as np
 import pandas as pd
 
-import geopandas as gpd
 import matplotlib.pyplot as plt
+from src import geo as cgeo
+from src import impute as cimpute
 from src import utils as cutil
 
 
-def convert_non_monotonic_to_nan(array):
-    """Converts a numpy array to a monotonically increasing one.
-
-    Args:
-        array (numpy.ndarray [N,]): input array
-
-    Returns:
-        numpy.ndarray [N,]: some values marked as missing, all non-missing
-            values should be monotonically increasing
-
-    Usage:
-        >>> convert_non_monotonic_to_nan(np.array([0, 0, 5, 3, 4, 6, 3, 7, 6, 7, 8]))
-        np.array([ 0.,  0., np.nan,  3., np.nan, np.nan,  3., np.nan,  6.,  7.,  8.])
-    """
-    keep = np.arange(0, len(array))
-    is_monotonic = False
-    while not is_monotonic:
-        is_monotonic_array = np.hstack(
-            (array[keep][1:] >= array[keep][:-1], np.array(True))
-        )
-        is_monotonic = is_monotonic_array.all()
-        keep = keep[is_monotonic_array]
-    out_array = np.full_like(array.astype(np.float), np.nan)
-    out_array[keep] = array[keep]
-    return out_array
-
-
-def log_interpolate(array):
-    """Interpolates assuming log growth.
-
-    Args:
-        array (numpy.ndarray [N,]): input array with missing values
-
-    Returns:
-        numpy.ndarray [N,]: all missing values will be filled
-
-    Usage:
-        >>> log_interpolate(np.array([0, np.nan, 2, np.nan, 4, 6, np.nan, 7, 8]))
-        np.array([0, 0, 2, 3, 4, 6, 7, 7, 8])
-    """
-    idx = np.arange(0, len(array))
-    log_array = np.log(array.astype(np.float32) + 1e-1)
-    interp_array = np.interp(
-        x=idx, xp=idx[~np.isnan(array)], fp=log_array[~np.isnan(array)]
-    )
-    return np.round(np.exp(interp_array)).astype(int)
-
-
 DATA_CHINA_RAW = cutil.DATA_RAW / "china"
 DATA_CHINA_INTERIM = cutil.DATA_INTERIM / "china"
 health_dxy_file = join(DATA_CHINA_RAW, "DXYArea.csv")
@@ -64,10 +18,18 @@ policy_file = join(DATA_CHINA_INTERIM, "CHN_policy_data_sources.csv")
 pop_file = join(DATA_CHINA_RAW, "china_city_pop.csv")
 output_file = cutil.DATA_PROCESSED / "adm2" / "CHN_processed.csv"
 match_file = join(DATA_CHINA_RAW, "match_china_city_name_w_adm2.csv")
-shp_file = cutil.DATA_INTERIM / "adm" / "adm2" / "adm2.shp"
 
 end_date_file = cutil.CODE / "data" / "cutoff_dates.csv"
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    help="only compute the dates and cities missing from the existing processed "
+    "dataset",
+)
+args = parser.parse_args()
+
 end_date = pd.read_csv(end_date_file)
 (end_date,) = end_date.loc[end_date["tag"] == "default", "end_date"].values
 end_date = str(end_date)
@@ -320,23 +282,33 @@ df.loc[:, "adm0_name"] = "CHN"
 df = pd.concat([df, df_jan_merged], sort=False)
 
 # createa balanced panel
-adm = df.loc[:, ["adm0_name", "adm1_name", "adm2_name"]].drop_duplicates()
+adm_cols = ["adm0_name", "adm1_name", "adm2_name"]
+health_cols = ["cum_confirmed_cases", "cum_deaths", "cum_recoveries"]
+adm = df.loc[:, adm_cols].drop_duplicates()
 days = pd.date_range(start="20200110", end=end_date)
-adm_days = pd.concat([adm.assign(date=d) for d in days])
 print(f"Sample: {len(adm)} cities; {len(days)} days.")
-df = pd.merge(
-    adm_days, df, how="left", on=["adm0_name", "adm1_name", "adm2_name", "date"]
-)
 
-# fill N/A for the first day
-df.loc[df["date"] == pd.Timestamp("2020-01-10"), :] = df.loc[
-    df["date"] == pd.Timestamp("2020-01-10"), :
-].fillna(0)
 
-# forward fill
-df = df.set_index(["adm0_name", "adm1_name", "adm2_name"]).sort_index()
-for _, row in adm.iterrows():
-    df.loc[tuple(row), :] = df.loc[tuple(row), :].fillna(method="ffill")
+def cross_join(adm, days):
+    return adm.iloc[np.repeat(np.arange(len(adm)), len(days))].assign(
+        date=np.tile(days, len(adm))
+    )
+
+
+def fill_health_panel(adm_days, health):
+    """Health variables of each city and date of `adm_days`, forward-filled from the
+    rows of `health`. Missing values on the first day are set to 0."""
+    panel = pd.merge(adm_days, health, how="left", on=adm_cols + ["date"])
+
+    # fill N/A for the first day
+    panel.loc[panel["date"] == pd.Timestamp("2020-01-10"), :] = panel.loc[
+        panel["date"] == pd.Timestamp("2020-01-10"), :
+    ].fillna(0)
+
+    # forward fill
+    panel = panel.set_index(adm_cols).sort_index()
+    return panel.groupby(level=[0, 1, 2], sort=False).ffill()
+
 
 ## Load and clean policy data
 
@@ -409,64 +381,144 @@ df_policy = df_policy.set_index(
     ["adm0_name", "adm1_name", "adm2_name", "policy"]
 ).unstack("policy")
 
-# prepare to merge with multi index
-adm_days.set_index(["adm0_name", "adm1_name", "adm2_name"], inplace=True)
-adm_days.columns = pd.MultiIndex.from_tuples([("date", "")])
 
-# merge to create balanced panel
-df_policy = pd.merge(
-    adm_days, df_policy, how="left", on=["adm0_name", "adm1_name", "adm2_name"]
-)
+def get_policy_panel(adm_days):
+    """Policy dummies of each city and date of `adm_days`"""
+    # prepare to merge with multi index
+    panel = adm_days.set_index(adm_cols)
+    panel.columns = pd.MultiIndex.from_tuples([("date", "")])
+
+    # merge to create balanced panel
+    panel = pd.merge(panel, df_policy, how="left", on=adm_cols)
+
+    # fill N/As for dates
+    panel = panel.fillna(pd.Timestamp("2021-01-01"))
+
+    # convert to dummies
+    for policy in policy_set:
+        panel.loc[:, (policy, "")] = (
+            panel.loc[:, ("date", "")] >= panel.loc[:, ("date_start", policy)]
+        ) & (panel.loc[:, ("date", "")] <= panel.loc[:, ("date_end", policy)])
+    # discard intermediate variables
+    panel = panel[["date"] + policy_set]
+    # flatten the column index
+    panel.columns = panel.columns.get_level_values(0)
+    # convert data type
+    panel.loc[:, policy_set] = panel.loc[:, policy_set].astype(int)
+    return panel
+
+
+def build_panel(adm_days, health):
+    """Health, policy and testing variables of each city and date of `adm_days`,
+    before imputation"""
+    panel = pd.merge(
+        fill_health_panel(adm_days, health),
+        get_policy_panel(adm_days),
+        how="inner",
+        on=adm_cols + ["date"],
+    )
 
-# fill N/As for dates
-df_policy = df_policy.fillna(pd.Timestamp("2021-01-01"))
-
-# convert to dummies
-for policy in policy_set:
-    df_policy.loc[:, (policy, "")] = (
-        df_policy.loc[:, ("date", "")] >= df_policy.loc[:, ("date_start", policy)]
-    ) & (df_policy.loc[:, ("date", "")] <= df_policy.loc[:, ("date_end", policy)])
-# discard intermediate variables
-df_policy = df_policy[["date"] + policy_set]
-# flatten the column index
-df_policy.columns = df_policy.columns.get_level_values(0)
-# convert data type
-df_policy.loc[:, policy_set] = df_policy.loc[:, policy_set].astype(int)
+    ## Merge with testing policies
+
+    # merge with testing policies
+    # source:
+    # https://english.kyodonews.net/news/2020/02/6982cc1e130f-china-records-2-straight-days-of-fewer-than-1000-new-covid-19-cases.html
+    # https://www.worldometers.info/coronavirus/how-to-interpret-feb-12-case-surge/
+    # https://www.medrxiv.org/content/10.1101/2020.03.23.20041319v1.full.pdf
+    panel.loc[:, "testing_regime"] = (
+        (panel["date"] > pd.Timestamp("2020-01-17")).astype(int)
+        + (panel["date"] > pd.Timestamp("2020-01-27")).astype(int)
+        + (panel["date"] > pd.Timestamp("2020-02-05")).astype(int)
+        + (panel["date"] > pd.Timestamp("2020-02-12")).astype(int)
+        + (panel["date"] > pd.Timestamp("2020-02-19")).astype(int)
+        + (panel["date"] > pd.Timestamp("2020-03-04")).astype(int)
+    )
+    return panel
 
-df = pd.merge(
-    df, df_policy, how="inner", on=["adm0_name", "adm1_name", "adm2_name", "date"]
-)
 
-## Merge with testing policies
-
-# merge with testing policies
-# source:
-# https://english.kyodonews.net/news/2020/02/6982cc1e130f-china-records-2-straight-days-of-fewer-than-1000-new-covid-19-cases.html
-# https://www.worldometers.info/coronavirus/how-to-interpret-feb-12-case-surge/
-# https://www.medrxiv.org/content/10.1101/2020.03.23.20041319v1.full.pdf
-df.loc[:, "testing_regime"] = (
-    (df["date"] > pd.Timestamp("2020-01-17")).astype(int)
-    + (df["date"] > pd.Timestamp("2020-01-27")).astype(int)
-    + (df["date"] > pd.Timestamp("2020-02-05")).astype(int)
-    + (df["date"] > pd.Timestamp("2020-02-12")).astype(int)
-    + (df["date"] > pd.Timestamp("2020-02-19")).astype(int)
-    + (df["date"] > pd.Timestamp("2020-03-04")).astype(int)
-)
+def impute_health(panel):
+    """Drop and impute non monotonic observations of each city in `panel`"""
+    city_ids = panel.groupby(level=[0, 1, 2], sort=False).ngroup().values
+    for col in health_cols:
+        panel[col] = cimpute.convert_non_monotonic_to_nan_by_group(panel[col], city_ids)
+        panel[col + "_imputed"] = cimpute.log_interpolate_by_group(panel[col], city_ids)
+    return panel
+
+
+def update_panel(previous, health):
+    """Extend the processed panel `previous` with the dates and cities it is missing
+
+    The last processed day of each city is the starting point of its new dates: its
+    health variables are forward-filled, and it is the earliest value kept by the
+    monotonicity check of the new dates (the last day of a city is always kept). The
+    cities where a later value falls below it are rebuilt from scratch, as are new
+    cities. Variables of dates already in `previous` are assumed not to have changed.
+
+    Args:
+        previous (pandas.DataFrame): the processed dataset, as saved by this script
+        health (pandas.DataFrame): health data of all cities and dates
+
+    Returns:
+        pandas.DataFrame: the imputed panel of all cities and dates, indexed by city
+    """
+    previous = previous.assign(date=pd.to_datetime(previous["date"]))
+    previous = previous[previous["date"] <= days[-1]].set_index(adm_cols)
+    panel_cols = (
+        ["date"]
+        + health_cols
+        + policy_set
+        + ["testing_regime"]
+        + [col + "_imputed" for col in health_cols]
+    )
+    if not set(panel_cols) <= set(previous.columns):
+        print("Previous panel is missing some variables, rebuilding it")
+        return impute_health(build_panel(cross_join(adm, days), health))
+
+    last_day = previous["date"].max()
+    print(f"Updating panel from {last_day.date()}")
+
+    in_previous = pd.MultiIndex.from_frame(adm).isin(previous.index.unique())
+    last = previous.loc[previous["date"] == last_day, ["date"] + health_cols]
+    updated = build_panel(
+        cross_join(adm[in_previous], days[days >= last_day]),
+        pd.concat([last.reset_index(), health[health["date"] > last_day]]),
+    )
+
+    # cities where a new value is below that of the last processed day
+    is_new_day = (updated["date"] > last_day).values
+    later_min = updated[is_new_day].groupby(level=[0, 1, 2])[health_cols].min()
+    last_vals = updated.loc[~is_new_day, health_cols]
+    is_rebuilt = (last_vals > later_min.reindex(last_vals.index)).any(axis=1)
+    rebuilt_adm = pd.MultiIndex.from_frame(adm).isin(last_vals.index[is_rebuilt.values])
+    print(
+        f"New cities: {(~in_previous).sum()}; rebuilt cities: {rebuilt_adm.sum()}; "
+        f"new days: {(days > last_day).sum()}"
+    )
+
+    is_updated = ~updated.index.isin(last_vals.index[is_rebuilt.values])
+    updated = impute_health(updated[is_updated])
+    updated = updated[updated["date"] > last_day]
+    rebuilt = impute_health(
+        build_panel(cross_join(adm[~in_previous | rebuilt_adm], days), health)
+    )
+
+    kept = previous.index.isin(
+        pd.MultiIndex.from_frame(adm[in_previous & ~rebuilt_adm])
+    )
+    panel = pd.concat([previous.loc[kept, updated.columns], updated, rebuilt])
+    panel = panel.reset_index().sort_values(adm_cols + ["date"], kind="mergesort")
+    return panel.set_index(adm_cols)
+
+
+if args.incremental and output_file.exists():
+    df = update_panel(pd.read_csv(output_file), df)
+else:
+    df = impute_health(build_panel(cross_join(adm, days), df))
 
 # df.describe(include='all')  # looks fine
 
 ## Multiple sanity checks, Save
 
-# drop/impute non monotonic observations
-for col in ["cum_confirmed_cases", "cum_deaths", "cum_recoveries"]:
-    for _, row in adm.iterrows():
-        df.loc[tuple(row), col] = convert_non_monotonic_to_nan(
-            df.loc[tuple(row), col].values
-        )
-        df.loc[tuple(row), col + "_imputed"] = log_interpolate(
-            df.loc[tuple(row), col].values
-        )
-
 # add city id
 df = pd.merge(
     df,
@@ -519,11 +571,9 @@ df.loc[:, "active_cases_imputed"] = (
 )
 
 # merge with lon lat
-df_shp = gpd.read_file(shp_file)
+df_shp = cgeo.load_adm_centroids(2, "CHN")
 df_match = pd.read_csv(match_file)
 
-df_shp = df_shp.loc[df_shp["adm0_name"] == "CHN", :]
-
 df_shp = pd.merge(
     df_shp,
     df_match,
@@ -27,10 +27,18 @@ parser.add_argument(
 parser.add_argument(
     "--p", dest="p", action="store_true", help="print out print statements"
 )
-parser.set_defaults(r=True, p=False)
+parser.add_argument(
+    "--incremental",
+    dest="incremental",
+    action="store_true",
+    help="only compute policy variables for dates and adm-units missing from the "
+    "existing processed datasets",
+)
+parser.set_defaults(r=True, p=False, incremental=False)
 args = parser.parse_args()
 reload_raw = args.r
 print_stuff = args.p
+incremental = args.incremental
 
 # #### Define paths
 
@@ -159,13 +167,10 @@ def process_raw_and_interim_health():
         ].sum()
 
         # Compute cumulative cases in the Adm1 dataset by mapping to totals from Adm2 dataset
-        def get_province_total(region_row):
-            return adm1_cases_from_provinces.loc[
-                region_row["date"], region_row["adm1_name"]
-            ]
-
         # This sum should match each adm1-level total for each day, except the first day in the dataset
-        adm1_province_totals = adm1_cases.apply(get_province_total, axis=1)
+        adm1_province_totals = adm1_cases_from_provinces.reindex(
+            pd.MultiIndex.from_frame(adm1_cases[["date", "adm1_name"]])
+        ).values
 
         # Compute DataFrame mapping adm1 names to first-day case totals that are missing in `adm2_cases`
         day1_cases = adm1_cases[
@@ -182,7 +187,7 @@ def process_raw_and_interim_health():
         # Set cum_confirmed_cases of "Unknown" adm2 rows to each corresponding adm1 total on day 1
         adm2_cases.loc[replace_day1_mask, "cum_confirmed_cases"] = adm2_cases.loc[
             replace_day1_mask, "adm1_name"
-        ].apply(lambda x: day1_cases.loc[x])
+        ].map(day1_cases["cum_confirmed_cases"])
 
         # Check that all regions with positive cases on day 1 are accounted for
         adm2_cases[
@@ -211,33 +216,35 @@ def process_raw_and_interim_health():
 
         # Replace missing values in `adm_cases` to null. These missing values are tabulated in the source data
         # as the value of that variable on the previous non-missing day, which can skew analysis of growth rates
-        def fill_missing_as_null(adm_cases, date, adm_name, adm_col):
-
+        def is_missing(adm_cases, days_missing, adm_col):
+            if len(days_missing) == 0:
+                return np.zeros(len(adm_cases), dtype=bool)
+            dates, adm_names = zip(*days_missing)
+            return pd.MultiIndex.from_arrays(
+                [adm_cases["date"], adm_cases[adm_col]]
+            ).isin(list(zip(pd.to_datetime(dates), adm_names)))
+
+        def fill_missing_as_null(adm_cases, missing):
             # Get all cumulative columns
             cum_cols = [
                 col for col in adm_cases.columns if col.startswith(cumulative_prefix)
             ]
 
             # Replace values known to be missing with np.nan
-            for col in cum_cols:
-                adm_cases.loc[
-                    ((adm_cases["date"] == date) & (adm_cases[adm_col] == adm_name)),
-                    col,
-                ] = np.nan
-
+            adm_cases.loc[missing, cum_cols] = np.nan
             return adm_cases
 
         # Fill in nulls for missing adm1 data, in the adm1 dataset
-        for date, adm1 in adm1_days_missing:
-            adm1_cases = fill_missing_as_null(adm1_cases, date, adm1, "adm1_name")
-
-        # Fill in nulls for missing adm1 data, in the adm2 dataset
-        for date, adm1 in adm1_days_missing:
-            adm2_cases = fill_missing_as_null(adm2_cases, date, adm1, "adm1_name")
+        adm1_cases = fill_missing_as_null(
+            adm1_cases, is_missing(adm1_cases, adm1_days_missing, "adm1_name")
+        )
 
-        # Fill in nulls for missing adm2 data, in the adm2 dataset
-        for date, adm2 in adm2_days_missing:
-            adm2_cases = fill_missing_as_null(adm2_cases, date, adm2, "adm2_name")
+        # Fill in nulls for missing adm1 and adm2 data, in the adm2 dataset
+        adm2_cases = fill_missing_as_null(
+            adm2_cases,
+            is_missing(adm2_cases, adm1_days_missing, "adm1_name")
+            | is_missing(adm2_cases, adm2_days_missing, "adm2_name"),
+        )
 
         return adm1_cases, adm2_cases
 
@@ -325,6 +332,12 @@ def read_policies():
     return policies
 
 
+def load_previous_panel(path_processed):
+    if incremental and path_processed.exists():
+        return pd.read_csv(path_processed)
+    return None
+
+
 def merge_health_and_policies(adm1_cases, adm2_cases, policies):
 
     # Filter out rows where adm1 is known but adm2 is unknown
@@ -358,10 +371,22 @@ def merge_health_and_policies(adm1_cases, adm2_cases, policies):
 
     # Assign policy indicators
     adm1_cases = cmerge.assign_policies_to_panel(
-        adm1_cases, policies, 1, get_latlons=False
+        adm1_cases,
+        policies,
+        1,
+        get_latlons=False,
+        n_jobs=-1,
+        intensity_cache_path=cmerge.default_intensity_cache_path,
+        previous_panel=load_previous_panel(path_processed_region),
     )
     adm2_cases = cmerge.assign_policies_to_panel(
-        adm2_cases, policies, 2, get_latlons=False
+        adm2_cases,
+        policies,
+        2,
+        get_latlons=False,
+        n_jobs=-1,
+        intensity_cache_path=cmerge.default_intensity_cache_path,
+        previous_panel=load_previous_panel(path_processed_province),
     )
 
     check_against_template(adm1_cases, adm2_cases)
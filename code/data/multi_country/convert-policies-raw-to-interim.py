@@ -47,101 +47,193 @@ op_dict = {
 }
 
 
-def is_already_in_df(adm1_name, adm2_name, dst_policy, df):
-    # Assuming that any location with a policy end_date is specified at the adm2 level--true as of 5/13
-    found = (
-        (df["policy"] == dst_policy)
-        & (df["adm1_name"] == adm1_name)
-        & (df["adm2_name"] == adm2_name)
-    )
-    return found.sum() > 0
+def select_policies(src_policy, op_str, src_val, country_code):
+    """Function selecting the rows of a policy DataFrame that imply other policies
+    under a (non-USA) rule"""
+
+    # Get operator function from operator string
+    op = op_dict[op_str]
+
+    def select(df):
+        mask = df["policy"] == src_policy
+        mask = (mask) & (df["optional"] != "Y")
+        if country_code not in countries_wo_intensity:
+            mask = (mask) & (op(df["policy_intensity"], src_val))
+        return mask.values
+
+    return select
 
 
-def apply_rule(df, src_policy, op_str, src_val, dst_rule, country_code):
+def imply_policy(dst_rule, country_code):
+    """Function turning copies of source rows into the rows implied by `dst_rule`"""
 
     dst_policy, dst_val, *dst_args = dst_rule
 
-    # Get operator function from operator string
-    op = op_dict[op_str]
+    def imply(pcopy):
+        pcopy["policy"] = dst_policy
+        pcopy["implied_policy"] = True
+        if dst_policy == "no_gathering" and len(dst_args) > 0:
+            pcopy["no_gathering_size"] = dst_args[0]
 
-    if print_logs:
-        print(
-            f"{country_code}: where {src_policy} {op_str} {src_val}, set {dst_policy} = {dst_val}"
-        )
-
-    mask = df["policy"] == src_policy
-    mask = (mask) & (df["optional"] != "Y")
-    if country_code not in countries_wo_intensity:
-        mask = (mask) & (op(df["policy_intensity"], src_val))
-
-    pcopy = df[mask].copy()
-
-    if country_code == "CHN":
-        already_in_df_mask = pcopy.apply(
-            lambda row: is_already_in_df(
-                row["adm1_name"], row["adm2_name"], dst_policy, df
-            ),
-            axis=1,
-        )
-        pcopy = pcopy[~already_in_df_mask].copy()
-
-    pcopy["policy"] = dst_policy
-    pcopy["implied_policy"] = True
-    if dst_policy == "no_gathering" and len(dst_args) > 0:
-        pcopy["no_gathering_size"] = dst_args[0]
-
-    if country_code not in countries_wo_intensity:
-        pcopy["policy_intensity"] = dst_val
-
-    df = pd.concat([df, pcopy], ignore_index=True).sort_values(
-        "date_start", ascending=True
-    )
+        if country_code not in countries_wo_intensity:
+            pcopy["policy_intensity"] = dst_val
+        return pcopy
 
-    return df
+    return imply
 
 
-def apply_usa_rule(df, src_policy, dst_policies):
+def select_usa_policies(src_policy, intensity_cols):
     src_category, src_group = src_policy.split(".")
 
-    intensity_cols = [c for c in df.columns if c.startswith("intensity_group")]
-    src_category_mask = df["policy"] == src_category
+    def select(df):
+        src_group_mask = np.zeros(len(df), dtype=bool)
+        for c in intensity_cols:
+            src_group_mask = (src_group_mask) | (df[c] == src_group).values
+        return (df["policy"] == src_category).values & src_group_mask
 
-    psrc = df[src_category_mask].copy()
+    return select
 
-    src_group_mask = np.zeros_like(psrc.columns[0], dtype=bool)
-    for c in intensity_cols:
-        src_group_mask = (src_group_mask) | (psrc[c] == src_group)
 
-    psrc = psrc[src_group_mask].copy()
+def imply_usa_policy(dst_policy, intensity_cols):
+    dst_category, dst_group = dst_policy.split(".")
 
-    for dst_policy in dst_policies:
-        dst_category, dst_group = dst_policy.split(".")
-        pcopy = psrc.copy()
+    def imply(pcopy):
         pcopy["policy"] = dst_category
         pcopy["implied_policy"] = True
         pcopy[intensity_cols[0]] = dst_group
         for c in intensity_cols[1:]:
             pcopy[c] = np.nan
+        return pcopy
 
-        df = pd.concat([df, pcopy], ignore_index=True).sort_values(
-            "date", ascending=True
-        )
+    return imply
 
-    return df
 
+def compile_implies(implies, country_code, intensity_cols=None):
+    """Compile the implication rules of a country into a plan
 
-def apply_implies(df, implies, country_code):
+    Args:
+        implies (list or dict): rules of `country_code` in `policy_implication_rules.json`
+        country_code (str): ISO3 code of the country
+        intensity_cols (list of str, optional): "intensity_group*" columns of the USA
+            policies. Only needed for the USA
+
+    Returns:
+        list of tuple of (function, list of function): the steps of the plan, in the
+            order the rules apply. Each step has a function returning a boolean mask of
+            the source rows of a policy DataFrame, and the functions setting the
+            policies implied by these rows on copies of them
+    """
+    plan = []
     for rule in implies:
         if country_code == "USA":
-            df = apply_usa_rule(df, rule, implies[rule])
+            # source rows are selected once for all the destinations of a rule
+            plan.append(
+                (
+                    select_usa_policies(rule, intensity_cols),
+                    [imply_usa_policy(dst, intensity_cols) for dst in implies[rule]],
+                )
+            )
         else:
             src_policy, op_str, src_val, dst_rules_list = rule
 
             # For each destination policy, set the appropriate value based on the source
             for dst_rule in dst_rules_list:
-                df = apply_rule(df, src_policy, op_str, src_val, dst_rule, country_code)
+                if print_logs:
+                    print(
+                        f"{country_code}: where {src_policy} {op_str} {src_val}, set {dst_rule[0]} = {dst_rule[1]}"
+                    )
+                plan.append(
+                    (
+                        select_policies(src_policy, op_str, src_val, country_code),
+                        [imply_policy(dst_rule, country_code)],
+                    )
+                )
+    return plan
+
+
+# Assuming that any location with a policy end_date is specified at the adm2 level--true as of 5/13
+location_cols = ["policy", "adm1_name", "adm2_name"]
+
+
+def location_keys(df):
+    """Hashable (policy, adm1_name, adm2_name) of the rows of `df` with a location.
+    Rows without one never match any other row."""
+    df = df[df[location_cols].notnull().all(axis=1).values]
+    return zip(*(df[c] for c in location_cols))
+
+
+def is_existing(df, existing):
+    """Mask of the rows of `df` whose location already has their policy"""
+    keys = zip(*(df[c] for c in location_cols))
+    is_in = np.array([key in existing for key in keys], dtype=bool)
+    return is_in & df[location_cols].notnull().all(axis=1).values
+
+
+def apply_plan(df, plan, sort_col, skip_existing=False):
+    """Add the rows implied by the policies of `df`
+
+    Steps of the plan see the rows implied by earlier steps. Rows are ordered as if
+    each step added its rows to `df` and sorted it by `sort_col`. As pandas' default
+    sort isn't stable, that order (and the order of the rows that later steps select)
+    depends on every earlier sort, so the sorts are replayed on `sort_col` alone, and
+    the rows themselves are only concatenated and ordered once at the end.
+
+    Args:
+        df (pandas.DataFrame): policies of a country
+        plan (list): steps returned by `compile_implies`
+        sort_col (str): column the rows are ordered by
+        skip_existing (bool): if True, implied policies are not added to locations that
+            already have them
+
+    Returns:
+        pandas.DataFrame: policies of `df` and the policies they imply
+    """
+    frames = [df]
+    n_rows = len(df)
+    order = np.arange(n_rows)
+    sort_keys = df[sort_col].values
+    if skip_existing:
+        existing = set(location_keys(df))
+
+    for select, implies in plan:
+        mask = np.concatenate([select(frame) for frame in frames])
+        src_rows = order[mask[order]]
+        if (src_rows < len(df)).all():
+            src_df = df
+        else:
+            src_df = pd.concat(frames, ignore_index=True)
+
+        for imply in implies:
+            rows = src_rows
+            pcopy = imply(src_df.iloc[rows].copy())
+            if skip_existing:
+                keep = ~is_existing(pcopy, existing)
+                pcopy, rows = pcopy[keep], rows[keep]
+                existing.update(location_keys(pcopy))
+            frames.append(pcopy)
+
+            order = np.concatenate([order, np.arange(n_rows, n_rows + len(rows))])
+            sort_keys = np.concatenate([sort_keys, sort_keys[rows]])
+            n_rows += len(rows)
+            order = order[
+                pd.DataFrame({sort_col: sort_keys[order]})
+                .sort_values(sort_col, ascending=True)
+                .index.values
+            ]
+
+    if len(frames) == 1:
+        return df
+    return pd.concat(frames, ignore_index=True).iloc[order]
 
-    return df
+
+def apply_implies(df, implies, country_code):
+    if country_code == "USA":
+        intensity_cols = [c for c in df.columns if c.startswith("intensity_group")]
+        plan = compile_implies(implies, country_code, intensity_cols)
+        return apply_plan(df, plan, "date")
+
+    plan = compile_implies(implies, country_code)
+    return apply_plan(df, plan, "date_start", skip_existing=country_code == "CHN")
 
 
 def read_implies(
@@ -2,6 +2,9 @@
 # coding: utf-8
 
 import argparse
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -10,6 +13,7 @@ import requests
 from bs4 import BeautifulSoup
 
 import geopandas as gpd
+import shapely
 from fuzzywuzzy import fuzz, process
 from src import utils as cutil
 
@@ -21,6 +25,74 @@ adm1_shp_path = (
 adm_url_fmt = (
     "https://biogeo.ucdavis.edu/data/gadm3.6/{ftype}/gadm36_{iso3}_{ftype}.zip"
 )
+adm1_url = (
+    "https://www.naturalearthdata.com/http//www.naturalearthdata.com/download/10m/"
+    "cultural/ne_10m_admin_1_states_provinces.zip"
+)
+
+# GADM countries. All of these are from the same source but:
+# - some work with the gpkg file others with the shapefile
+# - some are adm3 some are adm2
+isos = ["ITA", "USA", "CHN", "KOR", "IRN"]
+
+# Processed GADM levels of each country, keyed by the checksum of its archive, the
+# source code of `process_gadm_country`, `process_gadm` and `add_centroids`, and the
+# geopandas and shapely versions. Bump the version when anything else they depend on
+# changes.
+gadm_cache_dir = cutil.HOME / ".cache" / "gadm"
+GADM_CACHE_VERSION = 1
+
+fra_raw = cutil.DATA_RAW / "france"
+xwalk_fra_url = (
+    "https://www.insee.fr/fr/statistiques/fichier/3720946/departement2019-csv.zip"
+)
+xwalk_fra_path = fra_raw / "xwalk_fra.zip"
+pop_fra_url = "https://www.insee.fr/fr/statistiques/fichier/2012713/TCRD_004.xls"
+pop_fra_path = fra_raw / "pop_fra.xls"
+
+usa_raw = cutil.DATA_RAW / "usa"
+hasc_fips_url = "http://www.statoids.com/yus.html"
+hasc_fips_path = usa_raw / "hasc_fips_xwalk.txt"
+worldpop_base = "https://worldpopulationreview.com/"
+st_pop_url = worldpop_base + "states/"
+st_pop_path = usa_raw / "pop_st.txt"
+terr_url = worldpop_base + "countries/united-states-territories/"
+terr_path = usa_raw / "pop_territories.txt"
+usvi_url = worldpop_base + "countries/united-states-virgin-islands-population/"
+usvi_path = usa_raw / "pop_territories_usvi.txt"
+
+ita_pop_url_fmt = "http://demo.istat.it/pop2019/dati/{lvl}.zip"
+ita_pop_dir = cutil.DATA_RAW / "italy" / "population"
+
+irn_url = r"https://www.citypopulation.de/en/iran/admin/"
+irn_path = cutil.DATA_RAW / "iran" / "pop_IRN.csv"
+
+
+def get_remote_files():
+    """(url, path) of each of the remote datasets used by `main`"""
+    remote_files = [
+        (adm1_url, adm1_shp_path),
+        (xwalk_fra_url, xwalk_fra_path),
+        (pop_fra_url, pop_fra_path),
+    ]
+    for iso3 in isos:
+        ftype = "shp" if iso3 == "CHN" else "gpkg"
+        remote_files.append(
+            (adm_url_fmt.format(iso3=iso3, ftype=ftype), cutil.get_adm_zip_path(iso3))
+        )
+    remote_files += [
+        (hasc_fips_url, hasc_fips_path),
+        (st_pop_url, st_pop_path),
+        (terr_url, terr_path),
+        (usvi_url, usvi_path),
+    ]
+    for u in ["province", "regioni", "comuni"]:
+        if not (ita_pop_dir / f"{u}.csv").exists():
+            remote_files.append(
+                (ita_pop_url_fmt.format(lvl=u), ita_pop_dir / (u + ".zip"))
+            )
+    remote_files.append((irn_url, irn_path))
+    return remote_files
 
 
 def process_gadm(in_gdf):
@@ -44,16 +116,174 @@ def process_gadm(in_gdf):
     return in_gdf
 
 
-def main(download):
-    # ## Global adm1
+def add_centroids(gdf):
+    cent = gdf.geometry.centroid
+    gdf["latitude"] = cent.y
+    gdf["longitude"] = cent.x
+    return gdf
 
-    # get file
-    print("Downloading and processing global adm1 data...")
-    adm1_url = (
-        "https://www.naturalearthdata.com/http//www.naturalearthdata.com/download/10m/"
-        "cultural/ne_10m_admin_1_states_provinces.zip"
+
+def process_gadm_country(iso3):
+    """Load the GADM data of a country and dissolve it to adm2 (if at adm3) and adm1
+
+    Returns:
+        tuple of geopandas.GeoDataFrame: adm3 units (None if the data is at adm2), adm2
+            units and adm1 units, with centroids in "latitude" and "longitude"
+    """
+    zip_path = cutil.get_adm_zip_path(iso3)
+    if iso3 != "CHN":
+        to_open = zip_path / f"gadm36_{iso3}.gpkg"
+    else:
+        to_open = zip_path / f"gadm36_{iso3}_3.shp"
+
+    # load gdf
+    in_gdf = process_gadm(gpd.read_file(cutil.zipify_path(to_open)))
+
+    adm3 = None
+    if "adm3_name" in in_gdf.index.names:
+        adm3 = in_gdf
+
+        # now aggregate to level 2 to insert into that level
+        in_gdf = add_centroids(
+            in_gdf.dissolve(by=["adm0_name", "adm1_name", "adm2_name"])
+        )
+
+    # and to level 1 to replace that level with better/more consistent data
+    return adm3, in_gdf, add_centroids(in_gdf.dissolve(by=["adm0_name", "adm1_name"]))
+
+
+def get_gadm_levels(iso3s, n_jobs=1):
+    """`process_gadm_country` for each of `iso3s`, processing countries that aren't
+    cached in `gadm_cache_dir` in parallel
+
+    Args:
+        iso3s (list of str): countries to process
+        n_jobs (int): number of worker processes. -1 uses all available cores
+
+    Returns:
+        list of tuple: output of `process_gadm_country` for each of `iso3s`
+    """
+    code_sha256 = cutil.source_sha256(process_gadm_country, process_gadm, add_centroids)
+    versions = f"gpd{gpd.__version__}.shapely{shapely.__version__}"
+    cache_paths = {
+        iso3: gadm_cache_dir
+        / (
+            f"{iso3}.v{GADM_CACHE_VERSION}.{versions}."
+            f"{cutil.download.file_sha256(cutil.get_adm_zip_path(iso3))[:16]}."
+            f"{code_sha256[:16]}.pkl"
+        )
+        for iso3 in iso3s
+    }
+    levels = dict()
+    for iso3, cache_path in cache_paths.items():
+        if cache_path.exists():
+            with open(cache_path, "rb") as f:
+                levels[iso3] = pickle.load(f)
+    to_process = [iso3 for iso3 in iso3s if iso3 not in levels]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    n_jobs = min(n_jobs, len(to_process))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            processed = list(executor.map(process_gadm_country, to_process))
+    else:
+        processed = [process_gadm_country(iso3) for iso3 in to_process]
+
+    gadm_cache_dir.mkdir(parents=True, exist_ok=True)
+    for iso3, iso_levels in zip(to_process, processed):
+        levels[iso3] = iso_levels
+        tmp_path = cache_paths[iso3].with_name(cache_paths[iso3].name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(iso_levels, f)
+        os.replace(tmp_path, cache_paths[iso3])
+    return [levels[iso3] for iso3 in iso3s]
+
+
+# ## Extraction of tables from scraped pages, cached by `src.utils.get_scraped_table`
+
+
+def extract_hasc_fips(soup):
+    """US counties from the fixed-width table of statoids.com"""
+    row_list = soup.pre.text.split("\n")[1:-1]
+    valid_rows = [r for r in row_list if r != "" and r[:4] not in ["Name", "----"]]
+    return pd.DataFrame(
+        {
+            "name": [r[:23].rstrip() for r in valid_rows],
+            "type": [r[23] for r in valid_rows],
+            "hasc": [r[25:33] for r in valid_rows],
+            "fips": [r[34:39] for r in valid_rows],
+            "population": [cutil.parse_int(r[40:49]) for r in valid_rows],
+            "area_km2": [cutil.parse_int(r[50:57]) for r in valid_rows],
+            "capital": [r[68:] for r in valid_rows],
+        }
+    )
+
+
+def extract_pop_table(soup, name_col, pop_col):
+    """Names and populations from columns of the first table of a page"""
+    rows = cutil.table_cells(soup.table.tbody)
+    return pd.DataFrame(
+        {
+            "adm1_name": [r[name_col] for r in rows],
+            "population": [cutil.parse_int(r[pop_col]) for r in rows],
+        }
+    )
+
+
+def extract_state_pops(soup):
+    return extract_pop_table(soup, 1, 2)
+
+
+def extract_territory_pops(soup):
+    return extract_pop_table(soup, 0, 1)
+
+
+def extract_usvi_pop(soup):
+    return pd.DataFrame(
+        {
+            "adm1_name": ["US Virgin Islands"],
+            "population": [
+                cutil.parse_int(soup.find(attrs={"class": "popNumber"}).text)
+            ],
+        }
+    )
+
+
+def extract_irn_adm1_pops(soup):
+    """Name and latest census population of Iranian provinces"""
+    rows = [
+        r
+        for tbody in soup.table.find_all("tbody", {"class": "admin1"})
+        for r in cutil.table_cells(tbody)
+    ]
+    return pd.DataFrame(
+        {
+            "adm1_name": [r[0] for r in rows],
+            "population": [cutil.parse_int(r[-2]) for r in rows],
+        }
     )
-    cutil.download_file(adm1_url, adm1_shp_path, overwrite=download)
+
+
+def extract_irn_adm2_pops(soup):
+    """Province, name and latest census population of Iranian counties"""
+    adm2_rows = []
+    for tbody in soup.table.find_all("tbody", {"class": "admin2"}):
+        # complicated way to get province from previous admin1 level
+        prov = "".join(list(tbody.previous_sibling.previous_sibling.strings)[1:-6])
+        adm2_rows += [
+            [prov, r[0], cutil.parse_int(r[-2])] for r in cutil.table_cells(tbody)
+        ]
+    return pd.DataFrame(adm2_rows, columns=["adm1_name", "adm2_name", "population"])
+
+
+def main(download, n_jobs=-1):
+    # Fetch all remote datasets up front, several at a time
+    print("Downloading population and geography datasets...")
+    cutil.download_files(get_remote_files(), overwrite=download)
+
+    # ## Global adm1
+    print("Processing global adm1 data...")
 
     # process
     in_gdf = gpd.read_file(cutil.zipify_path(adm1_shp_path))
@@ -97,16 +327,8 @@ def main(download):
     # ## adm2+
 
     # ### FRA
-    print("Downloading and processing FRA population data...")
-    # First, download population data and make adm2 to adm1 mapping
-    fra_raw = cutil.DATA_RAW / "france"
-
-    xwalk_fra_url = (
-        "https://www.insee.fr/fr/statistiques/fichier/3720946/departement2019-csv.zip"
-    )
-    xwalk_fra_path = fra_raw / "xwalk_fra.zip"
-    cutil.download_file(xwalk_fra_url, xwalk_fra_path, overwrite=download)
-
+    print("Processing FRA population data...")
+    # First, make adm2 to adm1 mapping
     xwalk_fra = pd.read_csv(
         xwalk_fra_path,
         usecols=[0, 1],
@@ -116,10 +338,6 @@ def main(download):
         skiprows=1,
     )
 
-    pop_fra_url = "https://www.insee.fr/fr/statistiques/fichier/2012713/TCRD_004.xls"
-    pop_fra_path = fra_raw / "pop_fra.xls"
-    cutil.download_file(pop_fra_url, pop_fra_path, overwrite=download)
-
     pop_fra = pd.read_excel(
         pop_fra_path,
         sheet_name="DEP",
@@ -192,11 +410,6 @@ def main(download):
 
     # ### Others
 
-    # All of these are from the same source but:
-    # - some work with the gpkg file others with the shapefile
-    # - some are adm3 some are adm2
-
-    isos = ["ITA", "USA", "CHN", "KOR", "IRN"]
     adm2_name_maps = {
         "ITA": {
             "Firenze": "Florence",
@@ -217,39 +430,18 @@ def main(download):
             "Massa-Carrara": "Massa Carrara",
         }
     }
-    for iso3 in isos:
-        print(f"Downloading and processing {iso3} geographical and population data...")
-        # download if needed
-        if iso3 == "CHN":
-            ftype = "shp"
-        else:
-            ftype = "gpkg"
-        zip_path = cutil.get_adm_zip_path(iso3)
-        cutil.download_file(
-            adm_url_fmt.format(iso3=iso3, ftype=ftype), zip_path, overwrite=download
-        )
-        if ftype == "gpkg":
-            to_open = zip_path / f"gadm36_{iso3}.gpkg"
-        else:
-            to_open = zip_path / f"gadm36_{iso3}_3.shp"
-
-        # load gdf
-        in_gdf = process_gadm(gpd.read_file(cutil.zipify_path(to_open)))
-
-        if "adm3_name" in in_gdf.index.names:
-            adm3_gdf = adm3_gdf.append(in_gdf)
-
-            # now aggregate to level 2 to insert into that level
-            in_gdf = in_gdf.dissolve(by=["adm0_name", "adm1_name", "adm2_name"])
-            in_gdf["latitude"] = in_gdf.geometry.centroid.y
-            in_gdf["longitude"] = in_gdf.geometry.centroid.x
+    print(f"Processing {', '.join(isos)} geographical and population data...")
+    adm3_parts, adm2_parts, adm1_parts = [adm3_gdf], [], []
+    for iso3, (adm3, adm2, adm1) in zip(isos, get_gadm_levels(isos, n_jobs)):
+        if adm3 is not None:
+            adm3_parts.append(adm3)
 
         # insert into level 2 dataset
         if iso3 in adm2_gdf.index.get_level_values("adm0_name").unique():
             adm2_gdf = adm2_gdf.rename(index=adm2_name_maps[iso3], level="adm2_name")
             res = pd.merge(
                 adm2_gdf.loc[idx[iso3, :, :]],
-                in_gdf.reset_index(drop=False),
+                adm2.reset_index(drop=False),
                 on="adm2_name",
                 how="outer",
                 indicator=True,
@@ -259,18 +451,21 @@ def main(download):
             for i in ["geometry", "latitude", "longitude"]:
                 res[i] = res[i + "_y"].fillna(res[i + "_x"])
                 res = res.drop(columns=[i + "_x", i + "_y"])
-            adm2_gdf = adm2_gdf.loc[
-                adm2_gdf.index.get_level_values("adm0_name") != iso3
-            ].append(res)
+            adm2_parts.append(res)
         else:
-            adm2_gdf = adm2_gdf.append(in_gdf)
+            adm2_parts.append(adm2)
+        adm1_parts.append(adm1)
 
-        # now aggregate to level 1 to replace that level with better/more consistent data
-        in_gdf = in_gdf.dissolve(by=["adm0_name", "adm1_name"])
-        in_gdf["latitude"] = in_gdf.geometry.centroid.y
-        in_gdf["longitude"] = in_gdf.geometry.centroid.x
-        adm1_gdf = adm1_gdf[adm1_gdf.index.get_level_values("adm0_name") != iso3]
-        adm1_gdf = adm1_gdf.append(in_gdf)
+    # replace the data of these countries in each level
+    adm3_gdf = pd.concat(adm3_parts)
+    adm2_gdf = pd.concat(
+        [adm2_gdf[~adm2_gdf.index.get_level_values("adm0_name").isin(isos)]]
+        + adm2_parts
+    )
+    adm1_gdf = pd.concat(
+        [adm1_gdf[~adm1_gdf.index.get_level_values("adm0_name").isin(isos)]]
+        + adm1_parts
+    )
 
     # ## Manual name adjustments
 
@@ -341,34 +536,8 @@ def main(download):
     # ### US
 
     ## get county-level populations
-    hasc_fips_url = "http://www.statoids.com/yus.html"
-    hasc_fips_path = cutil.DATA_RAW / "usa" / "hasc_fips_xwalk.txt"
-    text = cutil.get_scraped_text(hasc_fips_url, hasc_fips_path, overwrite=download)
-    text = text.pre.text
-    row_list = text.split("\n")[1:-1]
-    headers = row_list[0].split()
-    valid_rows = [r for r in row_list if r != "" and r[:4] not in ["Name", "----"]]
-    name = [r[:23].rstrip() for r in valid_rows]
-    t = [r[23] for r in valid_rows]
-    hasc = [r[25:33] for r in valid_rows]
-    fips = [r[34:39] for r in valid_rows]
-    pop = [int(r[40:49].lstrip().replace(",", "")) for r in valid_rows]
-    area_km2 = [int(r[50:57].lstrip().replace(",", "")) for r in valid_rows]
-    area_mi2 = [int(r[58:65].lstrip().replace(",", "")) for r in valid_rows]
-    z = [r[66] for r in valid_rows]
-    capital = [r[68:] for r in valid_rows]
-
-    # turn into dataframe
-    us_county_df = pd.DataFrame(
-        {
-            "name": name,
-            "type": t,
-            "hasc": hasc,
-            "fips": fips,
-            "population": pop,
-            "area_km2": area_km2,
-            "capital": capital,
-        }
+    us_county_df = cutil.get_scraped_table(
+        hasc_fips_url, hasc_fips_path, extract_hasc_fips
     ).set_index("hasc")
 
     # ##### Merge in us adm2 dataset
@@ -445,47 +614,22 @@ def main(download):
     adm2_gdf = adm2_gdf.drop(columns="population_r")
 
     ## adm1
-    usa_raw = cutil.DATA_RAW / "usa"
-
     # states
-    worldpop_base = "https://worldpopulationreview.com/"
-    st_pop_url = worldpop_base + "states/"
-    st_pop_path = usa_raw / "pop_st.txt"
-    table = cutil.get_scraped_text(st_pop_url, st_pop_path, overwrite=download).table
-    elements = [i.find_all("td") for i in table.tbody.find_all("tr")]
-    state, pop = [], []
-    for e in elements:
-        state.append(e[1].text)
-        pop.append(int(e[2].text.replace(",", "")))
-    pop_st = pd.Series(
-        pop, index=pd.Index(state, name="adm1_name"), name="population_worldpop"
-    )
+    pop_st = cutil.get_scraped_table(st_pop_url, st_pop_path, extract_state_pops)
 
     # add territories
-    terr_url = worldpop_base + "countries/united-states-territories/"
-    terr_path = usa_raw / "pop_territories.txt"
-    table = cutil.get_scraped_text(terr_url, terr_path, overwrite=download).table
-    elements = [i.find_all("td") for i in table.tbody.find_all("tr")]
-    terr, pop = [], []
-    for e in elements:
-        terr.append(e[0].text)
-        pop.append(int(e[1].text.replace(",", "")))
-    pop_terr = pd.Series(
-        pop, index=pd.Index(terr, name="adm1_name"), name="population_worldpop"
-    )
+    pop_terr = cutil.get_scraped_table(terr_url, terr_path, extract_territory_pops)
     # drop PR b/c in states data
-    pop_terr = pop_terr[pop_terr.index != "Puerto Rico"]
+    pop_terr = pop_terr[pop_terr.adm1_name != "Puerto Rico"]
 
     # included US Virgin Islands in territories
-    terr_url = worldpop_base + "countries/united-states-virgin-islands-population/"
-    terr_path = usa_raw / "pop_territories_usvi.txt"
-    text = cutil.get_scraped_text(terr_url, terr_path, overwrite=download)
-    pop_usvg = pd.Series(
-        [int(text.find(attrs={"class": "popNumber"}).text.replace(",", ""))],
-        index=pd.Index(["US Virgin Islands"], name="adm1_name"),
-        name="population_worldpop",
-    )
-    pop_st = pd.concat([pop_st, pop_terr, pop_usvg])
+    pop_usvg = cutil.get_scraped_table(usvi_url, usvi_path, extract_usvi_pop)
+
+    pop_st = (
+        pd.concat([pop_st, pop_terr, pop_usvg])
+        .set_index("adm1_name")["population"]
+        .rename("population_worldpop")
+    )
     pop_st.index = pd.MultiIndex.from_product(
         [["USA"], pop_st.index.values], names=["adm0_name", "adm1_name"]
     )
@@ -499,15 +643,7 @@ def main(download):
 
     # ### ITA
 
-    print("Downloading and processing ITA population data...")
-    url_fmt = "http://demo.istat.it/pop2019/dati/{lvl}.zip"
-    ita_pop_dir = cutil.DATA_RAW / "italy" / "population"
-    for u in ["province", "regioni", "comuni"]:
-        if not (ita_pop_dir / f"{u}.csv").exists():
-            cutil.download_file(
-                url_fmt.format(lvl=u), ita_pop_dir / (u + ".zip"), overwrite=download
-            )
-
+    print("Processing ITA population data...")
     replace_provinces = {
         "Bolzano/Bozen": "Bolzano",
         "Massa-Carrara": "Massa Carrara",
@@ -616,38 +752,12 @@ def main(download):
 
     # ### IRN
 
-    print("Downloading and processing IRN population data...")
-    irn_url = r"https://www.citypopulation.de/en/iran/admin/"
-    irn_path = cutil.DATA_RAW / "iran" / "pop_IRN.csv"
-    soup = cutil.get_scraped_text(irn_url, irn_path, overwrite=download)
-    table = soup.table
-
-    adm1s = table.find_all("tbody", {"class": "admin1"})
-    adm2s = table.find_all("tbody", {"class": "admin2"})
-
-    # just want name and latest census pop
-    adm1_rows = []
-    for a in adm1s:
-        rows = a.find_all("tr")
-        for r in rows:
-            td = r.find_all("td")
-            row = [i.text for i in td]
-            adm1_rows.append([row[0], int(row[-2].replace(",", ""))])
-    adm1_irn = pd.DataFrame(adm1_rows, columns=["adm1_name", "population"]).set_index(
-        "adm1_name"
-    )
-
-    adm2_rows = []
-    for a in adm2s:
-        # complicated way to get province from previous admin1 level
-        prov = "".join(list(a.previous_sibling.previous_sibling.strings)[1:-6])
-        rows = a.find_all("tr")
-        for r in rows:
-            td = r.find_all("td")
-            row = [i.text for i in td]
-            adm2_rows.append([prov, row[0], int(row[-2].replace(",", ""))])
-    adm2_irn = pd.DataFrame(
-        adm2_rows, columns=["adm1_name", "adm2_name", "population"]
+    print("Processing IRN population data...")
+    adm1_irn = cutil.get_scraped_table(
+        irn_url, irn_path, extract_irn_adm1_pops
+    ).set_index("adm1_name")
+    adm2_irn = cutil.get_scraped_table(
+        irn_url, irn_path, extract_irn_adm2_pops
     ).set_index(["adm1_name", "adm2_name"])
 
     def checker(wrong_options, correct_options):
@@ -741,5 +851,11 @@ if __name__ == "__main__":
         action="store_false",
         help="do not reload (re-download) population and geography datasets",
     )
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=-1,
+        help="number of countries to process at once (default: all cores)",
+    )
     args = parser.parse_args()
-    main(args.r)
+    main(args.r, args.n_jobs)
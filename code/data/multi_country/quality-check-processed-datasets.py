@@ -1,7 +1,10 @@
 import argparse
+import contextlib
+import io
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-import numpy as np
 import pandas as pd
 
 from src import utils as cutil
@@ -31,6 +34,12 @@ parser.add_argument(
     action="store_true",
     help="Check presence of lat/lon values",
 )
+parser.add_argument(
+    "--n-jobs",
+    type=int,
+    default=-1,
+    help="number of datasets to check at once (default: all cores)",
+)
 args = parser.parse_args()
 
 
@@ -86,10 +95,15 @@ def check_cutoff_date(df, country, adm, cutoff_date):
 
 def check_balanced_panel(df, country, adm):
     # Check that panel is balanced
-    for adm_field in ["adm0_name", "adm1_name", "adm1_id", "adm2_name", "adm2_id"]:
-        if adm_field in df.columns:
-            panel_balanced = len(df.groupby("date")[adm_field].count().unique()) == 1
-            test_condition(panel_balanced, country, adm, "Panel not balanced")
+    adm_fields = [
+        adm_field
+        for adm_field in ["adm0_name", "adm1_name", "adm1_id", "adm2_name", "adm2_id"]
+        if adm_field in df.columns
+    ]
+    n_counts = df.groupby("date")[adm_fields].count().nunique()
+    for adm_field in adm_fields:
+        panel_balanced = n_counts[adm_field] == 1
+        test_condition(panel_balanced, country, adm, "Panel not balanced")
 
 
 def check_latlons(df, country, adm):
@@ -97,51 +111,46 @@ def check_latlons(df, country, adm):
     test_condition(latlon_cols_exist, country, adm, "missing lat-lon fields")
 
     if latlon_cols_exist:
-        no_missing_vals = (
-            df["lat"].isnull().sum() == 0 and df["lon"].isnull().sum() == 0
-        )
+        no_missing_vals = not df[["lat", "lon"]].isnull().values.any()
         test_condition(
             no_missing_vals, country, adm, "missing some lat-lon coordinates"
         )
 
         # Check that lats and lons are valid
-        coords_in_bounds = (
-            df[
-                (df["lat"] < -90)
-                | (df["lat"] > 90)
-                | (df["lon"] < -180)
-                | (df["lon"] > 180)
-            ]
-            .count()
-            .sum()
-            == 0
-        )
+        coords_in_bounds = not (
+            (df["lat"] < -90)
+            | (df["lat"] > 90)
+            | (df["lon"] < -180)
+            | (df["lon"] > 180)
+        ).any()
 
         test_condition(coords_in_bounds, country, adm, "invalid lat-lon coordinates")
 
 
 def check_cumulativity(df, country, adm):
     # Check that all cumulative fields (including imputed) have cumulative values. Ignore cumulative fields where there is an imputed version
+    fields = []
     for field in df.columns:
         if "cum_" not in field:
             continue
         if "_imputed" not in field and field + "_imputed" in df.columns:
             continue
 
-        adm_name = f"adm{adm}_name"
-
         # Make exception for France, where we have confirmed cases up to a point, and then hospitalizations
         if country == "FRA":
             if field == "cum_confirmed_cases_imputed" or field == "cum_hospitalized":
                 continue
+        fields.append(field)
 
-        column_is_cumulative = (
-            df.groupby([adm_name])[field]
-            .apply(lambda x: np.all(np.diff(np.array(x)) < 0))
-            .sum()
-            == 0
-        )
+    # rows are in date order within each adm-unit. A column fails where the values of
+    # an adm-unit decrease from each date to the next
+    adm_name = f"adm{adm}_name"
+    grouped = df.groupby(adm_name)
+    n_decreases = (grouped[fields].diff() < 0).groupby(df[adm_name]).sum()
+    only_decreasing = n_decreases.eq(grouped.size() - 1, axis=0).any()
 
+    for field in fields:
+        column_is_cumulative = not only_decreasing[field]
         test_condition(
             column_is_cumulative, country, adm, f"Column is not cumulative: {field}"
         )
@@ -150,13 +159,15 @@ def check_cumulativity(df, country, adm):
 def check_popweights_in_bounds(df, country, adm):
     # Check that pop-weighted columns are in [0,1] range
     popwt_cols = [col for col in df.columns if "popwt" in col]
+    out_of_bounds = ((df[popwt_cols] > 1) | (df[popwt_cols] < 0)).any()
     for col in popwt_cols:
-        popwt_in_bounds = df[(df[col] > 1) | (df[col] < 0)].count().sum() == 0
+        popwt_in_bounds = not out_of_bounds[col]
         test_condition(popwt_in_bounds, country, adm, f"Column out of [0, 1]: {col}")
 
 
 def check_columns_are_not_null(df, country, adm):
     # Check that no column has null values, except KOR country list and pre-imputed cumulative columns
+    cols = []
     for col in df:
         if (
             "country_list" in col
@@ -169,8 +180,11 @@ def check_columns_are_not_null(df, country, adm):
         if country == "FRA":
             if col == "cum_confirmed_cases_imputed" or col == "cum_hospitalized":
                 continue
+        cols.append(col)
 
-        nulls_not_found = df[col].isnull().sum() == 0
+    has_nulls = df[cols].isnull().any()
+    for col in cols:
+        nulls_not_found = not has_nulls[col]
         test_condition(nulls_not_found, country, adm, f"Column contains nulls: {col}")
 
 
@@ -187,13 +201,14 @@ def check_columns_are_in_template(df, country, adm, template):
     _check_columns_are_in_list(df, country, adm, template.columns, "template")
 
 
-def check_columns_are_in_data_dictionary(df, country, adm):
-    country_processed = pd.read_excel(
-        path_data_dictionary, sheet_name="country_processed"
-    )
-    policy_categories = pd.read_excel(
-        path_data_dictionary, sheet_name="policy_categories"
+def get_data_dictionary_cols(path_data_dictionary):
+    # Columns allowed by the data dictionary, including their imputed, optional and
+    # pop-weighted versions
+    sheets = pd.read_excel(
+        path_data_dictionary, sheet_name=["country_processed", "policy_categories"]
     )
+    country_processed = sheets["country_processed"]
+    policy_categories = sheets["policy_categories"]
     health_cols = set(country_processed["Variable Name"])
 
     add_health_cols = set()
@@ -220,22 +235,31 @@ def check_columns_are_in_data_dictionary(df, country, adm):
                     add_policy_cols.add(varname + "_country_list")
 
     policy_cols = policy_cols.union(add_policy_cols)
-    all_cols = policy_cols.union(health_cols)
-    _check_columns_are_in_list(df, country, adm, all_cols, "data dictionary")
+    return policy_cols.union(health_cols)
+
+
+def check_columns_are_in_data_dictionary(df, country, adm, dictionary_cols):
+    _check_columns_are_in_list(df, country, adm, dictionary_cols, "data dictionary")
 
 
 def check_opt_and_non_opt_align(df, country, adm, aggregate_vars=["social_distance"]):
+    opt_cols = []
     for col in df.columns:
         if "_opt" in col and col.replace("_opt", "") in df.columns:
 
             # ignore if one of the grab bag vars
             if bool(sum([int(i in col) for i in aggregate_vars])):
                 continue
-            nonopt_col = col.replace("_opt", "")
-            row_mismatch_len = len(df[df[nonopt_col] + df[col] > 1.0 + 1e-12])
-            cols_add_to_one_or_below = row_mismatch_len == 0
-            message = f"Sum of fields > 1 in cols {nonopt_col} and {col}, in {row_mismatch_len} cases"
-            test_condition(cols_add_to_one_or_below, country, adm, message)
+            opt_cols.append(col)
+    nonopt_cols = [col.replace("_opt", "") for col in opt_cols]
+
+    n_mismatches = (df[nonopt_cols].values + df[opt_cols].values > 1.0 + 1e-12).sum(
+        axis=0
+    )
+    for col, nonopt_col, row_mismatch_len in zip(opt_cols, nonopt_cols, n_mismatches):
+        cols_add_to_one_or_below = row_mismatch_len == 0
+        message = f"Sum of fields > 1 in cols {nonopt_col} and {col}, in {row_mismatch_len} cases"
+        test_condition(cols_add_to_one_or_below, country, adm, message)
 
 
 def get_cutoff_date(path_cutoff_dates):
@@ -247,47 +271,98 @@ def get_cutoff_date(path_cutoff_dates):
     return cutoff_date
 
 
-def get_processed_datasets():
-    # Read each country's processed datasets into `processed`
-    processed = dict()
-
+def get_processed_paths():
+    # Paths of each country's processed datasets, by country and adm-level
+    processed_paths = []
     for country in country_list:
-        processed[country] = dict()
         for adm in adm_list:
             path_processed = (
                 cutil.DATA_PROCESSED / f"adm{adm}" / f"{country}_processed.csv"
             )
             if path_processed.exists():
-                df = pd.read_csv(path_processed)
-                df = df.sort_values(["date", f"adm{adm}_name"])
-                processed[country][str(adm)] = df
-
-    return processed
-
-
-def main():
+                processed_paths.append((country, str(adm), path_processed))
+
+    return processed_paths
+
+
+def check_dataset(country, adm, path_processed, cutoff_date, template, dictionary_cols):
+    """Run the checks on a processed dataset
+
+    Args:
+        country (str): ISO3 code of the country
+        adm (str): adm-level of the dataset
+        path_processed (pathlib.Path): path of the dataset
+        cutoff_date (pandas.Timestamp): latest date allowed in the dataset
+        template (pandas.DataFrame): template of the processed datasets
+        dictionary_cols (set of str): columns returned by `get_data_dictionary_cols`
+
+    Returns:
+        tuple of (str, dict): the warnings printed by the checks, and the time taken by
+            each check (and by loading the dataset), in seconds
+    """
+    checks = [
+        (check_cutoff_date, [cutoff_date]),
+        (check_balanced_panel, []),
+        (check_cumulativity, []),
+        (check_popweights_in_bounds, []),
+        (check_columns_are_not_null, []),
+        (check_columns_are_in_template, [template]),
+        (check_opt_and_non_opt_align, [["social_distance"]]),
+        (check_columns_are_in_data_dictionary, [dictionary_cols]),
+    ]
+    if args.check_latlons:
+        checks.insert(0, (check_latlons, []))
+
+    timings = dict()
+    start = time.perf_counter()
+    df = pd.read_csv(path_processed)
+    df = df.sort_values(["date", f"adm{adm}_name"])
+    timings["load"] = time.perf_counter() - start
+
+    # collect warnings, so that those of datasets checked at once don't interleave
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for check, check_args in checks:
+            start = time.perf_counter()
+            check(df, country, adm, *check_args)
+            timings[check.__name__] = time.perf_counter() - start
+
+    return output.getvalue(), timings
+
+
+def main(n_jobs=-1):
     cutoff_date = get_cutoff_date(path_cutoff_dates)
     template = pd.read_csv(path_template)
-    processed = get_processed_datasets()
+    dictionary_cols = get_data_dictionary_cols(path_data_dictionary)
+    processed_paths = get_processed_paths()
 
     # Run a series of checks on each country
-    for country in processed:
-        for adm in processed[country]:
-            df = processed[country][adm]
-
-            if args.check_latlons:
-                check_latlons(df, country, adm)
-            check_cutoff_date(df, country, adm, cutoff_date)
-            check_balanced_panel(df, country, adm)
-            check_cumulativity(df, country, adm)
-            check_popweights_in_bounds(df, country, adm)
-            check_columns_are_not_null(df, country, adm)
-            check_columns_are_in_template(df, country, adm, template)
-            check_opt_and_non_opt_align(
-                df, country, adm, aggregate_vars=["social_distance"]
-            )
-            check_columns_are_in_data_dictionary(df, country, adm)
+    check_args = [
+        (country, adm, path_processed, cutoff_date, template, dictionary_cols)
+        for country, adm, path_processed in processed_paths
+    ]
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    n_jobs = min(n_jobs, len(check_args))
+
+    total_timings = dict()
+    with contextlib.ExitStack() as stack:
+        if n_jobs > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(n_jobs))
+            results = executor.map(check_dataset, *zip(*check_args))
+        else:
+            results = (check_dataset(*dataset_args) for dataset_args in check_args)
+
+        # results come in the order of the datasets, raising the first error found
+        for output, timings in results:
+            print(output, end="")
+            for name, seconds in timings.items():
+                total_timings[name] = total_timings.get(name, 0) + seconds
+
+    print(f"Checked {len(check_args)} datasets. Time taken by each check (seconds):")
+    for name, seconds in total_timings.items():
+        print(f"    {name}: {seconds:.3f}")
 
 
 if __name__ == "__main__":
-    main()
+    main(args.n_jobs)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Write cheaper representations of the adm-units saved by get_adm_info.py: a table of
+# centroids and areas, and geometries simplified to a few tolerances. Load them with
+# `src.geo.load_adm_centroids` and `src.geo.load_adm_geometries`.
+
+import argparse
+
+from src import geo as cgeo
+
+adm_levels = [1, 2, 3]
+
+
+def main(tolerances):
+    for adm_level in adm_levels:
+        print(f"Simplifying adm{adm_level} geometries...")
+        cgeo.write_simplified_adm(adm_level, tolerances)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tolerances",
+        type=float,
+        nargs="+",
+        default=cgeo.SIMPLIFY_TOLERANCES,
+        help="tolerances to simplify geometries to, in degrees",
+    )
+    args = parser.parse_args()
+    main(args.tolerances)
@@ -1,3 +1,4 @@
+import argparse
 import os
 
 import numpy as np
@@ -14,67 +15,129 @@ fn_out = "usa_states_covidtrackingdotcom_int_with_testing_regimes.csv"
 fp_out = os.path.join(path_to_int_data, fn_out)
 
 
-def state_data_to_time_series(state_data):
-    state_data_sorted = state_data.sort_values("date", inplace=False)
+# These factors determine what is programatically considered as a testing regime
+# change candidate
+pct_change_thresh = 2.5
+abs_change_thresh = 150
 
-    timeseries_state_data = pd.Series(
-        state_data_sorted["cumulative_tests"].values,
-        pd.DatetimeIndex([pd.to_datetime(x) for x in state_data_sorted["date"].values]),
+# Thresholds compared by `--sweep`
+pct_change_thresh_grid = [0.5, 1, 1.5, 2, 2.5, 3, 4, 5]
+abs_change_thresh_grid = [50, 100, 150, 200, 300, 500]
+
+
+def get_testing_changes(states_data):
+    """Daily percent and absolute changes in the cumulative tests of each state
+
+    Percent changes are relative to the previous calendar day, with missing test
+    counts filled forward (as `pandas.Series.pct_change(freq="D")`), and absolute
+    changes are relative to the previous observation of the state.
+
+    Args:
+        states_data (pandas.DataFrame): with "adm1_name", "date" and
+            "cumulative_tests" columns, and one row per state and date
+
+    Returns:
+        pandas.DataFrame: "adm1_name", "pct_change" and "abs_change" of each row of
+            `states_data`, sorted by state and date
+    """
+    data = states_data[["adm1_name", "date", "cumulative_tests"]].assign(
+        date=pd.to_datetime(states_data["date"])
     )
+    data = data.sort_values(["adm1_name", "date"], kind="mergesort")
+    by_state = data.groupby("adm1_name", sort=False)["cumulative_tests"]
+
+    padded = data.assign(cumulative_tests=by_state.ffill())
+    prev_day = padded.assign(date=padded["date"] + pd.Timedelta(days=1))
+    prev_day_tests = pd.merge(
+        data[["adm1_name", "date"]], prev_day, how="left", on=["adm1_name", "date"],
+    )["cumulative_tests"].values
+
+    return pd.DataFrame(
+        {
+            "adm1_name": data["adm1_name"],
+            "pct_change": padded["cumulative_tests"] / prev_day_tests - 1,
+            "abs_change": by_state.diff(),
+        },
+        index=data.index,
+    )
+
 
-    return state_data_sorted, timeseries_state_data
+def calculate_testing_regimes(testing_changes, pct_chg_thresh=0.4, abs_chg_thresh=50):
+    """Testing regimes of each state, counted from 0
 
+    A new regime starts whenever both the percent and absolute changes in
+    cumulative tests exceed their thresholds.
 
-def calculate_testing_regimes(state_data, pct_chg_thresh=0.4, abs_chg_thresh=50):
-    # calculates testing regimes as changing whenever the pct_chg of total tests
-    # between previous. current dates is above pct_chg_thresh
+    Args:
+        testing_changes (pandas.DataFrame): output of `get_testing_changes`
+        pct_chg_thresh (float): threshold on the percent change
+        abs_chg_thresh (float): threshold on the absolute change
+
+    Returns:
+        pandas.Series: regime of each row of `testing_changes`
+    """
+    is_new_regime = (testing_changes["pct_change"] > pct_chg_thresh) & (
+        testing_changes["abs_change"] > abs_chg_thresh
+    )
+    return is_new_regime.groupby(testing_changes["adm1_name"], sort=False).cumsum()
 
-    state_data_sorted, timeseries_state_data = state_data_to_time_series(state_data)
 
-    pct_changes_in_testing = timeseries_state_data.pct_change(freq="D").values
-    abs_changes_in_testing = timeseries_state_data.diff()
+def sweep_testing_regimes(testing_changes, pct_chg_threshs, abs_chg_threshs):
+    """Number of testing regime changes of each state for a grid of thresholds
 
-    testing_regimes = np.zeros(len(pct_changes_in_testing))
-    regime = 0
+    Args:
+        testing_changes (pandas.DataFrame): output of `get_testing_changes`
+        pct_chg_threshs (list of float): thresholds on the percent change
+        abs_chg_threshs (list of float): thresholds on the absolute change
 
-    # transition to a new regime if the absolute *and* percent changes exceed the
-    # thresholds
-    for i, (pct_change, abs_change) in enumerate(
-        zip(pct_changes_in_testing, abs_changes_in_testing)
-    ):
-        if pct_change > pct_chg_thresh and abs_change > abs_chg_thresh:
-            regime += 1
-        testing_regimes[i] = regime
+    Returns:
+        pandas.Series: "n_regime_changes", indexed by "pct_chg_thresh",
+            "abs_chg_thresh" and "adm1_name"
+    """
+    pct_changes = testing_changes["pct_change"].values[:, None, None]
+    abs_changes = testing_changes["abs_change"].values[:, None, None]
+    is_new_regime = (pct_changes > np.asarray(pct_chg_threshs)[None, :, None]) & (
+        abs_changes > np.asarray(abs_chg_threshs)[None, None, :]
+    )
 
-    # return the pandas indices and the
-    return testing_regimes, state_data_sorted.index
+    columns = pd.MultiIndex.from_product(
+        [pct_chg_threshs, abs_chg_threshs], names=["pct_chg_thresh", "abs_chg_thresh"]
+    )
+    return (
+        pd.DataFrame(
+            is_new_regime.reshape(len(testing_changes), -1),
+            index=testing_changes["adm1_name"].values,
+            columns=columns,
+        )
+        .groupby(level=0)
+        .sum()
+        .rename_axis("adm1_name")
+        .T.stack()
+        .rename("n_regime_changes")
+    )
 
 
-def main():
+def main(sweep_out=None):
     # 1. download the data locally
     states_data = pd.read_csv(os.path.join(fp_out.replace("_with_testing_regimes", "")))
 
-    # 2. add variable for testing regime
-    states_data["testing_regime"] = 1
-
     state_names = np.unique(states_data["adm1_name"])
     print(len(state_names), "states represented")
 
-    # These factors determine what is programatically considered as a testing regime
-    # change candidate
-    pct_change_thresh = 2.5
-    abs_change_thresh = 150
-
-    for state in state_names:
-        # find the testing regimes for this state
-        state_data = states_data[states_data["adm1_name"] == state]
-        state_testing_regimes, state_data_idxs = calculate_testing_regimes(
-            state_data,
-            pct_chg_thresh=pct_change_thresh,
-            abs_chg_thresh=abs_change_thresh,
+    # 2. add variable for testing regime
+    testing_changes = get_testing_changes(states_data)
+    states_data["testing_regime"] = calculate_testing_regimes(
+        testing_changes,
+        pct_chg_thresh=pct_change_thresh,
+        abs_chg_thresh=abs_change_thresh,
+    ).astype(float)
+
+    if sweep_out is not None:
+        sweep = sweep_testing_regimes(
+            testing_changes, pct_change_thresh_grid, abs_change_thresh_grid
         )
-
-        states_data.loc[state_data_idxs, "testing_regime"] = state_testing_regimes
+        print("writing testing regime changes by threshold to {0}".format(sweep_out))
+        sweep.to_csv(sweep_out)
 
     # 3. + 4. (notebook only)
     # if you want to manually inspect and change results, use the notebook with the
@@ -86,4 +149,14 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sweep",
+        dest="sweep_out",
+        default=None,
+        help="also save the number of regime changes of each state for each pair of "
+        "thresholds in `pct_change_thresh_grid` and `abs_change_thresh_grid` to "
+        "this csv",
+    )
+    args = parser.parse_args()
+    main(args.sweep_out)
@@ -1,3 +1,4 @@
+import argparse
 import os
 
 import numpy as np
@@ -8,6 +9,9 @@ import src.utils as cutil
 states_url = "https://covidtracking.com/api/states/daily"
 path_to_data = cutil.DATA
 
+# number of records parsed at a time from a JSON lines snapshot
+snapshot_chunksize = 10000
+
 # rename the states
 state_acronyms_to_names = {
     "all": "all",
@@ -70,22 +74,41 @@ state_acronyms_to_names = {
 }
 
 
-def acc_to_statename(acc):
-    return state_acronyms_to_names[acc]
+def acc_to_statename(accs):
+    """Names of the states with acronyms `accs` (pandas.Series)"""
+    accs = pd.Categorical(accs)
+    unknown = set(accs.categories) - set(state_acronyms_to_names)
+    if unknown:
+        raise KeyError(f"Unknown state acronyms: {sorted(unknown)}")
+    return np.asarray(
+        accs.rename_categories(
+            [state_acronyms_to_names[acc] for acc in accs.categories]
+        ),
+        dtype=object,
+    )
 
 
 # redo the date
-def format_covid_tracking_date(date):
-    date_str = str(date)
-    year = date_str[:4]
-    month = date_str[4:6]
-    day = date_str[6:8]
-    return "{y}-{m}-{d}".format(m=month, d=day, y=year)
+def format_covid_tracking_date(dates):
+    """Convert dates (pandas.Series) like 20200315 to strings like 2020-03-15"""
+    return pd.to_datetime(dates.astype(str), format="%Y%m%d").dt.strftime("%Y-%m-%d")
+
 
+def read_snapshot(path, chunksize=snapshot_chunksize):
+    """Read a saved response of `states_url`, with one JSON record per line
 
-def download_and_save_data_raw(save_locally=True):
+    The file is parsed `chunksize` records at a time.
+    """
+    with pd.read_json(path, lines=True, chunksize=chunksize) as chunks:
+        return pd.concat(chunks, ignore_index=True)
 
-    raw_state_data = pd.read_json(states_url)
+
+def download_and_save_data_raw(save_locally=True, snapshot=None):
+
+    if snapshot is None:
+        raw_state_data = pd.read_json(states_url)
+    else:
+        raw_state_data = read_snapshot(snapshot)
 
     if save_locally:
         raw_fp = os.path.join(path_to_data, "raw/usa")
@@ -112,11 +135,7 @@ def process_and_save_data_int(states_data_raw, save_locally=True):
 
     # make sure none of the neg cases are nan if previously reported cases aren't nan
     # do this by state!
-    for state in np.unique(states_data["state"]):
-        state_idxs = states_data["state"] == state
-        states_data.loc[state_idxs, "negative"] = states_data.loc[
-            state_idxs, "negative"
-        ].fillna(method="bfill")
+    states_data["negative"] = states_data.groupby("state")["negative"].bfill()
 
     # add total not including pending.
     states_data["total_pos_plus_neg"] = (
@@ -131,7 +150,7 @@ def process_and_save_data_int(states_data_raw, save_locally=True):
     )
 
     # redo the date
-    states_data["date"] = states_data["date"].apply(format_covid_tracking_date)
+    states_data["date"] = format_covid_tracking_date(states_data["date"])
 
     # iso3
     states_data["adm0_name"] = "USA"
@@ -150,7 +169,7 @@ def process_and_save_data_int(states_data_raw, save_locally=True):
     )
 
     # rename state names.
-    states_data.loc[:, "adm1_name"] = states_data["adm1_name"].apply(acc_to_statename)
+    states_data["adm1_name"] = acc_to_statename(states_data["adm1_name"])
 
     states_data = states_data[states_columns_to_keep]
 
@@ -162,9 +181,9 @@ def process_and_save_data_int(states_data_raw, save_locally=True):
     return states_data
 
 
-def main():
+def main(snapshot=None):
     # 1. download latest datset from covidtracking.com
-    raw_states_data = download_and_save_data_raw(save_locally=True)
+    raw_states_data = download_and_save_data_raw(save_locally=True, snapshot=snapshot)
 
     # 2. process according to formatting instructions and put in int
     int_data = process_and_save_data_int(raw_states_data, save_locally=True)
@@ -175,4 +194,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="read the data from this JSON lines file (one record per line) instead "
+        "of downloading it",
+    )
+    args = parser.parse_args()
+    main(args.snapshot)
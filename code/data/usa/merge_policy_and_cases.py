@@ -1,4 +1,6 @@
+import argparse
 import os
+import re
 
 import pandas as pd
 
@@ -8,15 +10,83 @@ import src.utils as cutil
 raw_data_dir = str(cutil.DATA_RAW / "usa")
 int_data_dir = str(cutil.DATA_INTERIM / "usa")
 proc_data_dir = str(cutil.DATA_PROCESSED / "adm1")
+county_proc_data_dir = str(cutil.DATA_PROCESSED / "adm2")
+
+
+def read_usafacts_counties(confirmed_path, deaths_path=None):
+    """Read county-level cumulative cases (and deaths) from files in the format of the
+    usafacts.org downloads, with one row per county and one column per date
+
+    Counties are matched to ``adm2_pop_fips.csv`` on their FIPS codes. Statewide
+    unallocated counts (FIPS 0) and counties not found there are dropped.
+
+    Args:
+        confirmed_path (str): path to ``covid_confirmed_usafacts.csv``
+        deaths_path (str, optional): path to ``covid_deaths_usafacts.csv``
+
+    Returns:
+        pandas.DataFrame: with columns "date", "adm0_name", "adm1_name", "adm2_name",
+            "cum_confirmed_cases" and, if `deaths_path` is given, "cum_deaths"
+    """
+    counties = pd.read_csv(
+        os.path.join(int_data_dir, "adm2_pop_fips.csv"), dtype={"fips": str}
+    ).dropna(subset=["fips"])
+
+    counts = []
+    for path, col in [
+        (confirmed_path, "cum_confirmed_cases"),
+        (deaths_path, "cum_deaths"),
+    ]:
+        if path is None:
+            continue
+        wide = pd.read_csv(path)
+        fips_col = [c for c in wide.columns if c.lower() == "countyfips"][0]
+        date_cols = [
+            c for c in wide.columns if re.fullmatch(r"\d+/\d+/\d+|\d{4}-\d{2}-\d{2}", c)
+        ]
+        wide = wide[wide[fips_col] != 0]
+        # merge Wade Hampton Census Area into Kusilvak Census Area, as in
+        # download_and_clean_usafacts.R
+        wide["fips"] = (
+            wide[fips_col]
+            .astype(int)
+            .astype(str)
+            .str.zfill(5)
+            .replace("02270", "02158")
+        )
+        long = wide.melt(
+            id_vars="fips", value_vars=date_cols, var_name="date", value_name=col
+        )
+        long["date"] = pd.to_datetime(long["date"])
+        # some counties are listed more than once, keep the highest counts
+        counts.append(long.groupby(["fips", "date"])[col].max())
+    counts = pd.concat(counts, axis=1).reset_index()
+
+    unmatched = sorted(set(counts["fips"]) - set(counties["fips"]))
+    if len(unmatched) > 0:
+        print("Counties unmatched in adm dataset in usafacts cleaning:", unmatched)
 
+    cases_data = counts.merge(counties[["fips", "adm1_name", "adm2_name"]], on="fips")
+    cases_data["adm0_name"] = "USA"
+    return cases_data[
+        ["date", "adm0_name", "adm1_name", "adm2_name"]
+        + [c for c in counts if c not in ["fips", "date"]]
+    ].sort_values(["adm1_name", "adm2_name", "date"], ignore_index=True)
 
-def main():
+
+def main(incremental=False, county_cases=None, county_deaths=None):
 
     add_testing_regime = True
     output_csv_name = "USA_processed.csv"
-    out_dir = proc_data_dir
 
-    cases_data = pd.read_csv(os.path.join(int_data_dir, "usa_usafacts_state.csv"))
+    if county_cases is None:
+        cases_level = 1
+        out_dir = proc_data_dir
+        cases_data = pd.read_csv(os.path.join(int_data_dir, "usa_usafacts_state.csv"))
+    else:
+        cases_level = 2
+        out_dir = county_proc_data_dir
+        cases_data = read_usafacts_counties(county_cases, county_deaths)
     cases_data["date"] = pd.to_datetime(cases_data["date"])
 
     # drop any cases data columns that are all null
@@ -35,7 +105,23 @@ def main():
     policy_data.loc[:, "date_start"] = pd.to_datetime(policy_data["date_start"])
     policy_data["date_end"] = pd.to_datetime("2099-12-31")
 
-    df_merged = merge.assign_policies_to_panel(cases_data, policy_data, 1, method="USA")
+    previous_panel = None
+    if incremental and os.path.exists(os.path.join(out_dir, output_csv_name)):
+        # `testing_regime` in the processed data comes from the testing-regime data
+        # merged below, not from the policies, so recompute it
+        previous_panel = pd.read_csv(os.path.join(out_dir, output_csv_name)).drop(
+            columns=["testing_regime"]
+        )
+
+    df_merged = merge.assign_policies_to_panel(
+        cases_data,
+        policy_data,
+        cases_level,
+        method="USA",
+        n_jobs=-1,
+        intensity_cache_path=merge.default_intensity_cache_path,
+        previous_panel=previous_panel,
+    )
 
     if add_testing_regime:
         testimg_regime_csv = os.path.join(
@@ -84,4 +170,25 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only compute policy variables for dates and states missing from the "
+        "existing processed dataset",
+    )
+    parser.add_argument(
+        "--county-cases",
+        help="build a county-level (adm2) dataset from this usafacts-format file of "
+        "confirmed cases instead of the state-level one",
+    )
+    parser.add_argument(
+        "--county-deaths",
+        help="usafacts-format file of deaths to go with --county-cases",
+    )
+    args = parser.parse_args()
+    main(
+        incremental=args.incremental,
+        county_cases=args.county_cases,
+        county_deaths=args.county_deaths,
+    )
@@ -10,14 +10,9 @@ from src import utils as cutil
 RECOVERY_DELAYS = range(15)
 
 
-def main():
-
-    # use the default cutoff date here
-    cutoff = pd.read_csv(
-        cutil.CODE / "data" / "cutoff_dates.csv", index_col=0, parse_dates=["end_date"]
-    ).end_date.default.date()
-
-    print("Estimating removal rate (gamma) from CHN and KOR timeseries...")
+def load_gamma_inputs(cutoff):
+    """Load the combined KOR (adm1) and CHN (adm2) panel used to estimate gamma,
+    restricted to dates on or before `cutoff`."""
     ## load korea from regression-ready data
     df_kor = pd.read_csv(
         cutil.DATA_PROCESSED / "adm1" / "KOR_processed.csv", parse_dates=["date"]
@@ -40,6 +35,23 @@ def main():
     df_in = df_in.reset_index("date", drop=False).set_index(
         pd.to_datetime(df_in.index.get_level_values("date")), append=True
     )
+    return df_in
+
+
+def estimate_gamma(df_in, recovery_delays=RECOVERY_DELAYS):
+    """Estimate the removal rate (gamma) for CHN, KOR, and both pooled, for each
+    assumed delay between "no longer infectious" and "confirmed recovery".
+
+    Args:
+        df_in (pandas.DataFrame): Panel indexed by ``name`` (prefixed with the
+            country code) and ``date``, with ``cum_confirmed_cases``,
+            ``active_cases``, ``cum_recoveries``, and ``cum_deaths`` columns
+        recovery_delays (iterable of int): Recovery delays (in days) to test
+
+    Returns:
+        pandas.Series: Gamma estimates indexed by ``adm0_name`` and
+            ``recovery_delay``
+    """
 
     ## prep dataset
     df = df_in[
@@ -67,14 +79,14 @@ def main():
 
     out = pd.Series(
         index=pd.MultiIndex.from_product(
-            (("CHN", "KOR", "pooled"), RECOVERY_DELAYS),
+            (("CHN", "KOR", "pooled"), recovery_delays),
             names=["adm0_name", "recovery_delay"],
         ),
         name="gamma",
         dtype=np.float64,
     )
 
-    for l in RECOVERY_DELAYS:
+    for l in recovery_delays:
 
         # shift recoveries making sure we deal with any missing days
         # this gives us the number of confirmed recoveries at t+l,
@@ -137,6 +149,19 @@ def main():
         out.loc["KOR", l] = g_kor
         out.loc["pooled", l] = g_pooled
 
+    return out
+
+
+def main():
+
+    # use the default cutoff date here
+    cutoff = pd.read_csv(
+        cutil.CODE / "data" / "cutoff_dates.csv", index_col=0, parse_dates=["end_date"]
+    ).end_date.default.date()
+
+    print("Estimating removal rate (gamma) from CHN and KOR timeseries...")
+    out = estimate_gamma(load_gamma_inputs(cutoff))
+
     cutil.MODELS.mkdir(exist_ok=True, parents=True)
     out.to_csv(cutil.MODELS / "gamma_est.csv", index=True)
 
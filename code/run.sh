@@ -52,6 +52,7 @@ fi
 ### Geography/population
 printf "***Creating shape and population info for all countries***\n"
 python code/data/multi_country/get_adm_info.py $NDFLAG
+python code/data/multi_country/simplify_adm_geometries.py
 
 ### Policy
 if $DOWNLOAD
@@ -0,0 +1,206 @@
+"""
+Dense "policy cube" representation of merged policy panels.
+
+`src.merge.assign_policies_to_panel` produces a long table with one row per adm-unit
+and date, and up to four columns per policy: the policy itself, and its "_opt",
+"_popwt", and "_opt_popwt" variants. `panel_to_cube` packs those columns into a single
+:class:`xarray.DataArray` with dims (adm, date, policy, variant), stored as uint8 when
+all values are small integers and as float32 otherwise, so that each unit's policy time
+series is one contiguous slice. `cube_to_panel` converts back to the long format.
+"""
+
+import json
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import src.merge as cmerge
+
+# Column suffix of each variant of a policy
+VARIANTS = OrderedDict(
+    [
+        ("indicator", ""),
+        ("opt", "_opt"),
+        ("popwt", "_popwt"),
+        ("opt_popwt", "_opt_popwt"),
+    ]
+)
+
+
+def get_policy_list(df):
+    """Infer the policy categories in a merged panel
+
+    Policies are the columns that have a "_popwt" version, plus any of
+    `src.merge.exclude_from_popweights` found in `df`. "_opt" versions of policies are
+    not treated as policies of their own.
+
+    Args:
+        df (pandas.DataFrame): Output of `src.merge.assign_policies_to_panel`
+
+    Returns:
+        list of str: Policy categories, in the order of their columns in `df`
+    """
+    popwt_suffix = VARIANTS["popwt"]
+    opt_suffix = VARIANTS["opt"]
+    weighted = set(
+        c[: -len(popwt_suffix)] for c in df.columns if c.endswith(popwt_suffix)
+    )
+    weighted = set(
+        p
+        for p in weighted
+        if not (p.endswith(opt_suffix) and p[: -len(opt_suffix)] in weighted)
+    )
+    return [
+        c for c in df.columns if c in weighted or c in cmerge.exclude_from_popweights
+    ]
+
+
+def _is_small_int(values):
+    """Whether all `values` are integers from 0 to 255"""
+    values = values.astype(np.float64)
+    return bool(
+        np.isfinite(values).all()
+        and (values == np.round(values)).all()
+        and (values >= 0).all()
+        and (values <= np.iinfo(np.uint8).max).all()
+    )
+
+
+def panel_to_cube(df, adm_level, policy_list=None, adm_col=None):
+    """Convert a long policy panel to a policy cube
+
+    Args:
+        df (pandas.DataFrame): Panel with "date" and "adm{`adm_level`}_name" columns,
+            typically the output of `src.merge.assign_policies_to_panel`. Each
+            (adm-unit, date) must appear at most once.
+        adm_level (int): Adm-level of the units in `df`
+        policy_list (list of str, optional): Policy categories to pack into the cube.
+            Defaults to `get_policy_list`
+        adm_col (str, optional): Column identifying adm-units, for panels where unit
+            names are not unique (e.g. "adm2_id" for CHN). Defaults to
+            "adm{`adm_level`}_name"
+
+    Returns:
+        xarray.Dataset: With coords "adm" (sorted unit names), "date", "policy" and
+            "variant" (the keys of `VARIANTS`) and variables:
+
+            * "policy_values": (adm, date, policy, variant) values of all policy
+              columns, 0 where a column is missing from `df`. uint8 if all values are
+              integers from 0 to 255, else float32.
+            * "has_variant": (policy, variant) whether each column was present in `df`
+            * "present": (adm, date) whether each row was present in `df`
+            * every other column of `df`, with dims (adm,) if it is constant within each
+              adm-unit, else (adm, date)
+    """
+    if adm_col is None:
+        adm_col = f"adm{adm_level}_name"
+    if policy_list is None:
+        policy_list = get_policy_list(df)
+
+    dates = pd.to_datetime(df["date"])
+    adms = pd.Index(np.sort(df[adm_col].unique()))
+    date_index = pd.DatetimeIndex(np.sort(dates.unique()))
+    adm_ix = adms.get_indexer(df[adm_col])
+    date_ix = date_index.get_indexer(dates)
+
+    present = np.zeros((len(adms), len(date_index)), dtype=bool)
+    present[adm_ix, date_ix] = True
+    if present.sum() != len(df):
+        raise ValueError(f"Found duplicated rows for some ({adm_col}, date) pairs")
+
+    # the dtype is picked column by column, so that the cube is only allocated once
+    columns = dict()
+    is_small_int = True
+    for px, policy in enumerate(policy_list):
+        for vx, suffix in enumerate(VARIANTS.values()):
+            col = policy + suffix
+            if col in df.columns:
+                columns[px, vx] = col
+                is_small_int = is_small_int and _is_small_int(df[col].values)
+
+    values = np.zeros(
+        (len(adms), len(date_index), len(policy_list), len(VARIANTS)),
+        dtype=np.uint8 if is_small_int else np.float32,
+    )
+    has_variant = np.zeros((len(policy_list), len(VARIANTS)), dtype=bool)
+    for (px, vx), col in columns.items():
+        values[adm_ix, date_ix, px, vx] = df[col].values
+        has_variant[px, vx] = True
+    policy_cols = list(columns.values())
+
+    cube = xr.Dataset(
+        {
+            "policy_values": (("adm", "date", "policy", "variant"), values),
+            "has_variant": (("policy", "variant"), has_variant),
+            "present": (("adm", "date"), present),
+        },
+        coords={
+            "adm": adms.values,
+            "date": date_index.values,
+            "policy": policy_list,
+            "variant": list(VARIANTS.keys()),
+        },
+    )
+
+    other_cols = [
+        c for c in df.columns if c not in policy_cols and c not in ["date", adm_col]
+    ]
+    n_per_adm = df.groupby(adm_col)[other_cols].nunique(dropna=False)
+    first_rows = df.drop_duplicates(adm_col).set_index(adm_col).reindex(adms)
+    for col in other_cols:
+        if (n_per_adm[col] <= 1).all():
+            cube[col] = ("adm", first_rows[col].values)
+            continue
+
+        col_vals = df[col].values
+        if present.all():
+            arr = np.empty(present.shape, dtype=col_vals.dtype)
+        elif np.issubdtype(col_vals.dtype, np.number):
+            arr = np.full(present.shape, np.nan)
+        else:
+            arr = np.full(present.shape, None, dtype=object)
+        arr[adm_ix, date_ix] = col_vals
+        cube[col] = (("adm", "date"), arr)
+
+    cube.attrs["adm_col"] = adm_col
+    cube.attrs["columns"] = json.dumps(list(df.columns))
+    cube.attrs["dtypes"] = json.dumps({c: str(dt) for c, dt in df.dtypes.items()})
+    return cube
+
+
+def cube_to_panel(cube):
+    """Convert a policy cube back to a long panel
+
+    Args:
+        cube (xarray.Dataset): Output of `panel_to_cube`
+
+    Returns:
+        pandas.DataFrame: Panel with the rows, columns and column dtypes of the table
+            passed to `panel_to_cube`, sorted by date and then by adm-unit. "date" is
+            returned as datetime, and policy values only keep float32 precision.
+    """
+    adm_col = cube.attrs["adm_col"]
+    date_ix, adm_ix = np.nonzero(cube["present"].values.T)
+
+    out = {"date": cube["date"].values[date_ix], adm_col: cube["adm"].values[adm_ix]}
+
+    values = cube["policy_values"].values
+    has_variant = cube["has_variant"].values
+    for px, policy in enumerate(cube["policy"].values):
+        for vx, suffix in enumerate(VARIANTS.values()):
+            if has_variant[px, vx]:
+                out[policy + suffix] = values[adm_ix, date_ix, px, vx]
+
+    for name, var in cube.data_vars.items():
+        if name in ["policy_values", "has_variant", "present"]:
+            continue
+        if var.dims == ("adm",):
+            out[name] = var.values[adm_ix]
+        else:
+            out[name] = var.transpose("adm", "date").values[adm_ix, date_ix]
+
+    df = pd.DataFrame(out)[json.loads(cube.attrs["columns"])]
+    dtypes = json.loads(cube.attrs["dtypes"])
+    return df.astype({c: dt for c, dt in dtypes.items() if c != "date"})
@@ -0,0 +1,236 @@
+"""
+Concurrent file downloads with revalidation and a manifest of checksums.
+
+Files are streamed to disk through a shared `requests.Session` with a connection pool,
+from a pool of threads. A JSON manifest records the URL, ETag, Last-Modified date,
+size and SHA-256 checksum of every downloaded file. When a file is downloaded again,
+the request is made conditional on the ETag and Last-Modified date of the copy in the
+manifest (as long as the local file still matches its checksum), so that unchanged
+files are not transferred again.
+"""
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Files with these suffixes are decoded using the encoding given by the server and
+# written as UTF-8. If the server gives no encoding, they are written unchanged.
+TEXT_SUFFIXES = [".csv", ".txt"]
+
+DEFAULT_MAX_WORKERS = 8
+CHUNK_SIZE = 1 << 20
+
+# Outcomes of `download`
+EXISTS = "exists"
+NOT_MODIFIED = "not modified"
+DOWNLOADED = "downloaded"
+
+
+def file_sha256(path):
+    """SHA-256 checksum of the file at `path`, as a hex string"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class DownloadManifest:
+    """JSON record of downloaded files, keyed by their absolute paths
+
+    Entries can be read and updated from several threads, and are only written back to
+    disk by `save`.
+
+    Args:
+        path (str or pathlib.Path): location of the manifest. Created by `save` if it
+            doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        else:
+            self._entries = dict()
+
+    @staticmethod
+    def _key(out_path):
+        return str(Path(out_path).resolve())
+
+    def get(self, out_path):
+        """Manifest entry of `out_path`, or None if it hasn't been downloaded"""
+        with self._lock:
+            return self._entries.get(self._key(out_path))
+
+    def set(self, out_path, entry):
+        with self._lock:
+            self._entries[self._key(out_path)] = entry
+
+    def is_valid(self, out_path):
+        """Whether `out_path` exists and matches the checksum in its entry"""
+        entry = self.get(out_path)
+        return (
+            entry is not None
+            and Path(out_path).exists()
+            and file_sha256(out_path) == entry["sha256"]
+        )
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def make_session(pool_size=DEFAULT_MAX_WORKERS):
+    """`requests.Session` that keeps up to `pool_size` connections open per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _write_response(response, out_path, text):
+    """Stream the body of `response` to `out_path`, returning its checksum and size"""
+    sha = hashlib.sha256()
+    size = 0
+    # without a known encoding, any re-encoding could mangle the text
+    text = text and response.encoding is not None
+    if text:
+        decoder = codecs.getincrementaldecoder(response.encoding)(errors="replace")
+    with open(out_path, "wb") as f:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if text:
+                chunk = decoder.decode(chunk).encode("utf-8")
+            f.write(chunk)
+            sha.update(chunk)
+            size += len(chunk)
+        if text:
+            chunk = decoder.decode(b"", final=True).encode("utf-8")
+            f.write(chunk)
+            sha.update(chunk)
+            size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def download(
+    url, out_path, overwrite=False, session=None, manifest=None, text=None, timeout=60
+):
+    """Download `url` to `out_path`
+
+    The body is written to a temporary file next to `out_path`, which is only replaced
+    once the download is complete.
+
+    Args:
+        url (str): URL of the file
+        out_path (str or pathlib.Path): where to save the file
+        overwrite (bool): if False (default), existing files are kept without making a
+            request. If True, they are downloaded again, unless `manifest` shows that
+            the server's copy hasn't changed
+        session (requests.Session, optional): session to make the request with
+        manifest (DownloadManifest, optional): record of downloads, used to revalidate
+            existing files and updated with the new download
+        text (bool, optional): whether to re-encode the file as UTF-8 text, if the
+            server gives its encoding. Defaults to whether the suffix of `out_path` is
+            in `TEXT_SUFFIXES`
+        timeout (float): seconds to wait for the server to respond
+
+    Returns:
+        str: `EXISTS`, `NOT_MODIFIED` or `DOWNLOADED`
+    """
+    out_path = Path(out_path)
+    if out_path.exists() and not overwrite:
+        return EXISTS
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if text is None:
+        text = out_path.suffix in TEXT_SUFFIXES
+    if session is None:
+        session = requests
+
+    headers = dict()
+    if manifest is not None and manifest.is_valid(out_path):
+        entry = manifest.get(out_path)
+        if entry["url"] == url:
+            if entry["etag"] is not None:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"] is not None:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+    with session.get(
+        url, headers=headers, stream=True, allow_redirects=True, timeout=timeout
+    ) as response:
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        response.raise_for_status()
+
+        tmp_path = out_path.with_name(out_path.name + ".part")
+        try:
+            sha256, size = _write_response(response, tmp_path, text)
+            os.replace(tmp_path, out_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    if manifest is not None:
+        manifest.set(
+            out_path,
+            {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "size": size,
+            },
+        )
+    return DOWNLOADED
+
+
+def download_files(
+    downloads,
+    overwrite=False,
+    max_workers=DEFAULT_MAX_WORKERS,
+    manifest_path=None,
+    **kwargs,
+):
+    """Download several files at once
+
+    Args:
+        downloads (list of tuple of (str, str or pathlib.Path)): URL and output path of
+            each file
+        overwrite (bool): passed to `download`
+        max_workers (int): number of files to download at the same time
+        manifest_path (str or pathlib.Path, optional): `DownloadManifest` to revalidate
+            against and record the downloads in
+        kwargs: passed to `download`
+
+    Returns:
+        list of str: outcome of each download, as returned by `download`
+    """
+    manifest = None if manifest_path is None else DownloadManifest(manifest_path)
+    try:
+        with make_session(max_workers) as session, ThreadPoolExecutor(
+            max_workers
+        ) as executor:
+            futures = [
+                executor.submit(
+                    download, url, out_path, overwrite, session, manifest, **kwargs
+                )
+                for url, out_path in downloads
+            ]
+            return [future.result() for future in futures]
+    finally:
+        # record whichever downloads completed, even if others failed
+        if manifest is not None:
+            manifest.save()
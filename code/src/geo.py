@@ -0,0 +1,153 @@
+"""
+Loaders for the geometries and centroids of adm-units.
+
+`get_adm_info.py` saves adm-units with their full-resolution geometries in
+``data/interim/adm/adm[level]/adm[level].shp``. `write_simplified_adm` adds cheaper
+representations of the same units next to it:
+
+* ``adm[level]_centroids.csv``: names, centroids and areas, with no geometries
+* ``adm[level]_simplified_[tolerance].gpkg``: geometries simplified to each of
+  `SIMPLIFY_TOLERANCES` (in degrees), preserving the topology of each geometry
+
+`load_adm_centroids` and `load_adm_geometries` read the cheapest of these that meets
+the caller's needs, and fall back to the full-resolution files when they haven't been
+written.
+"""
+
+import geopandas as gpd
+import pandas as pd
+
+import src.pop as cpop
+
+# Tolerances (in degrees) of the simplified geometries. At the equator, 0.001 degrees
+# is about 100m.
+SIMPLIFY_TOLERANCES = [0.001, 0.01, 0.05]
+
+CENTROID_COLS = ["latitude", "longitude", "area_km2"]
+
+
+def _adm_dir(adm_level, adm_dir=None):
+    if adm_dir is None:
+        adm_dir = cpop.ADM_DIR
+    return adm_dir / f"adm{adm_level}"
+
+
+def get_full_path(adm_level, adm_dir=None):
+    """Path of the full-resolution shapefile of `adm_level`"""
+    return _adm_dir(adm_level, adm_dir) / f"adm{adm_level}.shp"
+
+
+def get_table_path(adm_level, adm_dir=None):
+    """Path of the attribute table `get_adm_info.py` writes next to the shapefile of
+    `adm_level`, with coordinates rounded to 3 decimals"""
+    return _adm_dir(adm_level, adm_dir) / f"adm{adm_level}.csv"
+
+
+def get_centroids_path(adm_level, adm_dir=None):
+    """Path of the table of centroids and areas of `adm_level`"""
+    return _adm_dir(adm_level, adm_dir) / f"adm{adm_level}_centroids.csv"
+
+
+def get_simplified_path(adm_level, tolerance, adm_dir=None):
+    """Path of the geometries of `adm_level` simplified to `tolerance` degrees"""
+    return _adm_dir(adm_level, adm_dir) / f"adm{adm_level}_simplified_{tolerance}.gpkg"
+
+
+def pick_tolerance(tolerance, available=SIMPLIFY_TOLERANCES):
+    """Coarsest of the `available` tolerances that is at most `tolerance`, or None if
+    all of them are coarser (i.e. full-resolution geometries are needed)"""
+    acceptable = [t for t in available if t <= tolerance]
+    return max(acceptable) if acceptable else None
+
+
+def write_simplified_adm(adm_level, tolerances=SIMPLIFY_TOLERANCES, adm_dir=None):
+    """Write the centroid table and simplified geometries of `adm_level` from its
+    full-resolution shapefile
+
+    Args:
+        adm_level (int): adm-level to simplify
+        tolerances (list of float): tolerances to simplify geometries to, in degrees
+        adm_dir (pathlib.Path, optional): directory with the "adm[level]" directories.
+            Defaults to `src.pop.ADM_DIR`
+    """
+    gdf = gpd.read_file(get_full_path(adm_level, adm_dir))
+    name_cols = [f"adm{i}_name" for i in range(adm_level + 1)]
+    gdf[name_cols + CENTROID_COLS].to_csv(
+        get_centroids_path(adm_level, adm_dir), index=False
+    )
+
+    has_geometry = gdf.geometry.notna()
+    for tolerance in tolerances:
+        geoms = gdf.geometry[has_geometry].simplify(tolerance, preserve_topology=True)
+        # parts of multipolygons can still end up nested in one another
+        invalid = ~geoms.is_valid
+        geoms[invalid] = geoms[invalid].buffer(0)
+
+        simplified = gdf.copy()
+        simplified.loc[has_geometry, "geometry"] = geoms
+        simplified.to_file(
+            get_simplified_path(adm_level, tolerance, adm_dir), driver="GPKG"
+        )
+
+
+def _select_country(df, country_code):
+    if country_code is None:
+        return df
+    return df[df["adm0_name"] == country_code].reset_index(drop=True)
+
+
+def load_adm_centroids(adm_level, country_code=None, adm_dir=None):
+    """Names, centroids ("latitude", "longitude") and areas ("area_km2") of adm-units
+
+    These are read from the centroid table written by `write_simplified_adm` or, if it
+    hasn't been written, from the full-resolution shapefile or failing that from
+    ``adm[level].csv`` (whose coordinates are rounded to 3 decimals).
+
+    Args:
+        adm_level (int): adm-level of the units
+        country_code (str, optional): only return the units of this country
+        adm_dir (pathlib.Path, optional): directory with the "adm[level]" directories.
+            Defaults to `src.pop.ADM_DIR`
+
+    Returns:
+        pandas.DataFrame
+    """
+    name_cols = [f"adm{i}_name" for i in range(adm_level + 1)]
+    path = get_centroids_path(adm_level, adm_dir)
+    full_path = get_full_path(adm_level, adm_dir)
+    if not path.exists() and full_path.exists():
+        df = pd.DataFrame(gpd.read_file(full_path).drop(columns="geometry"))
+    else:
+        if not path.exists():
+            path = get_table_path(adm_level, adm_dir)
+        # only empty fields are missing, so that names like "NA" are kept
+        df = pd.read_csv(path, keep_default_na=False, na_values=[""])
+    return _select_country(df[name_cols + CENTROID_COLS], country_code)
+
+
+def load_adm_geometries(adm_level, tolerance=0, country_code=None, adm_dir=None):
+    """Geometries of adm-units, simplified as far as `tolerance` allows
+
+    Args:
+        adm_level (int): adm-level of the units
+        tolerance (float): largest acceptable simplification tolerance, in degrees. The
+            coarsest simplified geometries within it are loaded, or the full-resolution
+            ones if there are none (e.g. for the default of 0)
+        country_code (str, optional): only return the units of this country
+        adm_dir (pathlib.Path, optional): directory with the "adm[level]" directories.
+            Defaults to `src.pop.ADM_DIR`
+
+    Returns:
+        geopandas.GeoDataFrame
+    """
+    available = [
+        t
+        for t in SIMPLIFY_TOLERANCES
+        if get_simplified_path(adm_level, t, adm_dir).exists()
+    ]
+    picked = pick_tolerance(tolerance, available)
+    if picked is None:
+        path = get_full_path(adm_level, adm_dir)
+    else:
+        path = get_simplified_path(adm_level, picked, adm_dir)
+    return _select_country(gpd.read_file(path), country_code)
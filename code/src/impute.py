@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 
 
 # ### Impute values in cases where cumulative counts rise and then fall
@@ -44,6 +45,75 @@ def log_interpolate(array):
     return np.round(np.exp(interp_array)).astype(np.int32)
 
 
+def convert_non_monotonic_to_nan_by_group(values, groups):
+    """`convert_non_monotonic_to_nan` applied to each group of `values` at once.
+    Args:
+        values (array-like [N,]): input values, in order within each group. Must not
+            be missing
+        groups (array-like [N,]): group (e.g. adm-unit) of each value
+    Returns:
+        numpy.ndarray [N,]: values larger than any later value of their group are
+            marked as missing
+    """
+    values = pd.Series(np.asarray(values, dtype=np.float64))
+    if values.isnull().any():
+        raise ValueError("Can't check the monotonicity of missing values")
+
+    # the values left by `convert_non_monotonic_to_nan` are those no larger than the
+    # minimum of the later values of their group
+    reverse_min = values[::-1].groupby(np.asarray(groups)[::-1]).cummin()[::-1]
+    return values.where(values <= reverse_min).values
+
+
+def log_interpolate_by_group(values, groups):
+    """`log_interpolate` applied to each group of `values` at once.
+    Args:
+        values (array-like [N,]): input values with missing values, in order within
+            each group
+        groups (array-like [N,]): group (e.g. adm-unit) of each value. Each group must
+            have at least one non-missing value
+    Returns:
+        numpy.ndarray [N,]: int64 values, with missing values filled in each group
+    """
+    values = np.asarray(values, dtype=np.float64)
+    groups = np.asarray(groups)
+    is_valid = ~np.isnan(values)
+    log_values = np.log(values.astype(np.float32) + 1e-1).astype(np.float64)
+
+    # interpolate linearly between the previous and next valid values of each group,
+    # in the same way as `numpy.interp`
+    x = pd.Series(values).groupby(groups).cumcount().values.astype(np.float64)
+    points = pd.DataFrame(
+        {
+            "xp": np.where(is_valid, x, np.nan),
+            "fp": np.where(is_valid, log_values, np.nan),
+        }
+    ).groupby(groups)
+    prev, nxt = points.ffill(), points.bfill()
+    if (prev["xp"].isnull() & nxt["xp"].isnull()).any():
+        raise ValueError("Can't interpolate groups without any values")
+
+    # slopes are 0 / 0 for valid values, which are kept as they are
+    with np.errstate(invalid="ignore"):
+        slope = (nxt["fp"].values - prev["fp"].values) / (
+            nxt["xp"].values - prev["xp"].values
+        )
+    interp_values = np.where(
+        is_valid,
+        log_values,
+        np.where(
+            prev["xp"].isnull(),
+            nxt["fp"],
+            np.where(
+                nxt["xp"].isnull(),
+                prev["fp"],
+                slope * (x - prev["xp"].values) + prev["fp"].values,
+            ),
+        ),
+    )
+    return np.round(np.exp(interp_values)).astype(np.int64)
+
+
 def impute_cumulative_df(df, src_col, dst_col, groupby_col):
     """Calculates imputed columns and returns 
     Args:
@@ -58,19 +128,14 @@ def impute_cumulative_df(df, src_col, dst_col, groupby_col):
         >>> impute_cumulative_df(pandas.DataFrame([[0, 'a'], [5, 'b'], [3, 'a'], [2, 'a'], [6, 'b']]), 0, 1)
         pandas.DataFrame([[0, 'a', 0], [5, 'b', 5], [3, 'a', 0], [2, 'a', 2], [6, 'b', 6]], columns=[0, 1, 'imputed'])
     """
-    if dst_col not in df.columns:
-        df[dst_col] = -1
+    groups = df[groupby_col].values
+    is_valid = df[src_col].notnull().values
 
-    for adm_name in df[groupby_col].unique():
-        sub = df.loc[df[groupby_col] == adm_name].copy()
-
-        # Set rising-then-falling cumulative counts to null in the original column
-        sub.loc[sub[src_col].notnull(), src_col] = convert_non_monotonic_to_nan(
-            np.array(sub.loc[sub[src_col].notnull(), src_col])
-        )
-
-        sub[dst_col] = log_interpolate(sub[src_col])
+    # Set rising-then-falling cumulative counts to null in the original column
+    df.loc[is_valid, src_col] = convert_non_monotonic_to_nan_by_group(
+        df.loc[is_valid, src_col], groups[is_valid]
+    )
 
-        df.loc[df[groupby_col] == adm_name] = sub
+    df[dst_col] = log_interpolate_by_group(df[src_col], groups)
 
     return df
@@ -1,7 +1,14 @@
 import copy
 import datetime
-import pickle
+import hashlib
+import multiprocessing
+import os
 import json
+import pickle
+import sqlite3
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
@@ -20,6 +27,13 @@ path_intensity_coding_rules = cutil.DATA_RAW / "usa" / "intensity_coding_rules.j
 with open(path_intensity_coding_rules) as js:
     us_intensity_rules = json.load(js)
 
+# Default location of the `IntensityCache` used by the merge scripts
+default_intensity_cache_path = cutil.HOME / ".cache" / "policy_intensities.sqlite"
+
+# Bump when the output of `calculate_intensities_adm_day_policy` changes for the same
+# inputs, to invalidate existing `IntensityCache` entries
+INTENSITY_CACHE_VERSION = 2
+
 
 def count_policies_enacted(df, policy_list):
     """Count number of (non-pop-weighted) policy variables enacted on each row of `df`
@@ -41,108 +55,213 @@ def count_policies_enacted(df, policy_list):
 
 def get_policy_level(row):
     # Assign policy_level to distinguish policies specified at different admin-unit levels
-    adm_levels = sorted(
-        [
-            int(col[3])
-            for col in row.keys()
-            if col.startswith("adm") and col.endswith("name")
-        ],
-        reverse=True,
-    )
-    for level in adm_levels:
+    for level in reversed(cpop.get_adm_levels(row.keys())):
         if row[f"adm{level}_name"].lower() != "all":
             return level
     return 0
 
 
-def get_intensities(policies, adm_level):
-    if len(policies) == 0:
-        return (0, 0)
+class PolicySchema:
+    """Adm-level structure of a policy table
 
-    adm_levels = sorted(
-        [
-            int(col[3])
-            for col in policies.columns
-            if col.startswith("adm") and col.endswith("name")
-        ]
-    )
-    adm_lower_levels = [l for l in adm_levels if l <= adm_level]
-    adm_higher_levels = [l for l in adm_levels if l > adm_level]
+    Computed once per policy table by `assign_policies_to_panel` and passed down to the
+    functions that calculate intensities, rather than rediscovered from column names for
+    every (adm-unit, date, policy).
 
-    # Calculate max intensity of units at this level and below (lower res), and set as default against which
-    # other levels will compare
-    default_policy_intensity = np.nanmax(
-        [
-            policies.loc[
-                policies["policy_level"].isin(adm_lower_levels), "policy_intensity"
-            ].max(),
-            0,
-        ]
+    Args:
+        policies (pandas.DataFrame): table of policies, with "adm{level}_name" columns
+
+    Attributes:
+        adm_levels (list of int): adm-levels with a name column, in ascending order
+        name_cols (list of str): the "adm{level}_name" columns, in the order of
+            `adm_levels`
+        is_specified (numpy.ndarray of bool): for each policy (row) and adm-level
+            (column), whether the policy names a unit at that level rather than
+            applying to "All" units
+        policy_level (numpy.ndarray of int): highest adm-level at which each policy
+            names a unit, as given by `get_policy_level`
+    """
+
+    def __init__(self, policies):
+        self.adm_levels = cpop.get_adm_levels(policies.columns)
+        self.name_cols = [f"adm{level}_name" for level in self.adm_levels]
+
+        names = policies[self.name_cols].values.astype(str)
+        self.is_specified = np.char.lower(names) != "all"
+        self.policy_level = np.where(
+            self.is_specified, np.array(self.adm_levels), 0
+        ).max(axis=1, initial=0)
+
+    @property
+    def max_level(self):
+        return max(self.adm_levels)
+
+    def lower_levels(self, adm_level):
+        """adm-levels at or above `adm_level` (i.e. at lower resolution)"""
+        return [l for l in self.adm_levels if l <= adm_level]
+
+    def higher_levels(self, adm_level):
+        """adm-levels below `adm_level` (i.e. at higher resolution)"""
+        return [l for l in self.adm_levels if l > adm_level]
+
+    def is_specified_at(self, level):
+        """Whether each policy names a unit at `level`"""
+        return self.is_specified[:, self.adm_levels.index(level)]
+
+    def take(self, positions):
+        """Schema of the policies at `positions` of the table"""
+        schema = copy.copy(self)
+        schema.is_specified = self.is_specified[positions]
+        schema.policy_level = self.policy_level[positions]
+        return schema
+
+
+def _sum_by_state(values, state_ix, n_states):
+    """Sum `values` within each state, skipping NaNs"""
+    return np.bincount(
+        state_ix, weights=np.where(np.isnan(values), 0, values), minlength=n_states
     )
 
-    # Initialize final reported intensity to default intensity
-    total_intensity = default_policy_intensity
-    max_intensity = policies["policy_intensity"].max()
-
-    level2_adm_intensities = pd.DataFrame()
-    for level in adm_higher_levels:
-        if level == 3 and len(adm_higher_levels) == 2:
-            # Set policy_intensity to maximum between this policy_intensity and the highest policy_intensity
-            # applied at the adm2 level for this adm3's adm2
-            # check the lists to see if there is an adm2_policy which matches adm2's level and has a higher intensity
-            has_adm2_intensity = (policies["policy_level"] == 3) & (
-                policies["adm2_name"].isin(level2_adm_intensities.index)
-            )
 
-            policies["adm2_policy_intensity"] = 0
-            policies.loc[has_adm2_intensity, "adm2_policy_intensity"] = policies.loc[
-                has_adm2_intensity, "adm2_name"
-            ].apply(lambda x: level2_adm_intensities.loc[x, "policy_intensity"])
+def get_intensities_batched(policies, adm_level, state_col="state", schema=None):
+    """Calculate total and maximum policy intensities for many sets of policies at once
+
+    Each set of policies (a "state", e.g. the policies of one category in effect in one
+    adm-unit on one day) is a segment of the rows of `policies`, identified by
+    `state_col`. The total intensity of a state is the highest intensity of its
+    policies at or below `adm_level`, plus the population-weighted extra intensity of
+    its policies at higher adm-levels. Where there are policies at both adm2 and adm3
+    below `adm_level`, adm3 policies only count beyond the intensity of the adm2 policy
+    of their adm2 unit.
+
+    Args:
+        policies (pandas.DataFrame): policies of all states, with "policy_level",
+            "policy_intensity", adm-name and adm-pop columns
+        adm_level (int): adm-level of the units the states apply to
+        state_col (str): column identifying the state of each row
+        schema (PolicySchema, optional): schema of the policy table the states were
+            taken from. Computed from `policies` if not given
+
+    Returns:
+        pandas.DataFrame: "total_intensity" and "max_intensity" of each state in
+            `policies`, indexed by state
+    """
+    if schema is None:
+        schema = PolicySchema(policies)
+    adm_lower_levels = schema.lower_levels(adm_level)
+    adm_higher_levels = schema.higher_levels(adm_level)
+
+    states = policies[state_col].values
+    policy_level = policies["policy_level"].values
+    by_state = policies["policy_intensity"].groupby(states)
+    state_index = by_state.max().index
+    state_ix = state_index.get_indexer(states)
+    n_states = len(state_index)
+
+    # Max intensity of each state, in the dtype of `policy_intensity`
+    max_intensity = by_state.max()
+
+    # Calculate max intensity of units at this level and below (lower res), and set as
+    # default against which other levels will compare
+    is_lower = np.isin(policy_level, adm_lower_levels)
+    lower_max = (
+        policies.loc[is_lower, "policy_intensity"]
+        .groupby(states[is_lower])
+        .max()
+        .reindex(state_index)
+    )
+
+    if len(adm_higher_levels) == 0:
+        total_intensity = pd.Series(
+            [np.nanmax([m, 0]) for m in lower_max], index=state_index, dtype=object
+        )
+        return pd.DataFrame(
+            {"total_intensity": total_intensity, "max_intensity": max_intensity}
+        )
 
-            use_adm3_and_has_adm2 = (has_adm2_intensity) & (
-                policies["policy_intensity"] > policies["adm2_policy_intensity"]
+    default_policy_intensity = np.fmax(lower_max.values.astype(float), 0)
+    default_by_row = default_policy_intensity[state_ix]
+    total_intensity = default_policy_intensity.copy()
+
+    intensity = policies["policy_intensity"].values.astype(float)
+    adm_pop = policies[f"adm{adm_level}_pop"].values.astype(float)
+    # Extra intensities are computed for all rows and then masked, so rows that don't
+    # count may divide by missing or zero populations
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for level in adm_higher_levels:
+            # Share of the unit's population covered by each policy. Sub-units coded
+            # with more people than their unit (e.g. New York City, which spans five
+            # counties, in New York County) cover all of it
+            pop_share = np.minimum(
+                policies[f"adm{level}_pop"].values.astype(float) / adm_pop, 1
             )
+            if level == 3 and len(adm_higher_levels) == 2:
+                # Only count the intensity of adm3 policies beyond the highest intensity
+                # applied at the adm2 level for this adm3's adm2
+                adm2_intensity = level2_intensities.reindex(
+                    pd.MultiIndex.from_arrays([states, policies["adm2_name"].values])
+                ).values
+                use_adm3_and_has_adm2 = (policy_level == 3) & (
+                    intensity > adm2_intensity
+                )
+                additional = np.where(
+                    use_adm3_and_has_adm2, (intensity - adm2_intensity) * pop_share, 0,
+                )
+                total_intensity += _sum_by_state(additional, state_ix, n_states)
+
+                # Make sure not to count these ones again (but there may be other adm3
+                # policies with higher intensity than the default, without corresponding
+                # adm2 intensities)
+                intensity = np.where(use_adm3_and_has_adm2, 0, intensity)
+
+            elif level == 2 and len(adm_higher_levels) == 2:
+                # Maximum adm2 policy intensities so that adm3 can compare
+                is_level2 = policy_level == 2
+                level2_intensities = (
+                    pd.Series(intensity[is_level2])
+                    .groupby(
+                        [states[is_level2], policies["adm2_name"].values[is_level2]]
+                    )
+                    .max()
+                )
 
-            additional_policy_intensities = (
-                policies.loc[use_adm3_and_has_adm2, "policy_intensity"]
-                - policies.loc[use_adm3_and_has_adm2, "adm2_policy_intensity"]
-            ) * (
-                policies.loc[use_adm3_and_has_adm2, f"adm3_pop"]
-                / policies.loc[use_adm3_and_has_adm2, f"adm{adm_level}_pop"]
+            this_adm_higher_than_adm = (policy_level == level) & (
+                intensity > default_by_row
             )
+            additional = np.where(
+                this_adm_higher_than_adm, (intensity - default_by_row) * pop_share, 0,
+            )
+            total_intensity += _sum_by_state(additional, state_ix, n_states)
 
-            total_intensity += additional_policy_intensities.sum()
+    # With consistent populations the total is a population-weighted average of the
+    # intensities, so at most the highest one. Sub-units can add up to more people than
+    # their unit where they cross its borders (e.g. Oklahoma City and Edmond in
+    # Oklahoma County), so cap it there
+    total_intensity = np.fmin(total_intensity, max_intensity.values.astype(float))
 
-            # Make sure not to count these ones again (but we don't continue the loop because there may be
-            # other adm3 policies with higher policy_intensity than default intensity, without corresponding
-            # adm2 intensities. Save maximum intensity found here in case it is the max in the whole dataset
-            # because then we want the `policy` column to reflect this maximum
-            policies.loc[use_adm3_and_has_adm2, "policy_intensity"] = 0
+    too_high = total_intensity > 1
+    assert not too_high.any(), policies[np.isin(states, state_index[too_high])]
 
-        elif level == 2 and len(adm_higher_levels) == 2:
-            # Assign maximum adm2 policy intensities so that adm3 can compare
-            level2_adm_intensities = (
-                policies[policies["policy_level"] == 2]
-                .groupby("adm2_name")[["policy_intensity"]]
-                .max()
-            )
+    return pd.DataFrame(
+        {"total_intensity": total_intensity, "max_intensity": max_intensity},
+        index=state_index,
+    )
 
-        this_adm_higher_than_adm = (policies["policy_level"] == level) & (
-            policies["policy_intensity"] > default_policy_intensity
-        )
-        additional_policy_intensities = (
-            policies.loc[this_adm_higher_than_adm, "policy_intensity"]
-            - default_policy_intensity
-        ) * (
-            policies.loc[this_adm_higher_than_adm, f"adm{level}_pop"]
-            / policies.loc[this_adm_higher_than_adm, f"adm{adm_level}_pop"]
-        )
 
-        total_intensity += additional_policy_intensities.sum()
+def get_intensities(policies, adm_level, schema=None):
+    """Total and maximum intensity of a single set of policies. See
+    `get_intensities_batched`
 
-    assert total_intensity <= 1, f"{total_intensity}, {policies}, {adm_level}"
+    Returns:
+        tuple of (float, float)
+    """
+    if len(policies) == 0:
+        return (0, 0)
 
-    return total_intensity, max_intensity
+    intensities = get_intensities_batched(
+        policies.assign(state=0), adm_level, schema=schema
+    )
+    return (intensities.at[0, "total_intensity"], intensities.at[0, "max_intensity"])
 
 
 def preduce(policies, replaces):
@@ -262,9 +381,21 @@ def calculate_intensities_usa(policies_to_date, adm_level, policy):
     return policies_to_date
 
 
-def calculate_intensities_adm_day_policy(
-    policies_to_date, adm_level, policy, method="ITA"
+def split_optional_policies(
+    policies_to_date, adm_level, policy, method="ITA", schema=None
 ):
+    """Split the policies in effect into mandatory and optional policies, and the
+    mandatory policies overlapping optional ones
+
+    Optional policies covered by a mandatory policy are dropped. Where a mandatory
+    policy covers an optional one, the overlap takes the intensity of the optional
+    policy, so that the full optional intensity (but no more) can be subtracted.
+
+    Returns:
+        tuple of (pandas.DataFrame, pandas.DataFrame, pandas.DataFrame or None):
+            Mandatory, optional and overlapping policies. The overlap is None unless
+            there are both mandatory and optional policies
+    """
     if method == "USA":
         if policy in us_intensity_rules:
             policies_to_date = calculate_intensities_usa(
@@ -273,17 +404,9 @@ def calculate_intensities_adm_day_policy(
         else:
             policies_to_date["policy_intensity"] = 1
 
-    adm_name = f"adm{adm_level}_name"
-    adm_intensity = f"adm{adm_level}_policy_intensity"
-    adm_levels = sorted(
-        [
-            int(col[3])
-            for col in policies_to_date.columns
-            if col.startswith("adm") and col.endswith("name")
-        ]
-    )
-    adm_lower_levels = [l for l in adm_levels if l <= adm_level]
-    adm_higher_levels = [l for l in adm_levels if l > adm_level]
+    if schema is None:
+        schema = PolicySchema(policies_to_date)
+    adm_levels = schema.adm_levels
 
     def in_other(row, other):
         """Find any rows in `other` that cover the area covered by the policy `row`, returning the maximum
@@ -305,227 +428,641 @@ def calculate_intensities_adm_day_policy(
     policies_opt = policies_to_date[is_opt].copy()
     policies_mand = policies_to_date[~is_opt].copy()
 
-    if len(policies_opt) > 0 and len(policies_mand) > 0:
-        # Apply logic of calculating mandatory policies fully,
-        # calculating optional policies by taking the full value
-        # and subtracting the value of those policies that have
-        # overlap with mandatory policies
+    if len(policies_opt) == 0 or len(policies_mand) == 0:
+        return policies_mand, policies_opt, None
 
-        policies_opt["intensity_in_mand"] = policies_opt.apply(
-            lambda row: in_other(row, policies_mand), axis=1
-        )
-        policies_opt = policies_opt[policies_opt["intensity_in_mand"] == 0]
-        policies_mand["intensity_in_opt"] = policies_mand.apply(
-            lambda row: in_other(row, policies_opt), axis=1
-        )
+    policies_opt["intensity_in_mand"] = policies_opt.apply(
+        lambda row: in_other(row, policies_mand), axis=1
+    )
+    policies_opt = policies_opt[policies_opt["intensity_in_mand"] == 0]
+    policies_mand["intensity_in_opt"] = policies_mand.apply(
+        lambda row: in_other(row, policies_opt), axis=1
+    )
 
-        # Set `policies_overlap` to the mandatory policies that are found in `policies_opt`, with `policy_intensity`
-        # replaced by the intensity found in the corresponding row of `policies_opt`
-        policies_overlap = policies_mand[policies_mand["intensity_in_opt"] > 0].copy()
-        policies_overlap = policies_overlap.drop(columns=["policy_intensity"])
-        policies_overlap = policies_overlap.rename(
-            columns={"intensity_in_opt": "policy_intensity"}
-        )
+    # Set `policies_overlap` to the mandatory policies that are found in `policies_opt`, with `policy_intensity`
+    # replaced by the intensity found in the corresponding row of `policies_opt`
+    policies_overlap = policies_mand[policies_mand["intensity_in_opt"] > 0].copy()
+    policies_overlap = policies_overlap.drop(columns=["policy_intensity"])
+    policies_overlap = policies_overlap.rename(
+        columns={"intensity_in_opt": "policy_intensity"}
+    )
 
-        total_mandatory_intensity, mandatory_intensity_indicator = get_intensities(
-            policies_mand, adm_level
-        )
-        subtotal_optional_intensity, optional_intensity_indicator = get_intensities(
-            policies_opt, adm_level
-        )
-        total_overlap_intensity, overlap_intensity_indicator = get_intensities(
-            policies_overlap, adm_level
+    return policies_mand, policies_opt, policies_overlap
+
+
+def get_intensities_by_state(policies_by_state, adm_level, schema=None):
+    """Run `get_intensities_batched` on a list of sets of policies
+
+    Sets are batched by the dtype of their "policy_intensity", so that the maximum
+    intensities keep the type `get_intensities` would give them.
+
+    Returns:
+        list of tuple of (float, float): Total and maximum intensity of each set of
+            policies, (0, 0) for empty sets
+    """
+    results = [(0, 0)] * len(policies_by_state)
+    batches = dict()
+    for state, policies in enumerate(policies_by_state):
+        if len(policies) > 0:
+            dtype = policies["policy_intensity"].dtype
+            batches.setdefault(dtype, []).append(policies.assign(state=state))
+
+    for batch in batches.values():
+        intensities = get_intensities_batched(
+            pd.concat(batch, ignore_index=True), adm_level, schema=schema
         )
+        for state, total, max_intensity in intensities.itertuples():
+            results[state] = (total, max_intensity)
 
-        total_optional_intensity = subtotal_optional_intensity - total_overlap_intensity
-        assert total_optional_intensity >= 0
-    else:
-        # If there are not both mandatory and optional policies, just get the intensities of those DataFrames
-        # individually, without worrying about overlap
-        if len(policies_opt) == 0:
-            total_optional_intensity, optional_intensity_indicator = (0, 0)
-        else:
-            total_optional_intensity, optional_intensity_indicator = get_intensities(
-                policies_opt, adm_level
+    return results
+
+
+def calculate_intensities_batched(
+    policies_by_state, adm_level, policy, method="ITA", schema=None
+):
+    """Calculate the policy variables of many sets of policies in effect at once
+
+    Args:
+        policies_by_state (list of pandas.DataFrame): policies in effect in each state
+            (adm-unit and day)
+        adm_level (int): adm-level of the units the states apply to
+        policy (str): name of policy category
+        method (str): intensity calculation method
+        schema (PolicySchema, optional): schema of the policy table the states were
+            taken from. Computed for each state if not given
+
+    Returns:
+        list of tuple of (float, float, float, float): (intensity, indicator, optional
+            intensity, optional indicator) of each state
+    """
+    splits = [
+        split_optional_policies(policies_to_date, adm_level, policy, method, schema)
+        for policies_to_date in policies_by_state
+    ]
+    mandatory = get_intensities_by_state([s[0] for s in splits], adm_level, schema)
+    optional = get_intensities_by_state([s[1] for s in splits], adm_level, schema)
+    overlap = get_intensities_by_state(
+        [s[1].iloc[:0] if s[2] is None else s[2] for s in splits], adm_level, schema
+    )
+
+    results = []
+    for split, mand, opt, over in zip(splits, mandatory, optional, overlap):
+        total_mandatory_intensity, mandatory_intensity_indicator = mand
+        total_optional_intensity, optional_intensity_indicator = opt
+
+        # Calculate mandatory policies fully, and optional policies by taking the full
+        # value and subtracting the value of those policies that have overlap with
+        # mandatory policies
+        if split[2] is not None:
+            total_optional_intensity = total_optional_intensity - over[0]
+            assert total_optional_intensity >= 0
+
+        # For the policy indicator, ensure that not both are counted
+        if optional_intensity_indicator > 0 and mandatory_intensity_indicator > 0:
+            optional_intensity_indicator = 0
+
+        results.append(
+            (
+                total_mandatory_intensity,
+                mandatory_intensity_indicator,
+                total_optional_intensity,
+                optional_intensity_indicator,
             )
+        )
 
-        if len(policies_mand) == 0:
-            total_mandatory_intensity, mandatory_intensity_indicator = (0, 0)
-        else:
-            total_mandatory_intensity, mandatory_intensity_indicator = get_intensities(
-                policies_mand, adm_level
+    return results
+
+
+def calculate_intensities_adm_day_policy(
+    policies_to_date, adm_level, policy, method="ITA", schema=None
+):
+    return calculate_intensities_batched(
+        [policies_to_date], adm_level, policy, method, schema
+    )[0]
+
+
+class IntensityCache:
+    """On-disk cache of `calculate_intensities_adm_day_policy` results, so that
+    re-running a merge only recomputes the intensities of policy states whose rows
+    have changed
+
+    Results are stored in a sqlite database, keyed by `get_key`. New results are kept
+    in memory until `flush` is called. Each process opens its own connection, so the
+    cache can be shared with forked worker processes.
+
+    Args:
+        path (str or pathlib.Path): sqlite database file, created if needed
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._pending = dict()
+        self._connections = dict()
+
+    def _connect(self):
+        pid = os.getpid()
+        if pid not in self._connections:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=60)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS intensities "
+                "(key TEXT PRIMARY KEY, result BLOB)"
             )
+            self._connections[pid] = conn
+        return self._connections[pid]
 
-    # For the policy indicator, ensure that not both are counted
-    if optional_intensity_indicator > 0 and mandatory_intensity_indicator > 0:
-        optional_intensity_indicator = 0
+    @staticmethod
+    def get_key(policies_to_date, adm_level, policy, method):
+        """Content hash of the inputs to `calculate_intensities_adm_day_policy`,
+        including the US intensity coding rules when `method` is "USA"
 
-    result = (
-        total_mandatory_intensity,
-        mandatory_intensity_indicator,
-        total_optional_intensity,
-        optional_intensity_indicator,
-    )
-    return result
+        Returns:
+            str
+        """
+        params = [INTENSITY_CACHE_VERSION, adm_level, policy, method]
+        if method == "USA":
+            params.append(us_intensity_rules)
+        h = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+        h.update(json.dumps(list(policies_to_date.columns)).encode())
+        h.update(pd.util.hash_pandas_object(policies_to_date, index=False).values)
+        return h.hexdigest()
+
+    def get(self, key):
+        """Cached result for `key`, or None if there is none"""
+        if key in self._pending:
+            return self._pending[key]
+        row = (
+            self._connect()
+            .execute("SELECT result FROM intensities WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if row is None else pickle.loads(row[0])
+
+    def set(self, key, result):
+        self._pending[key] = result
+
+    def flush(self):
+        """Write results added by `set` to disk"""
+        if len(self._pending) == 0:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO intensities VALUES (?, ?)",
+                [(k, pickle.dumps(v)) for k, v in self._pending.items()],
+            )
+        self._pending = dict()
 
 
-def get_policy_vals(
-    policies,
-    policy,
-    date,
-    adm,
-    adm1,
-    adm_level,
-    policy_pickle_dict,
-    policies_to_date_cache,
-    method="ITA",
+def get_state_vals(
+    states, adm_level, policy, policy_index, method="ITA", intensity_cache=None
 ):
-    """Assign all policy variables from `policies` to `cases_df`
+    """Calculate the values of the policy variables for `policy` for each distinct set
+    of policies in effect
+
     Args:
-        policies (pandas.DataFrame): table of policies, listed by date and regions affected
+        states (dict of bytes to numpy.ndarray): positions in `policy_index` of the
+            policies in effect, keyed by their bytes
+        adm_level (int): level of admin-units on which policies are applied
         policy (str): name of policy category to be applied
-        date (datetime.datetime): date on which policies are applied
-        adm (str): name of admin-unit on which policies are applied
-        adm1 (str) name of adm1 unit within which policies are applied (necessary if `adm` is an adm2 unit)
-        adm_level (int): level of admin-unit on which policies are applied
-        policy_pickle_dict (dict of dicts): Dictionary with keys `adm` and a pickled version of
-            `policies_to_date` (computed within this function) to get result if it has already
-            been computed. Though messy, this saves a lot of time
+        policy_index (PolicyIntervalIndex): index of the policies in effect by adm-unit
+            and date
+        method (str): intensity calculation method
+        intensity_cache (IntensityCache, optional): on-disk cache of results from
+            previous runs
 
     Returns:
-        tuple of (float, float): Tuple representing (intensity, pop-weighted-intensity) of `adm`
-            on `date` for `policy`
+        dict of bytes to tuple of (float, float, float, float): (intensity, indicator,
+            optional intensity, optional indicator) for each key of `states`
     """
-    adm_name = f"adm{adm_level}_name"
+    results = dict()
+    to_compute = dict()
+    for key, positions in states.items():
+        if len(positions) == 0:
+            results[key] = (0, 0, 0, 0)
+            continue
 
-    adm_levels = sorted(
-        [
-            int(col[3])
-            for col in policies.columns
-            if col.startswith("adm") and col.endswith("name")
-        ]
+        policies_to_date = policy_index.policies.iloc[positions].reset_index(drop=True)
+        cache_key = None
+        if intensity_cache is not None:
+            cache_key = intensity_cache.get_key(
+                policies_to_date, adm_level, policy, method
+            )
+            cached = intensity_cache.get(cache_key)
+            if cached is not None:
+                results[key] = cached
+                continue
+        to_compute[key] = (policies_to_date, cache_key)
+
+    computed = calculate_intensities_batched(
+        [policies_to_date for policies_to_date, _ in to_compute.values()],
+        adm_level,
+        policy,
+        method,
+        policy_index.schema,
     )
+    for (key, (_, cache_key)), result in zip(to_compute.items(), computed):
+        results[key] = result
+        if intensity_cache is not None:
+            intensity_cache.set(cache_key, result)
 
-    policies_to_date = policies_to_date_cache[adm][policy][str(date)[:10]]
+    return results
 
-    if len(policies_to_date) == 0:
-        return (0, 0, 0, 0)
 
-    # Check if `policies_to_date` result has already been computed for `adm`, use that result if so
-    psave = pickle.dumps(policies_to_date)
-    if adm not in policy_pickle_dict:
-        policy_pickle_dict[adm] = dict()
-    if psave in policy_pickle_dict[adm]:
-        return policy_pickle_dict[adm][psave]
-    else:
-        result = calculate_intensities_adm_day_policy(
-            policies_to_date.copy(), adm_level, policy, method
-        )
-        policy_pickle_dict[adm][psave] = result
+def initialize_panel(cases_df, cases_level, policy_list, policy_popwts):
+    """Initialize a panel of all dates and adm-units in `cases_df`, with policy columns
+    set to 0
 
-    return result
+    Adm-units are identified by their names at every level from adm1 to `cases_level`,
+    as lower-level names are not unique across the country (e.g. US counties). Names
+    are stored as categoricals, and the panel is built from their codes so that large
+    numbers of units don't need a MultiIndex or object columns.
 
+    Args:
+        cases_df (pandas.DataFrame): table with "date" and adm-name columns
+        cases_level (int): adm-level of the panel
+        policy_list (list of str): policy columns
+        policy_popwts (list of str): pop-weighted policy columns
 
-def initialize_panel(cases_df, cases_level, policy_list, policy_popwts):
-    date_min = cases_df["date"].min()
-    date_max = cases_df["date"].max()
-
-    # Initalize panel with same structure as `cases_df`
-    policy_panel = (
-        pd.DataFrame(
-            index=pd.MultiIndex.from_product(
-                [
-                    pd.date_range(date_min, date_max),
-                    sorted(cases_df[f"adm{cases_level}_name"].unique()),
-                ]
-            ),
-            columns=policy_list + policy_popwts,
+    Returns:
+        pandas.DataFrame: panel sorted by date and adm-unit name, with columns "date",
+            "adm1_name", ..., "adm{`cases_level`}_name", and `policy_list` +
+            `policy_popwts` as int columns of zeros
+    """
+    adm_cols = cpop.get_adm_fields(cases_level)
+    dates = pd.date_range(cases_df["date"].min(), cases_df["date"].max())
+    units = cases_df[adm_cols].drop_duplicates().sort_values(adm_cols[::-1])
+
+    keys = {"date": dates.repeat(len(units))}
+    for col in adm_cols:
+        names = pd.Categorical(units[col])
+        keys[col] = pd.Categorical.from_codes(
+            np.tile(names.codes, len(dates)), names.categories
         )
-        .reset_index()
-        .rename(columns={"level_0": "date", "level_1": f"adm{cases_level}_name"})
-        .fillna(0)
+
+    policy_cols = policy_list + policy_popwts
+    return pd.concat(
+        [
+            pd.DataFrame(keys),
+            pd.DataFrame(
+                np.zeros((len(dates) * len(units), len(policy_cols)), dtype=int),
+                columns=policy_cols,
+            ),
+        ],
+        axis=1,
     )
 
-    if cases_level == 2:
-        adm2_to_adm1 = (
-            cases_df[["adm1_name", "adm2_name"]]
-            .drop_duplicates()
-            .set_index("adm2_name")["adm1_name"]
+
+class PolicyIntervalIndex:
+    """Index of the policies in effect for each adm-unit, policy category and date
+
+    A policy is in effect from its `date_start` to its `date_end` (inclusive) in every
+    adm-unit covered by its scope at each level from adm1 to `adm_level`, as given by
+    `PolicySchema.is_specified`. The positions of the policies whose scope covers an
+    (adm-unit, policy category) are found on first use and kept sorted by start date,
+    so the policies in effect on a given date are found by binary search.
+
+    Args:
+        policies (pandas.DataFrame): table of policies, listed by date and regions affected
+        adm_level (int): adm-level of the panel the policies are assigned to
+        schema (PolicySchema, optional): schema of `policies`. Computed if not given
+
+    Attributes:
+        policies (pandas.DataFrame): `policies`, sorted by start date
+        schema (PolicySchema): schema of `self.policies`
+    """
+
+    def __init__(self, policies, adm_level, schema=None):
+        if schema is None:
+            schema = PolicySchema(policies)
+        # Sorting doesn't depend on the index, so the positions of the sorted rows can be
+        # found from a copy with a range index
+        order = policies.reset_index(drop=True).sort_values("date_start").index.values
+        self.policies = policies.iloc[order]
+        self.schema = schema.take(order)
+        self.adm_level = adm_level
+
+        self._starts = self.policies["date_start"].values
+        self._ends = self.policies["date_end"].values
+        self._groups = self.policies.groupby("policy", sort=False).indices
+        # (name of each policy, whether it applies to all units) at each level of the
+        # units' names
+        self._levels = [
+            (
+                self.policies[f"adm{level}_name"].values,
+                ~self.schema.is_specified_at(level),
+            )
+            for level in range(1, adm_level + 1)
+        ]
+
+        # (unit, policy) -> (positions, start dates) of the policies covering `unit`
+        self._scopes = dict()
+
+    def _get_scope(self, unit, policy):
+        key = (unit, policy)
+        if key not in self._scopes:
+            positions = self._groups.get(policy, np.array([], dtype=int))
+            in_scope = np.ones(len(positions), dtype=bool)
+            for name, (names, applies_to_all) in zip(unit, self._levels):
+                in_scope &= applies_to_all[positions] | (names[positions] == name)
+            positions = positions[in_scope]
+            self._scopes[key] = (positions, self._starts[positions])
+        return self._scopes[key]
+
+    def _active_in_scope(self, positions, starts, date):
+        started = positions[: np.searchsorted(starts, date, side="right")]
+        return started[self._ends[started] >= date]
+
+    def active_positions(self, unit, policy, date):
+        """Positions in `self.policies` of the `policy` policies in effect in `unit` on
+        `date`, in order of their start dates
+
+        Args:
+            unit (tuple of str): names of the admin-unit from adm1 to `adm_level`. The
+                name alone can be given for adm1 units
+            policy (str): name of policy category
+            date (datetime.datetime): date on which policies are applied
+
+        Returns:
+            numpy.ndarray of int
+        """
+        if isinstance(unit, str):
+            unit = (unit,)
+        positions, starts = self._get_scope(unit, policy)
+        return self._active_in_scope(
+            positions, starts, pd.Timestamp(date).to_datetime64()
         )
-        adm1s = policy_panel["adm2_name"].apply(lambda x: adm2_to_adm1.loc[x])
-        policy_panel.insert(1, "adm1_name", adm1s)
 
-    return policy_panel
+    def active(self, unit, policy, date):
+        """The `policy` policies in effect in `unit` on `date`
 
+        Returns:
+            pandas.DataFrame: rows of `self.policies`, in order of their start dates
+        """
+        positions = self.active_positions(unit, policy, date)
+        return self.policies.iloc[positions].reset_index(drop=True)
+
+    def active_states(self, units, policy, dates):
+        """The distinct sets of `policy` policies in effect ("states") in each of
+        `units` on each of `dates`
+
+        Units covered by the same policies share their states, and the policies in
+        effect in a unit are only looked up on the dates where they can change (start
+        dates and the days after end dates), rather than on every date.
+
+        Args:
+            units (list of tuple of str): names of admin-units from adm1 to `adm_level`
+            policy (str): name of policy category
+            dates (numpy.ndarray of numpy.datetime64): dates on which policies are applied
+
+        Returns:
+            tuple of (dict of bytes to numpy.ndarray, numpy.ndarray of int): positions
+                in `self.policies` of the policies in effect in each state, keyed by
+                their bytes, and the index in that dict of the state of each unit
+                (row) on each date (column)
+        """
+        states = dict()
+        state_ix = dict()
+        scope_states = dict()
+        unit_states = np.empty((len(units), len(dates)), dtype=int)
+        for i, unit in enumerate(units):
+            positions, starts = self._get_scope(unit, policy)
+            scope_key = positions.tobytes()
+            if scope_key not in scope_states:
+                ends = self._ends[positions]
+                changes = np.unique(
+                    np.concatenate([starts, ends + np.timedelta64(1, "D")])
+                )
+                _, first, segments = np.unique(
+                    np.searchsorted(changes, dates, side="right"),
+                    return_index=True,
+                    return_inverse=True,
+                )
+                segment_states = np.empty(len(first), dtype=int)
+                for j, date in enumerate(dates[first]):
+                    active = self._active_in_scope(positions, starts, date)
+                    key = active.tobytes()
+                    if key not in states:
+                        states[key] = active
+                        state_ix[key] = len(state_ix)
+                    segment_states[j] = state_ix[key]
+                scope_states[scope_key] = segment_states[segments]
+            unit_states[i] = scope_states[scope_key]
+
+        return states, unit_states
+
+
+def get_policy_cols(
+    policy, policy_panel, cases_level, policy_index, method="ITA", intensity_cache=None
+):
+    """Calculate the panel columns for a single policy category
 
-def cached_state_group(policies, adm1, policy_group, empty_df, adm_level, adm2, dates):
-    cached_policies = dict()
+    Args:
+        policy (str): name of policy category to be applied
+        policy_panel (pandas.DataFrame): panel of dates and adm-units, as made by `initialize_panel`
+        cases_level (int): adm-level of `policy_panel`
+        policy_index (PolicyIntervalIndex): index of the policies in effect by
+            adm-unit and date
+        method (str): intensity calculation method, passed to `get_state_vals`
+        intensity_cache (IntensityCache, optional): on-disk cache of intensities,
+            passed to `get_state_vals`
 
-    mask = (policies["policy"] == policy_group) & (
-        policies["adm1_name"].isin(["All", "all", adm1])
+    Returns:
+        dict of str to pandas.Series: the indicator column `policy`, plus "_opt" and
+            "_popwt" versions where they apply, indexed like `policy_panel`
+    """
+    # Find the policies in effect in each row. Many adm-units and dates share the same
+    # set of policies, so only calculate the policy variables of each distinct set once
+    adm_cols = cpop.get_adm_fields(cases_level)
+    units = policy_panel[adm_cols].drop_duplicates()
+    unit_ix = pd.MultiIndex.from_frame(units).get_indexer(
+        pd.MultiIndex.from_frame(policy_panel[adm_cols])
     )
-    if adm_level == 2:
-        mask = (mask) & (policies[f"adm2_name"].isin(["All", "all", adm2]))
+    date_ix, dates = pd.factorize(policy_panel["date"])
+    states, unit_states = policy_index.active_states(
+        list(units.itertuples(index=False, name=None)),
+        policy,
+        np.asarray(dates, dtype="datetime64[ns]"),
+    )
+    results = get_state_vals(
+        states, cases_level, policy, policy_index, method, intensity_cache
+    )
+    if intensity_cache is not None:
+        intensity_cache.flush()
+
+    # Values of the 4-tuples of mandatory pop-weighted, mandatory indicator, optional
+    # pop-weighted, and optional indicator variables in each row
+    row_states = unit_states[unit_ix, date_ix]
+    values = [
+        pd.Series(
+            np.array([results[k][i] for k in states])[row_states],
+            index=policy_panel.index,
+        )
+        for i in range(4)
+    ]
+
+    # Assign regular policy indicator
+    policy_cols = {policy: values[1]}
 
-    policies_in_group = policies[mask].reset_index(drop=True)
+    # Assign opt-column if there's anything there
+    opt_col = values[3]
+    use_opt_col = opt_col.sum() > 0
+    if use_opt_col:
+        policy_cols[policy + "_opt"] = opt_col
 
-    policies_in_group["next_day"] = np.roll(policies_in_group["date_start"], -1)
+    # Assign pop-weighted column if it's not excluded from pop-weighting, and opt-pop-weighted if
+    # Optional and pop-weighted are both used
+    if policy not in exclude_from_popweights:
+        policy_cols[policy + "_popwt"] = values[0]
+        if use_opt_col:
+            policy_cols[policy + "_opt_popwt"] = values[2]
 
-    for i, row in policies_in_group.iterrows():
-        cache = policies_in_group[: i + 1].copy()
-        cached_policies[row["date_str"]] = cache
-        if row["date_start"] != row["next_day"]:
-            # Return a new version to set the current one in stone
-            cache = cache.copy()
+    return policy_cols
 
-    cache = empty_df.copy()
-    for date in dates:
-        if date in cached_policies:
-            cache = cached_policies[date]
-        else:
-            cached_policies[date] = cache
 
-    return cached_policies
+# Arguments of `get_policy_cols` shared with forked worker processes by `map_policies`,
+# so that the policy index isn't pickled for every policy
+_worker_args = dict()
+
+
+def _get_policy_cols_in_worker(policy):
+    return get_policy_cols(policy, **_worker_args)
+
 
+def map_policies(
+    policy_list,
+    policy_panel,
+    cases_level,
+    policy_index,
+    method="ITA",
+    n_jobs=1,
+    intensity_cache=None,
+):
+    """Run `get_policy_cols` for each policy in `policy_list`, optionally across
+    multiple processes
+
+    Worker processes are forked, so they share `policy_index` and the other
+    inputs with the parent process rather than receiving pickled copies. Where fork is
+    unavailable (e.g. on Windows), policies are processed sequentially.
+
+    Args:
+        policy_list (list of str): policy categories to assign
+        n_jobs (int): number of worker processes. 1 (default) runs in this process,
+            -1 uses all available cores
+        Other args are passed to `get_policy_cols`
 
-def get_policies_to_date_cache(policies, policy_panel, adm_level):
-    policies = policies.sort_values("date_start", ascending=True)
-    dates = [
-        str(d)[:10]
-        for d in pd.date_range(
-            start="2020-01-01", end=policy_panel["date"].max().strftime("%Y%m%d")
-        ).to_list()
+    Returns:
+        list of dict: output of `get_policy_cols` for each policy in `policy_list`
+    """
+    global _worker_args
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    n_jobs = min(n_jobs, len(policy_list))
+    if n_jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        warnings.warn("Processes can't be forked here, assigning policies sequentially")
+        n_jobs = 1
+
+    kwargs = dict(
+        policy_panel=policy_panel,
+        cases_level=cases_level,
+        policy_index=policy_index,
+        method=method,
+        intensity_cache=intensity_cache,
+    )
+    if n_jobs <= 1:
+        return [get_policy_cols(policy, **kwargs) for policy in policy_list]
+
+    _worker_args = kwargs
+    try:
+        with ProcessPoolExecutor(
+            n_jobs, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            return list(executor.map(_get_policy_cols_in_worker, policy_list))
+    finally:
+        _worker_args = dict()
+
+
+def get_reusable_policies(policy_panel, previous_panel, cases_level, policy_list):
+    """Find the rows of `policy_panel` and the policies whose variables can be taken
+    from `previous_panel` instead of being recomputed
+
+    Args:
+        policy_panel (pandas.DataFrame): panel of dates and adm-units, as made by `initialize_panel`
+        previous_panel (pandas.DataFrame): earlier output of `assign_policies_to_panel`
+            (or a processed dataset made from it), computed from the same policies
+        cases_level (int): adm-level of `policy_panel`
+        policy_list (list of str): policy categories being assigned
+
+    Returns:
+        tuple of (list of str, pandas.Series, pandas.DataFrame): Policies whose columns
+            are all in `previous_panel`, whether each row of `policy_panel` is missing
+            from `previous_panel`, and the previous values of those policies' columns
+            in the other rows, indexed like `policy_panel`
+    """
+    keys = ["date"] + cpop.get_adm_fields(cases_level)
+    previous = previous_panel.assign(date=pd.to_datetime(previous_panel["date"]))
+    previous = previous.set_index(keys)
+    panel_keys = pd.MultiIndex.from_frame(policy_panel[keys])
+
+    is_new = pd.Series(~panel_keys.isin(previous.index), index=policy_panel.index)
+
+    reusable = [
+        p
+        for p in policy_list
+        if p in previous.columns
+        and (p in exclude_from_popweights or f"{p}_{popweighted_suffix}" in previous)
     ]
+    previous_cols = [
+        p + suffix
+        for p in reusable
+        for suffix in [
+            "",
+            "_opt",
+            f"_{popweighted_suffix}",
+            f"_opt_{popweighted_suffix}",
+        ]
+        if p + suffix in previous.columns
+    ]
+    previous_vals = previous.loc[panel_keys[~is_new.values], previous_cols]
+    previous_vals = previous_vals.set_axis(policy_panel.index[~is_new.values])
 
-    if adm_level == 2:
-        adm2_to_adm1 = policy_panel.set_index("adm2_name")["adm1_name"].to_dict()
+    return reusable, is_new, previous_vals
 
-    adms = policy_panel[f"adm{adm_level}_name"].unique()
-    policy_list = policies["policy"].unique()
 
-    cached_policies_on_date = dict()
-    for adm in adms:
-        cached_policies_on_date[adm] = dict()
-        for policy in policy_list:
-            cached_policies_on_date[adm][policy] = dict()
+def extend_policy_cols(policy, policy_cols, previous_vals, is_new):
+    """Combine `get_policy_cols` output for new rows of a panel with the values of
+    the other rows from a previous panel
 
-    policies["date_str"] = policies["date_start"].astype(str)
+    Args:
+        policy (str): name of policy category
+        policy_cols (dict of str to pandas.Series): output of `get_policy_cols` for the
+            rows where `is_new`
+        previous_vals (pandas.DataFrame): previous values of policy columns in the
+            rows that are not new, as returned by `get_reusable_policies`
+        is_new (pandas.Series of bool): whether each row of the panel is new
 
-    empty_df = pd.DataFrame(columns=policies.columns)
-    for adm in adms:
-        if adm_level == 2:
-            adm1 = adm2_to_adm1[adm]
-            adm2 = adm
+    Returns:
+        dict of str to pandas.Series: the columns of `policy` for all rows of the panel
+    """
+    n_new = is_new.sum()
+    extended = dict()
+    for suffix in ["", "_opt", f"_{popweighted_suffix}", f"_opt_{popweighted_suffix}"]:
+        col = policy + suffix
+        if col not in policy_cols and col not in previous_vals:
+            continue
+        new = policy_cols.get(col, pd.Series(np.zeros(n_new, dtype=int)))
+        if col in previous_vals:
+            old = previous_vals[col]
         else:
-            adm1 = adm
-            adm2 = None
-
-        for policy_group in policy_list:
-            cached_policies_on_date[adm][policy_group] = cached_state_group(
-                policies, adm1, policy_group, empty_df, adm_level, adm2, dates
-            )
+            old = pd.Series(np.zeros(len(is_new) - n_new, dtype=int))
+        # Match the dtype `get_policy_cols` would give for the whole panel
+        dtype = np.result_type(old.dtype, new.dtype)
+        vals = np.empty(len(is_new), dtype=dtype)
+        vals[~is_new.values] = old.values
+        vals[is_new.values] = new.values
+        extended[col] = pd.Series(vals, index=is_new.index)
 
-    return cached_policies_on_date
+    return extended
 
 
 def assign_policies_to_panel(
@@ -536,6 +1073,9 @@ def assign_policies_to_panel(
     get_latlons=True,
     errors="raise",
     method="ITA",
+    n_jobs=1,
+    intensity_cache_path=None,
+    previous_panel=None,
 ):
     """Assign all policy variables from `policies` to `cases_df`
     Args:
@@ -546,6 +1086,16 @@ def assign_policies_to_panel(
             typically the lowest level which pop-weights have been applied to
         aggregate_vars (list of str): list of policy variables where optional version
             should be treated independently of mandatory version
+        n_jobs (int): Number of processes across which to spread the policies. -1 uses
+            all available cores. See `map_policies`
+        intensity_cache_path (str or pathlib.Path, optional): sqlite file in which to
+            cache policy intensities across runs. See `IntensityCache`
+        previous_panel (pandas.DataFrame, optional): earlier output of this function
+            (or a processed dataset made from it) for the same policies. Policy
+            variables are then only computed for the dates and adm-units missing from
+            `previous_panel`, and for policies whose columns it lacks; other values
+            are reused. Policies that changed in dates already in `previous_panel` are
+            not picked up
 
     Returns:
         pandas.DataFrame: a version of `cases_df` with all policies from `policies` assigned as new columns
@@ -577,12 +1127,21 @@ def assign_policies_to_panel(
     policies["date_end"] = policies["date_end"].fillna(pd.to_datetime("2099-12-31"))
 
     # Assign population columns to `policies` and `cases_df`
+    schema = PolicySchema(policies)
     policies, cases_df = cpop.assign_all_populations(
-        policies, cases_df, cases_level, get_latlons=get_latlons, errors=errors
+        policies,
+        cases_df,
+        cases_level,
+        get_latlons=get_latlons,
+        errors=errors,
+        max_adm_level=schema.max_level,
     )
+    # Populations are merged in with left joins on unique adm-units, which keep the rows
+    # of `policies` (and so `schema`) in order
+    assert len(policies) == len(schema.policy_level)
 
     # Assign policy_level to distinguish policies specified at different admin-unit levels
-    policies["policy_level"] = policies.apply(get_policy_level, axis=1)
+    policies["policy_level"] = schema.policy_level
 
     if method == "USA":
         intensity_cols = [
@@ -592,7 +1151,7 @@ def assign_policies_to_panel(
             policies[c] = policies[c].astype(str).str.strip().str.lower()
 
     # Treat policies in `aggregate_vars` as independent policies (just like mandatory policies)
-    # Set optional to 0 to avoid applying normal optional logic in `get_policy_vals()`
+    # Set optional to 0 to avoid applying normal optional logic in `split_optional_policies()`
     for policy in aggregate_vars:
         policies.loc[policies["optional"] == 1, "policy"] = (
             policies.loc[policies["optional"] == 1, "policy"] + "_opt"
@@ -604,60 +1163,71 @@ def assign_policies_to_panel(
         p + "_popwt" for p in policy_list if p not in exclude_from_popweights
     ]
 
-    policy_panel = initialize_panel(cases_df, cases_level, policy_list, policy_popwts)
+    # Policy columns are collected and added to the panel at once, rather than
+    # overwriting columns of zeros one by one
+    policy_panel = initialize_panel(cases_df, cases_level, [], [])
 
-    policies_to_date_cache = get_policies_to_date_cache(
-        policies, policy_panel, cases_level
+    policy_index = PolicyIntervalIndex(policies, cases_level, schema)
+    intensity_cache = (
+        None if intensity_cache_path is None else IntensityCache(intensity_cache_path)
     )
 
-    # Assign each policy one-by-one to the panel
-    for policy in policy_list:
-        policy_pickle_dict = dict()
-
-        # Get Series of 4-tuples for mandatory pop-weighted, mandatory indicator,
-        # optional pop-weighted, optional indicator
-        tmp = policy_panel.apply(
-            lambda row: get_policy_vals(
-                policies,
-                policy,
-                row["date"],
-                row[f"adm{cases_level}_name"],
-                row[f"adm1_name"],
+    if previous_panel is None:
+        reusable = []
+    else:
+        reusable, is_new, previous_vals = get_reusable_policies(
+            policy_panel, previous_panel, cases_level, policy_list
+        )
+        if not is_new.any():
+            new_cols = [dict() for policy in reusable]
+        else:
+            new_cols = map_policies(
+                reusable,
+                policy_panel[is_new],
                 cases_level,
-                policy_pickle_dict,
-                policies_to_date_cache,
+                policy_index,
                 method,
+                n_jobs,
+                intensity_cache,
+            )
+        reused = {
+            policy: extend_policy_cols(policy, policy_cols, previous_vals, is_new)
+            for policy, policy_cols in zip(reusable, new_cols)
+        }
+
+    to_compute = [p for p in policy_list if p not in reusable]
+    computed = dict(
+        zip(
+            to_compute,
+            map_policies(
+                to_compute,
+                policy_panel,
+                cases_level,
+                policy_index,
+                method,
+                n_jobs,
+                intensity_cache,
             ),
-            axis=1,
         )
+    )
 
-        # Assign regular policy indicator
-        policy_panel[policy] = tmp.apply(lambda x: x[1])
-
-        # Assign opt-column if there's anything there
-        opt_col = tmp.apply(lambda x: x[3])
-        use_opt_col = opt_col.sum() > 0
-        if use_opt_col:
-            policy_panel[policy + "_opt"] = tmp.apply(lambda x: x[3])
-
-        # Assign pop-weighted column if it's not excluded from pop-weighting, and opt-pop-weighted if
-        # Optional and pop-weighted are both used
-        if policy not in exclude_from_popweights:
-            policy_panel[policy + "_popwt"] = tmp.apply(lambda x: x[0])
-            if use_opt_col:
-                policy_panel[policy + "_opt_popwt"] = tmp.apply(lambda x: x[2])
+    # Assign each policy's columns to the panel, with the indicator and pop-weighted
+    # columns first, in the order of `policy_list`. Columns are released as soon as
+    # they are copied into the panel, to keep large (e.g. county-level) panels from
+    # being held in memory several times over
+    policy_cols = dict.fromkeys(policy_list + policy_popwts)
+    for policy in policy_list:
+        policy_cols.update(
+            reused.pop(policy) if policy in reusable else computed.pop(policy)
+        )
+    policy_cols = pd.DataFrame(policy_cols, index=policy_panel.index)
+    policy_panel = pd.concat([policy_panel, policy_cols], axis=1, copy=False)
+    del policy_cols
 
     policy_panel = count_policies_enacted(policy_panel, policy_list)
 
-    if cases_level == 2:
-        policy_panel = policy_panel.drop(columns=["adm1_name"])
-
     # Merge panel with `cases_df`
-    merged = pd.merge(
-        cases_df,
-        policy_panel,
-        left_on=["date", f"adm{cases_level}_name"],
-        right_on=["date", f"adm{cases_level}_name"],
-    )
+    keys = ["date"] + cpop.get_adm_fields(cases_level)
+    merged = pd.merge(cases_df, policy_panel, left_on=keys, right_on=keys)
 
     return merged
@@ -8,9 +8,12 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import as_strided
 
 import xarray as xr
-from statsmodels.api import OLS, add_constant
+from scipy import stats
+
+from src.profiling import get_profiler
 
 
 def init_reg_ds(n_samples, LHS_vars, policies, **dim_kwargs):
@@ -599,6 +602,155 @@ def add_obs_noise(daily_ds, measurement_noise_on=False, measurement_noise_sd=0):
     return daily_ds
 
 
+COV_TYPES = ["nonrobust", "HC1", "HAC"]
+
+
+def fit_ols_batched(y, X, valid, hac_maxlags=None):
+    """Fit a stack of OLS regressions at once, with nonrobust, HC1, and HAC
+    (Newey-West) covariance matrices of the parameter estimates.
+
+    Each regression is equivalent to ``statsmodels.api.OLS(y[valid], X[valid],
+    missing="drop").fit()``, using the same pseudo-inverse and rank conventions, but
+    without building a statsmodels object per regression.
+
+    Parameters
+    ----------
+    y : :class:`numpy.ndarray`
+        Array of shape ``(..., t)`` containing the dependent variable of each
+        regression. NaN observations are dropped.
+    X : :class:`numpy.ndarray`
+        Array of shape ``(..., t, k)`` (broadcastable against `y`) containing the
+        regressors. Must include a constant column if an intercept is desired.
+    valid : :class:`numpy.ndarray` of bool
+        Array of shape ``(..., t)`` (broadcastable against `y`). Observations that are
+        False are excluded from the regression.
+    hac_maxlags : int, optional
+        Number of lags (in units of `t`) to use in the Bartlett kernel of the HAC
+        covariance. Lags are counted along `t`, so they correspond to calendar time
+        even if some observations are excluded. Default is the Newey-West rule
+        ``floor(4 * (nobs / 100) ** (2 / 9))``, applied to each regression.
+
+    Returns
+    -------
+    params : :class:`numpy.ndarray`
+        Shape ``(..., k)``. NaN for regressions without any valid observations.
+    mse_resid : :class:`numpy.ndarray`
+        Shape ``(...)``. Sum of squared residuals over residual degrees of freedom.
+    cov : :class:`numpy.ndarray`
+        Shape ``(len(COV_TYPES), ..., k, k)``. Covariance of `params` for each type of
+        covariance estimator in `COV_TYPES`. HC1 is scaled by ``nobs / df_resid``, as
+        in statsmodels; HAC has no small-sample correction (statsmodels' default).
+    """
+    valid = valid & ~np.isnan(y)
+    X = np.where(valid[..., None], X, 0).astype(np.float64)
+    y = np.where(valid, y, 0).astype(np.float64)
+    nobs = valid.sum(axis=-1)
+    n_params = X.shape[-1]
+
+    # excluded observations are rows of zeros, which leave the pseudo-inverse (and
+    # thus the estimates) of the remaining rows unchanged
+    u, s, vt = np.linalg.svd(X, full_matrices=False)
+    s_max = s.max(axis=-1, keepdims=True)
+    s_inv = np.divide(1, s, out=np.zeros_like(s), where=s > 1e-15 * s_max)
+    pinv = np.einsum("...ji,...j,...tj->...it", vt, s_inv, u)
+    rank = (s > s_max * n_params * np.finfo(s.dtype).eps).sum(axis=-1)
+
+    params = np.einsum("...kt,...t->...k", pinv, y)
+    resid = y - np.einsum("...tk,...k->...t", X, params)
+    df_resid = nobs - rank
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mse_resid = (resid ** 2).sum(axis=-1) / df_resid
+        hc1_scale = nobs / df_resid
+
+    # per-observation contributions to the estimates
+    scores = pinv * resid[..., None, :]
+    hc0 = np.einsum("...kt,...lt->...kl", scores, scores)
+
+    if hac_maxlags is None:
+        maxlags = np.floor(4 * (nobs / 100) ** (2 / 9)).astype(int)
+    else:
+        maxlags = np.full(nobs.shape, hac_maxlags)
+    hac = hc0.copy()
+    for lag in range(1, min(maxlags.max(initial=0), y.shape[-1] - 1) + 1):
+        weight = np.clip(1 - lag / (maxlags + 1), 0, None)[..., None, None]
+        gamma_l = np.einsum("...kt,...lt->...kl", scores[..., lag:], scores[..., :-lag])
+        hac += weight * (gamma_l + np.swapaxes(gamma_l, -1, -2))
+
+    cov = np.stack(
+        [
+            mse_resid[..., None, None] * np.einsum("...kt,...lt->...kl", pinv, pinv),
+            hc1_scale[..., None, None] * hc0,
+            hac,
+        ]
+    )
+
+    params[nobs == 0] = np.nan
+    return params, mse_resid, cov
+
+
+def build_lag_design(indicators, reg_lag_days):
+    """Build the regression design matrices of lagged policy indicators for all
+    samples at once.
+
+    All lags are read from a single strided view of the (zero-padded) indicators, so
+    the cost of adding lags is only that of filling the output array.
+
+    Parameters
+    ----------
+    indicators : :class:`numpy.ndarray`
+        Shape ``(..., t, policy)``. Daily policy indicators, e.g. one set per sample.
+    reg_lag_days : list of int
+        Non-negative lags (in days) to include for each policy.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        Shape ``(..., t, 1 + len(reg_lag_days) * n_policies)``. The first column is an
+        intercept, followed by all policies lagged by the first of `reg_lag_days`, then
+        all policies lagged by the second, etc. Days before the start of the sample are
+        treated as having no policy. With no lags, only the intercept is returned.
+    """
+    lags = np.asarray(reg_lag_days, dtype=int)
+    if (lags < 0).any():
+        raise ValueError(f"Lags must be non-negative: {reg_lag_days}")
+    max_lag = lags.max(initial=0)
+    *batch_shape, n_t, n_policies = indicators.shape
+
+    padded = np.zeros((*batch_shape, max_lag + n_t, n_policies), dtype=indicators.dtype)
+    padded[..., max_lag:, :] = indicators
+
+    # windows[..., t, k, :] is padded[..., t + k, :], i.e. indicators lagged by
+    # ``max_lag - k`` days
+    windows = as_strided(
+        padded,
+        shape=(*batch_shape, n_t, max_lag + 1, n_policies),
+        strides=padded.strides[:-1] + padded.strides[-2:],
+        writeable=False,
+    )
+
+    X = np.empty((*batch_shape, n_t, 1 + len(lags) * n_policies), dtype=padded.dtype)
+    X[..., 0] = 1
+    X[..., 1:] = windows[..., max_lag - lags, :].reshape(
+        *batch_shape, n_t, len(lags) * n_policies
+    )
+    return X
+
+
+def _split_reg_lags(da, policies):
+    """Split the regressor dimension of `da` (labeled ``Intercept`` and
+    ``[policy]_lag[lag]``) into an intercept and ``policy`` x ``reg_lag`` dims."""
+    e = da.to_dataset("policy")
+    coeffs = []
+    for p in policies:
+        keys = [i for i in e.variables.keys() if f"{p}_" in i]
+        coeffs.append(
+            e[keys]
+            .rename({k: int(k.split("_")[-1][3:]) for k in keys})
+            .to_array(dim="reg_lag")
+        )
+    return xr.concat(coeffs, dim="policy"), e["Intercept"]
+
+
 def simulate_and_regress(
     pop,
     no_policy_growth_rate,
@@ -628,6 +780,7 @@ def simulate_and_regress(
     random_end=False,
     ordered_policies=True,
     save_dir=None,
+    hac_maxlags=None,
 ):
     """Full wrapper to run Monte Carlo simulations of a disease outbreak using SEIR or
     SIR dynamics for a number of parameter sets.
@@ -700,12 +853,22 @@ def simulate_and_regress(
         is enacted before the third, etc. Default is yes.
     save_dir : str or :class:`pathlib.Path`
         The directory to save results
+    hac_maxlags : int, optional
+        Number of daily lags in the Newey-West (HAC) standard errors. Default is
+        ``floor(4 * (nobs / 100) ** (2 / 9))`` for each regression. See
+        :func:`fit_ols_batched`.
         
     Returns
     -------
     daily_ds : :class:`xarray.Dataset`
-        A dataset with all relevant information from each MC draw, both dynamically 
-        simulated states and regression outputs.
+        A dataset with all relevant information from each MC draw, both dynamically
+        simulated states and regression outputs. Regression outputs include standard
+        errors of each type in `COV_TYPES` (``cov_type`` dim) for each coefficient
+        (``coefficient_se``, ``Intercept_se``), for each policy summed over lags
+        (``policy_effect_se``), and for the sum of all policies (``cum_effect_se``).
+        If profiling is enabled (see
+        :mod:`src.profiling`), ``daily_ds.attrs["profile"]`` holds a JSON list of wall
+        time, CPU time, and peak RSS for each stage of this function.
     """
 
     attrs = dict(
@@ -723,11 +886,14 @@ def simulate_and_regress(
         no_policy_growth_rate=no_policy_growth_rate,
         tsteps_per_day=tsteps_per_day,
         p_effects=p_effects,
+        hac_maxlags=str(hac_maxlags),
     )
 
     if save_dir is not None:
         save_dir = Path(save_dir)
 
+    prof = get_profiler(func="simulate_and_regress", pop=pop, kind=kind)
+
     E0 = E0 / pop
     I0 = I0 / pop
     R0 = R0 / pop
@@ -751,214 +917,232 @@ def simulate_and_regress(
     ttotal = n_days * tsteps_per_day + 1
     t = np.linspace(0, 1, ttotal) * n_days
 
-    # store policy info
-    policies = xr.Dataset(
-        coords={
-            "policy": [f"p{i+1}" for i in range(len(p_effects))],
-            "time": ["start", "end"],
-            "lag_num": range(len(p_lags[0])),
-        },
-        data_vars={
-            "effect": (("policy",), p_effects),
-            "lag": (("policy", "lag_num"), p_lags),
-            "interval": (("time",), p_start_interval),
-        },
-    )
-
-    # initialize results array
-    estimates_ds = init_reg_ds(
-        n_samples,
-        LHS_vars,
-        policies.policy.values,
-        gamma=gamma_to_test,
-        sigma=sigma_to_test,
-    )
+    with prof.stage("policy_dummies"):
+        # store policy info
+        policies = xr.Dataset(
+            coords={
+                "policy": [f"p{i+1}" for i in range(len(p_effects))],
+                "time": ["start", "end"],
+                "lag_num": range(len(p_lags[0])),
+            },
+            data_vars={
+                "effect": (("policy",), p_effects),
+                "lag": (("policy", "lag_num"), p_lags),
+                "interval": (("time",), p_start_interval),
+            },
+        )
 
-    # get policy effects
-    policy_dummies, random_end_da = init_policy_dummies(
-        policies,
-        n_samples,
-        t,
-        seed=0,
-        random_end=random_end,
-        ordered_policies=ordered_policies,
-    )
-    policies = xr.merge((policies, policy_dummies, random_end_da))
-    policy_effect_timeseries = (policies.policy_timeseries * policies.effect).sum(
-        "policy"
-    )
-    n_samp_valid = len(policies.sample)
-
-    # adjust rate params to correct timestep
-    estimates_ds = adjust_timescales_from_daily(estimates_ds, t[1] - t[0])
-    beta_noise_sd = beta_noise_sd / np.sqrt(tsteps_per_day)
-    gamma_noise_sd = gamma_noise_sd / np.sqrt(tsteps_per_day)
-    sigma_noise_sd = sigma_noise_sd / np.sqrt(tsteps_per_day)
-
-    # get stochastic params
-    estimates_ds = get_stochastic_discrete_params(
-        estimates_ds,
-        no_policy_growth_rate,
-        policy_effect_timeseries,
-        t,
-        beta_noise_on,
-        beta_noise_sd,
-        kind=kind,
-        gamma_noise_on=gamma_noise_on,
-        gamma_noise_sd=gamma_noise_sd,
-        sigma_noise_on=sigma_noise_on,
-        sigma_noise_sd=sigma_noise_sd,
-    )
+        # initialize results array
+        estimates_ds = init_reg_ds(
+            n_samples,
+            LHS_vars,
+            policies.policy.values,
+            gamma=gamma_to_test,
+            sigma=sigma_to_test,
+        )
 
-    # run simulation
-    estimates_ds = sim_engine(*ics, estimates_ds)
+        # get policy effects
+        policy_dummies, random_end_da = init_policy_dummies(
+            policies,
+            n_samples,
+            t,
+            seed=0,
+            random_end=random_end,
+            ordered_policies=ordered_policies,
+        )
+        policies = xr.merge((policies, policy_dummies, random_end_da))
+        policy_effect_timeseries = (policies.policy_timeseries * policies.effect).sum(
+            "policy"
+        )
+        n_samp_valid = len(policies.sample)
+
+    with prof.stage("noise"):
+        # adjust rate params to correct timestep
+        estimates_ds = adjust_timescales_from_daily(estimates_ds, t[1] - t[0])
+        beta_noise_sd = beta_noise_sd / np.sqrt(tsteps_per_day)
+        gamma_noise_sd = gamma_noise_sd / np.sqrt(tsteps_per_day)
+        sigma_noise_sd = sigma_noise_sd / np.sqrt(tsteps_per_day)
+
+        # get stochastic params
+        estimates_ds = get_stochastic_discrete_params(
+            estimates_ds,
+            no_policy_growth_rate,
+            policy_effect_timeseries,
+            t,
+            beta_noise_on,
+            beta_noise_sd,
+            kind=kind,
+            gamma_noise_on=gamma_noise_on,
+            gamma_noise_sd=gamma_noise_sd,
+            sigma_noise_on=sigma_noise_on,
+            sigma_noise_sd=sigma_noise_sd,
+        )
 
-    # add on other potentially observable quantities
-    estimates_ds["IR"] = estimates_ds["R"] + estimates_ds["I"]
-    if kind == "SEIR":
-        estimates_ds["EI"] = estimates_ds["E"] + estimates_ds["I"]
-        estimates_ds["EIR"] = estimates_ds["EI"] + estimates_ds["R"]
-
-    # get minimum S for each simulation
-    # at end and when the last policy turns on
-    estimates_ds["S_min"] = estimates_ds.S.isel(t=-1)
-    p3_on = (policies.policy_timeseries > 0).argmax(dim="t").max(dim="policy")
-    estimates_ds["S_min_p3"] = estimates_ds.S.isel(t=p3_on)
-
-    # blend in policy dataset
-    estimates_ds = estimates_ds.merge(policies)
-
-    # convert to daily observations
-    daily_ds = adjust_timescales_to_daily(estimates_ds)
-
-    # prep regression LHS vars (logdiff)
-    daily_ds["logdiff"] = (
-        np.log(daily_ds[daily_ds.LHS.values])
-        .diff(dim="t", n=1, label="lower")
-        .pad(t=(0, 1))
-        .to_array(dim="LHS")
-    )
-    if "sigma" not in daily_ds.logdiff.dims:
-        daily_ds["logdiff"] = daily_ds.logdiff.expand_dims("sigma")
+    with prof.stage("integration"):
+        # run simulation
+        estimates_ds = sim_engine(*ics, estimates_ds)
+
+        # add on other potentially observable quantities
+        estimates_ds["IR"] = estimates_ds["R"] + estimates_ds["I"]
+        if kind == "SEIR":
+            estimates_ds["EI"] = estimates_ds["E"] + estimates_ds["I"]
+            estimates_ds["EIR"] = estimates_ds["EI"] + estimates_ds["R"]
+
+        # get minimum S for each simulation
+        # at end and when the last policy turns on
+        estimates_ds["S_min"] = estimates_ds.S.isel(t=-1)
+        p3_on = (policies.policy_timeseries > 0).argmax(dim="t").max(dim="policy")
+        estimates_ds["S_min_p3"] = estimates_ds.S.isel(t=p3_on)
+
+    with prof.stage("daily_resample"):
+        # blend in policy dataset
+        estimates_ds = estimates_ds.merge(policies)
+
+        # convert to daily observations
+        daily_ds = adjust_timescales_to_daily(estimates_ds)
+
+        # prep regression LHS vars (logdiff)
+        daily_ds["logdiff"] = (
+            np.log(daily_ds[daily_ds.LHS.values])
+            .diff(dim="t", n=1, label="lower")
+            .pad(t=(0, 1))
+            .to_array(dim="LHS")
+        )
+        if "sigma" not in daily_ds.logdiff.dims:
+            daily_ds["logdiff"] = daily_ds.logdiff.expand_dims("sigma")
+
+    with prof.stage("obs_noise"):
+        # add noise
+        daily_ds = add_obs_noise(
+            daily_ds,
+            measurement_noise_on=measurement_noise_on,
+            measurement_noise_sd=measurement_noise_sd,
+        )
 
-    # add noise
-    daily_ds = add_obs_noise(
-        daily_ds,
-        measurement_noise_on=measurement_noise_on,
-        measurement_noise_sd=measurement_noise_sd,
-    )
+    with prof.stage("lags"):
+        ## run regressions
+        # design matrix with intercept and lagged policy indicators
+        RHS_old = (daily_ds.policy_timeseries > 0).astype(int)
+        X = build_lag_design(
+            RHS_old.transpose("sample", "t", "policy").values, reg_lag_days
+        )
+        reg_vars = np.array(
+            ["Intercept"]
+            + [f"{p}_lag{l}" for l in reg_lag_days for p in RHS_old.policy.values]
+        )
 
-    ## run regressions
-    estimates = np.empty(
-        (
-            len(daily_ds.gamma),
-            len(daily_ds.sigma),
-            len(daily_ds.sample),
-            len(daily_ds.LHS),
-            len(daily_ds.policy) * len(reg_lag_days) + 1,
-        ),
-        dtype=np.float32,
-    )
-    mses = np.empty(
-        (
-            len(daily_ds.gamma),
-            len(daily_ds.sigma),
-            len(daily_ds.sample),
-            len(daily_ds.LHS),
-        ),
-        dtype=np.float32,
-    )
-    estimates.fill(np.nan)
-    mses.fill(np.nan)
-
-    # add on lags
-    RHS_old = (daily_ds.policy_timeseries > 0).astype(int)
-    RHS_ds = xr.ones_like(RHS_old.isel(policy=0))
-    RHS_ds["policy"] = "Intercept"
-    for l in reg_lag_days:
-        lag_vars = RHS_old.shift(t=l, fill_value=0)
-        lag_vars["policy"] = [f"{x}_lag{l}" for x in RHS_old.policy.values]
-        RHS_ds = xr.concat((RHS_ds, lag_vars), dim="policy")
-
-    # Apply min cum_cases threshold used in regressions
-    valid_reg = daily_ds.IR >= min_cases / pop
-    if "sigma" not in valid_reg.dims:
-        valid_reg = valid_reg.expand_dims("sigma")
-        valid_reg["sigma"] = [np.nan]
-
-    # only run regression on planned start day if we have at least one "no-policy" day after that
-    # otherwise, start regression 2 days before first policy
-    any_pol = (RHS_old > 0).max(dim="policy")
-    first_pol = any_pol.argmax(dim="t")
-    no_pol_on_regday0 = first_pol > valid_reg.argmax(dim="t")
-
-    backup = any_pol.shift({"t": -2}).astype(bool)
-    backup = backup | backup.isnull()
-
-    # find random last day to end regression, starting with 1 day after last policy
-    # is implemented
-    if random_end:
-        last_pol = (daily_ds.policy_timeseries.sum(dim="policy") == 3).argmax(dim="t")
-        last_reg_day = (
-            ((daily_ds.dims["t"] - (last_pol + 1)) * daily_ds.random_end)
-            .round()
-            .astype(int)
-            + last_pol
-            + 1
+        # columns of the design matrix summed to get the effect of each policy (over
+        # all lags) and the cumulative effect of all policies
+        contrasts = np.stack(
+            [np.char.startswith(reg_vars, f"{p}_") for p in RHS_old.policy.values]
+            + [reg_vars != "Intercept"]
+        ).astype(float)
+
+        # Apply min cum_cases threshold used in regressions
+        valid_reg = daily_ds.IR >= min_cases / pop
+        if "sigma" not in valid_reg.dims:
+            valid_reg = valid_reg.expand_dims("sigma")
+            valid_reg["sigma"] = [np.nan]
+
+        # only run regression on planned start day if we have at least one "no-policy" day after that
+        # otherwise, start regression 2 days before first policy
+        any_pol = (RHS_old > 0).max(dim="policy")
+        first_pol = any_pol.argmax(dim="t")
+        no_pol_on_regday0 = first_pol > valid_reg.argmax(dim="t")
+
+        backup = any_pol.shift({"t": -2}).astype(bool)
+        backup = backup | backup.isnull()
+
+        # find random last day to end regression, starting with 1 day after last policy
+        # is implemented
+        if random_end:
+            last_pol = (daily_ds.policy_timeseries.sum(dim="policy") == 3).argmax(
+                dim="t"
+            )
+            last_reg_day = (
+                ((daily_ds.dims["t"] - (last_pol + 1)) * daily_ds.random_end)
+                .round()
+                .astype(int)
+                + last_pol
+                + 1
+            )
+        else:
+            last_reg_day = daily_ds.dims["t"]
+        daily_ds["random_end"] = last_reg_day
+
+        # which days enter each regression
+        no_pol_on_regday0 = no_pol_on_regday0.transpose("gamma", "sigma", "sample")
+        valid = np.where(
+            no_pol_on_regday0.values[..., None],
+            valid_reg.transpose(*no_pol_on_regday0.dims, "t").values,
+            backup.transpose("sample", "t").values,
         )
-    else:
-        last_reg_day = daily_ds.dims["t"]
-    daily_ds["random_end"] = last_reg_day
-
-    # loop through regressions
-    for cx, case_var in enumerate(daily_ds.LHS.values):
-        case_ds = daily_ds.logdiff_stoch.sel(LHS=case_var)
-        for gx, g in enumerate(daily_ds.gamma.values):
-            g_ds = case_ds.sel(gamma=g)
-            for sx, s in enumerate(daily_ds.sigma.values):
-                s_ds = g_ds.sel(sigma=s)
-                for samp in daily_ds.sample.values:
-                    if no_pol_on_regday0.isel(sample=samp, gamma=gx, sigma=sx):
-                        this_valid = valid_reg.isel(sample=samp, gamma=gx, sigma=sx)
-                    else:
-                        this_valid = backup.isel(sample=samp)
-                    if random_end:
-                        this_valid = (this_valid) & (RHS_ds.t <= last_reg_day[samp])
-                    LHS = s_ds.isel(sample=samp)[this_valid].values
-                    RHS = add_constant(
-                        RHS_ds.isel(sample=samp)[{"t": this_valid}].values
-                    )
-                    res = OLS(LHS, RHS, missing="drop").fit()
-
-                    estimates[gx, sx, samp, cx] = res.params
-                    mses[gx, sx, samp, cx] = res.mse_resid
-    coords = OrderedDict(
-        gamma=daily_ds.gamma,
-        sigma=daily_ds.sigma,
-        sample=daily_ds.sample,
-        LHS=daily_ds.LHS,
-    )
-    rmse_ds = xr.DataArray(np.sqrt(mses), coords=coords, dims=coords.keys())
+        if random_end:
+            valid = valid & (
+                daily_ds.t.values <= last_reg_day.transpose("sample").values[:, None]
+            )
 
-    coords["policy"] = RHS_ds.policy
-    e = xr.DataArray(estimates, coords=coords, dims=coords.keys()).to_dataset("policy")
+    with prof.stage("ols"):
+        LHS = daily_ds.logdiff_stoch.transpose(
+            "LHS", "gamma", "sigma", "sample", "t"
+        ).values
 
-    coeffs = []
-    for p in daily_ds.policy.values:
-        keys = [i for i in e.variables.keys() if f"{p}_" in i]
-        coeffs.append(
-            e[keys]
-            .rename({k: int(k.split("_")[-1][3:]) for k in keys})
-            .to_array(dim="reg_lag")
+        n_gamma, n_sigma, n_sample = valid.shape[:3]
+        n_LHS, n_params = LHS.shape[0], X.shape[-1]
+        estimates = np.empty(
+            (n_gamma, n_sigma, n_sample, n_LHS, n_params), dtype=np.float32
+        )
+        mses = np.empty(estimates.shape[:-1], dtype=np.float32)
+        ses = np.empty((len(COV_TYPES),) + estimates.shape, dtype=np.float32)
+        contrast_ses = np.empty(
+            (len(COV_TYPES),) + mses.shape + (len(contrasts),), dtype=np.float32
         )
-    coef_ds = xr.concat(coeffs, dim="policy")
-    coef_ds.name = "coefficient"
-    daily_ds = daily_ds.drop("coefficient").merge(coef_ds)
-    daily_ds["Intercept"] = e["Intercept"]
-    daily_ds["rmse"] = rmse_ds
+
+        # batch all samples and sigmas of each LHS var and gamma
+        for cx in range(n_LHS):
+            for gx in range(n_gamma):
+                params, mse_resid, cov = fit_ols_batched(
+                    LHS[cx, gx], X, valid[gx], hac_maxlags=hac_maxlags
+                )
+                estimates[gx, :, :, cx] = params
+                mses[gx, :, :, cx] = mse_resid
+                ses[:, gx, :, :, cx] = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+                contrast_ses[:, gx, :, :, cx] = np.sqrt(
+                    np.einsum("ck,...kl,cl->...c", contrasts, cov, contrasts)
+                )
+
+    with prof.stage("output"):
+        coords = OrderedDict(
+            gamma=daily_ds.gamma,
+            sigma=daily_ds.sigma,
+            sample=daily_ds.sample,
+            LHS=daily_ds.LHS,
+        )
+        rmse_ds = xr.DataArray(np.sqrt(mses), coords=coords, dims=coords.keys())
+
+        coords["policy"] = reg_vars
+        e = xr.DataArray(estimates, coords=coords, dims=coords.keys())
+        coef_ds, intercept = _split_reg_lags(e, daily_ds.policy.values)
+        coef_ds.name = "coefficient"
+        daily_ds = daily_ds.drop("coefficient").merge(coef_ds)
+        daily_ds["Intercept"] = intercept
+        daily_ds["rmse"] = rmse_ds
+
+        # standard errors
+        coords = OrderedDict(cov_type=COV_TYPES, **coords)
+        se = xr.DataArray(ses, coords=coords, dims=coords.keys())
+        coef_se, daily_ds["Intercept_se"] = _split_reg_lags(se, daily_ds.policy.values)
+        daily_ds["coefficient_se"] = coef_se.transpose("cov_type", *coef_ds.dims)
+        coords["policy"] = list(daily_ds.policy.values) + ["cum_effect"]
+        contrast_se = xr.DataArray(contrast_ses, coords=coords, dims=coords.keys())
+        daily_ds["policy_effect_se"] = contrast_se.isel(policy=slice(None, -1))
+        daily_ds["cum_effect_se"] = contrast_se.sel(policy="cum_effect", drop=True)
 
     # add model params
     daily_ds.attrs = attrs
+    if prof.enabled:
+        daily_ds.attrs["profile"] = prof.to_json()
+        prof.emit()
 
     if save_dir is not None:
         save_dir.mkdir(exist_ok=True, parents=True)
@@ -981,6 +1165,17 @@ def load_reg_results(res_dir):
     return reg_res
 
 
+def _sum_over_lags(reg_res, cols_to_keep):
+    """Sum coefficients over lags, and keep the standard errors of those sums (if
+    present) as ``coefficient_se``."""
+    vals = reg_res[cols_to_keep].merge(reg_res.coefficient.sum("reg_lag", skipna=False))
+    if "policy_effect_se" in reg_res:
+        vals["coefficient_se"] = reg_res.policy_effect_se
+        vals["Intercept_se"] = reg_res.Intercept_se
+        vals["cum_effect_se"] = reg_res.cum_effect_se
+    return vals
+
+
 def load_and_combine_reg_results(reg_dir, cols_to_keep=[]):
     """Load regression results
     
@@ -995,22 +1190,21 @@ def load_and_combine_reg_results(reg_dir, cols_to_keep=[]):
     Returns
     -------
     ds : :class:`xarray.Dataset`
-        Combined regression results from SEIR and SIR data generating processes
+        Combined regression results from SEIR and SIR data generating processes. If the
+        results contain standard errors, ``coefficient_se`` holds the standard error of
+        each policy's coefficients summed over lags, and ``Intercept_se`` and
+        ``cum_effect_se`` are kept as well.
     """
 
     reg_dir = Path(reg_dir)
     sir_dir = reg_dir / "SIR" / "regression"
     reg_res_sir = load_reg_results(sir_dir)
     reg_res_sir["sigma"] = [np.inf]
-    vals_sir = reg_res_sir[cols_to_keep].merge(
-        reg_res_sir.coefficient.sum("reg_lag", skipna=False)
-    )
+    vals_sir = _sum_over_lags(reg_res_sir, cols_to_keep)
 
     seir_dir = reg_dir / "SEIR" / "regression"
     reg_res_seir = load_reg_results(seir_dir)
-    vals_seir = reg_res_seir[cols_to_keep].merge(
-        reg_res_seir.coefficient.sum("reg_lag", skipna=False)
-    )
+    vals_seir = _sum_over_lags(reg_res_seir, cols_to_keep)
 
     vals = xr.concat(
         [vals_seir, vals_sir], dim="sigma", coords="different", data_vars="different"
@@ -1033,15 +1227,26 @@ def calc_cum_effects(coeffs):
     -------
     :class:`xarray.Dataset`
         `coeffs` but with ``cum_effect`` added onto ``policy`` dimension. Also adding
-        ``coefficient_true`` variable.
+        ``coefficient_true`` variable. If `coeffs` contains standard errors (see
+        :func:`load_and_combine_reg_results`), ``coefficient_se`` is extended along
+        ``policy`` in the same way.
     """
 
     effects = coeffs.effect
-    new_coeffs = coeffs.drop_dims("policy").drop("Intercept").copy()
+    has_se = "coefficient_se" in coeffs
+    se_vars = ["Intercept_se", "cum_effect_se"] if has_se else []
+    new_coeffs = coeffs.drop_dims("policy").drop(["Intercept"] + se_vars).copy()
     coeffs["cum_effect"] = coeffs.coefficient.sum(dim="policy", skipna=False)
     new_var = coeffs[["Intercept", "cum_effect"]].to_array(dim="policy")
     coefficient = xr.concat((coeffs.coefficient, new_var), dim="policy")
-    coeffs = xr.merge((new_coeffs, coefficient))
+    to_merge = [new_coeffs, coefficient]
+    if has_se:
+        new_se = coeffs[se_vars].to_array(dim="policy")
+        new_se["policy"] = ["Intercept", "cum_effect"]
+        coefficient_se = xr.concat((coeffs.coefficient_se, new_se), dim="policy")
+        coefficient_se.name = "coefficient_se"
+        to_merge.append(coefficient_se)
+    coeffs = xr.merge(to_merge)
     coeffs.attrs = new_coeffs.attrs
 
     coeffs = coeffs.sortby(["sigma", "pop"])
@@ -1052,3 +1257,40 @@ def calc_cum_effects(coeffs):
     )
 
     return coeffs
+
+
+def calc_ci_coverage(coeffs, alpha=0.05):
+    """Calculate the coverage of confidence intervals around the coefficient estimates
+    across Monte Carlo draws.
+    
+    Parameters
+    ----------
+    coeffs : :class:`xarray.Dataset`
+        Output of :func:`calc_cum_effects`, containing ``coefficient``,
+        ``coefficient_se``, and ``coefficient_true``.
+    alpha : float, optional
+        Significance level, i.e. intervals have nominal coverage of ``1 - alpha``.
+        Intervals are based on the normal approximation.
+    
+    Returns
+    -------
+    :class:`xarray.Dataset`
+        ``coverage``: the share of MC draws in which the confidence interval contains
+        the true coefficient, and ``ci_width``: the mean width of those intervals, for
+        each type of standard error and over all remaining dims of `coeffs` (e.g.
+        ``pop``, ``gamma``, ``sigma``).
+    """
+    z = stats.norm.ppf(1 - alpha / 2)
+    half_width = z * coeffs.coefficient_se
+    err = np.abs(coeffs.coefficient - coeffs.coefficient_true)
+    covered = (err <= half_width).where(
+        coeffs.coefficient.notnull() & coeffs.coefficient_se.notnull()
+    )
+    out = xr.Dataset(
+        {
+            "coverage": covered.mean("sample"),
+            "ci_width": (2 * half_width).mean("sample"),
+        }
+    )
+    out.attrs["alpha"] = alpha
+    return out
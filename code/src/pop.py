@@ -1,10 +1,15 @@
 import warnings
+from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
 import src.utils as cutil
 
+# Directory holding the `adm{level}/adm{level}.csv` population tables. Can be pointed
+# elsewhere (e.g. at tables written by `src.synthetic.write_adm_tables`)
+ADM_DIR = cutil.DATA_INTERIM / "adm"
+
 
 def check_population_col_is_filled(df, adm_col, pop_col, errors="raise"):
     """Check if population column is filled
@@ -40,9 +45,86 @@ def get_adm_fields(adm_level, field_name="name"):
     return [f"adm{i}_" + field_name for i in range(1, adm_level + 1)]
 
 
+def get_adm_levels(columns):
+    """Get sorted list of the adm-levels with an "adm{level}_name" column in `columns`"""
+    return sorted(
+        [
+            int(col[3])
+            for col in columns
+            if col.startswith("adm") and col.endswith("name")
+        ]
+    )
+
+
+class AdmPopRegistry:
+    """Process-level cache of adm-unit population tables
+
+    Each table is read from disk once, with adm-unit names stored as categoricals and
+    rows indexed by country, and each (table, country, columns) lookup is computed
+    once. A table (and all lookups from it) is reloaded if its file's modification time
+    or size changes.
+    """
+
+    def __init__(self):
+        self._tables = dict()
+
+    def clear(self):
+        """Drop all cached tables and lookups"""
+        self._tables = dict()
+
+    def _load(self, path):
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._tables.get(path)
+        if cached is not None and cached["signature"] == signature:
+            return cached
+
+        adm_df = pd.read_csv(path)
+        name_cols = [
+            c for c in adm_df.columns if c.startswith("adm") and c.endswith("name")
+        ]
+        adm_df[name_cols] = adm_df[name_cols].astype("category")
+        cached = dict(
+            signature=signature,
+            df=adm_df,
+            country_rows=adm_df.groupby("adm0_name", sort=False, observed=True).indices,
+            lookups=dict(),
+        )
+        self._tables[path] = cached
+        return cached
+
+    def get_pops(self, path, adm_level, country_code, latlons=False):
+        """Populations at `adm_level` within a country, read from the table at `path`.
+        See `get_adm_pops` for the format of the result."""
+        table = self._load(Path(path))
+        key = (adm_level, country_code, latlons)
+        if key not in table["lookups"]:
+            get_cols = ["population"]
+            if latlons:
+                get_cols += ["latitude", "longitude"]
+
+            indices = get_adm_fields(adm_level)
+            rows = table["country_rows"].get(country_code, [])
+            country_df = table["df"].iloc[rows][indices + get_cols]
+            country_df[indices] = country_df[indices].astype(object)
+            table["lookups"][key] = country_df.set_index(indices).rename(
+                columns={
+                    "population": f"adm{adm_level}_pop",
+                    "latitude": "lat",
+                    "longitude": "lon",
+                }
+            )
+        return table["lookups"][key].copy()
+
+
+adm_pop_registry = AdmPopRegistry()
+
+
 def get_adm_pops(adm_level, country_code, latlons=False):
     """Get all populations at an adm-level within a country
 
+    Tables are cached in `adm_pop_registry`, so repeated calls don't re-read them.
+
     Args:
         adm_level (int): Adm-level of requested populations.
         country_code (str): Three-letter country code of requested populations
@@ -56,29 +138,10 @@ def get_adm_pops(adm_level, country_code, latlons=False):
     # hard code in for US adm3 data
     if (country_code == "USA") and (adm_level == 3):
         path_adm = cutil.DATA_RAW / "usa" / "adm3_pop.csv"
-        adm_df = pd.read_csv(path_adm)
     else:
-        path_adm = (
-            cutil.DATA_INTERIM / "adm" / f"adm{adm_level}" / f"adm{adm_level}.csv"
-        )
-        adm_df = pd.read_csv(path_adm)
-
-    get_cols = ["population"]
-    if latlons:
-        get_cols += ["latitude", "longitude"]
-
-    indices = get_adm_fields(adm_level)
-    return (
-        adm_df.loc[adm_df["adm0_name"] == country_code]
-        .set_index(indices)[get_cols]
-        .rename(
-            columns={
-                "population": f"adm{adm_level}_pop",
-                "latitude": "lat",
-                "longitude": "lon",
-            }
-        )
-    )
+        path_adm = ADM_DIR / f"adm{adm_level}" / f"adm{adm_level}.csv"
+
+    return adm_pop_registry.get_pops(path_adm, adm_level, country_code, latlons)
 
 
 def merge_policies_with_population_on_level(
@@ -194,19 +257,19 @@ def check_pops_in_cases(cases_df, errors="raise"):
 
 
 def assign_all_populations(
-    policies, cases_df, cases_level, get_latlons=True, errors="raise"
+    policies,
+    cases_df,
+    cases_level,
+    get_latlons=True,
+    errors="raise",
+    max_adm_level=None,
 ):
     all_adm0 = policies["adm0_name"].unique()
     assert len(all_adm0) == 1
     country_code = all_adm0[0]
 
-    max_adm_level = max(
-        [
-            int(col[3])
-            for col in policies.columns
-            if col.startswith("adm") and col.endswith("name")
-        ]
-    )
+    if max_adm_level is None:
+        max_adm_level = max(get_adm_levels(policies.columns))
 
     cases_df = merge_cases_with_population_on_level(
         cases_df, cases_level, country_code, get_latlons=get_latlons, errors=errors
@@ -0,0 +1,126 @@
+"""
+Opt-in stage-level timing and memory instrumentation.
+
+Profiling is off by default. Turn it on for a block of code with the `profiling`
+context manager, or for a whole process by setting the ``GPL_COVID_PROFILE``
+environment variable to a truthy value. Records can also be appended as JSON lines to
+a log file, either via the ``log_path`` argument of `profiling` or the
+``GPL_COVID_PROFILE_LOG`` environment variable.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_ENV_VAR = "GPL_COVID_PROFILE"
+PROFILE_LOG_ENV_VAR = "GPL_COVID_PROFILE_LOG"
+
+# stack of settings pushed by `profiling`; the innermost one wins
+_settings_stack = []
+
+
+def _env_enabled():
+    return str(os.environ.get(PROFILE_ENV_VAR, "")).lower() in ["1", "true", "yes"]
+
+
+def get_peak_rss_mb():
+    """Peak resident set size of this process, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KB, macOS reports bytes
+    if sys.platform == "darwin":
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+class StageProfiler:
+    """Collect wall time, CPU time, and peak RSS for named stages of a function.
+
+    Args:
+        enabled (bool): If False, `stage` is a no-op and no records are collected
+        log_path (str or pathlib.Path): If given, `emit` appends records to this file
+            as JSON lines
+        context: Additional key-value pairs (e.g. ``pop``, ``kind``) stored with each
+            record, so that stages can be grouped in batch logs
+    """
+
+    def __init__(self, enabled=True, log_path=None, **context):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.context = context
+        self.records = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        rss_before = get_peak_rss_mb()
+        wall_before = time.perf_counter()
+        cpu_before = time.process_time()
+        try:
+            yield
+        finally:
+            rss_after = get_peak_rss_mb()
+            record = dict(
+                self.context,
+                stage=name,
+                wall_s=time.perf_counter() - wall_before,
+                cpu_s=time.process_time() - cpu_before,
+                peak_rss_mb=rss_after,
+                peak_rss_growth_mb=(
+                    None if rss_after is None else rss_after - rss_before
+                ),
+            )
+            self.records.append(record)
+
+    def to_json(self):
+        """Serialize records to a JSON string (safe to store in netCDF attrs)."""
+        return json.dumps(self.records, default=str)
+
+    def emit(self):
+        """Append all records to `log_path` as JSON lines, if a path was given."""
+        if not (self.enabled and self.log_path):
+            return
+        log_path = Path(self.log_path)
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def profiling(log_path=None):
+    """Enable stage profiling for all instrumented functions called in this block.
+
+    Args:
+        log_path (str or pathlib.Path, optional): File to which stage records are
+            appended as JSON lines. Defaults to the value of ``GPL_COVID_PROFILE_LOG``.
+    """
+    _settings_stack.append(dict(log_path=log_path))
+    try:
+        yield
+    finally:
+        _settings_stack.pop()
+
+
+def get_profiler(**context):
+    """Get a `StageProfiler` configured by the active `profiling` block or by the
+    ``GPL_COVID_PROFILE`` and ``GPL_COVID_PROFILE_LOG`` environment variables.
+    """
+    env_log_path = os.environ.get(PROFILE_LOG_ENV_VAR) or None
+    if len(_settings_stack) > 0:
+        settings = _settings_stack[-1]
+        log_path = settings["log_path"] or env_log_path
+        return StageProfiler(enabled=True, log_path=log_path, **context)
+    return StageProfiler(enabled=_env_enabled(), log_path=env_log_path, **context)
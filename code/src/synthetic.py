@@ -0,0 +1,366 @@
+"""
+Synthetic policy, case, and population tables for scale-testing the merge pipeline.
+
+The generated tables follow the schemas of the real inputs:
+
+* policies: ``data/interim/[country_code]/[country_code]_policy_data_sources.csv``
+* cases: the epi panels passed to `src.merge.assign_policies_to_panel`
+* populations: ``data/interim/adm/adm[level]/adm[level].csv``
+
+so that any panel size (e.g. county-level or multi-year) can be pushed through
+`src.merge.assign_policies_to_panel` without touching the real data. Population tables
+must be visible to `src.pop`, either by writing them with `write_adm_tables` and
+entering `use_adm_dir`, or by pointing `src.pop.ADM_DIR` at them directly.
+"""
+
+import string
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import src.merge as cmerge
+import src.pop as cpop
+
+SYNTHETIC_COUNTRY_CODE = "SYN"
+
+# Column order of the policy data sources files
+POLICY_COLUMNS = [
+    "adm0_name",
+    "adm1_name",
+    "adm1_id",
+    "adm2_name",
+    "adm3_name",
+    "date",
+    "policy",
+    "travel_ban_intl_out_country_list",
+    "travel_ban_intl_in_country_list",
+    "no_gathering_size",
+    "optional",
+    "policy_intensity",
+    "notes",
+    "source",
+    "access_date",
+    "intensity_group",
+    "intensity_group2",
+    "intensity_group3",
+    "intensity_group4",
+    "intensity_group5",
+    "implied_policy",
+]
+N_INTENSITY_GROUPS = 5
+MAX_ADM_LEVEL = 3
+UNIT_NAMES = {1: "Region", 2: "District", 3: "Town"}
+
+
+def _adm_id(i):
+    """Two-letter adm1 id (AA, AB, ...) for the `i`th adm1 unit"""
+    letters = string.ascii_uppercase
+    return letters[(i // len(letters)) % len(letters)] + letters[i % len(letters)]
+
+
+def make_adm_tables(
+    n_adm1,
+    n_adm2=0,
+    n_adm3=0,
+    country_code=SYNTHETIC_COUNTRY_CODE,
+    unique_names=True,
+    seed=0,
+):
+    """Make nested adm-unit population tables
+
+    Args:
+        n_adm1 (int): Number of adm1 units
+        n_adm2 (int): Number of adm2 units within each adm1 unit
+        n_adm3 (int): Number of adm3 units within each adm2 unit
+        country_code (str): Value of the "adm0_name" column
+        unique_names (bool): If True (default), names are unique within each level.
+            Otherwise they are only unique within their parent unit (e.g. "District 0"
+            in every adm1 unit), as with US counties
+        seed (int): Seed for populations and coordinates
+
+    Returns:
+        dict of int to pandas.DataFrame: Population table for each adm-level from 1 to
+            3, in the format of ``data/interim/adm/adm[level]/adm[level].csv``. Tables for
+            levels without units are empty. Higher-level populations are the sums of the
+            lower-level ones.
+    """
+    rng = np.random.RandomState(seed)
+    counts = [n for n in [n_adm1, n_adm2, n_adm3] if n > 0]
+    if len(counts) == 0 or counts[0] != n_adm1:
+        raise ValueError("Need at least one adm1 unit to nest lower levels in")
+
+    max_level = len(counts)
+    n_lowest = np.prod(counts)
+    lowest = pd.DataFrame({"adm0_name": [country_code] * n_lowest})
+    for level in range(1, max_level + 1):
+        # every unit at `level` covers `n_per_unit` units at the lowest level
+        n_per_unit = np.prod(counts[level:], dtype=int)
+        unit_ix = np.arange(n_lowest) // n_per_unit
+        if not unique_names:
+            unit_ix = unit_ix % counts[level - 1]
+        lowest[f"adm{level}_name"] = [f"{UNIT_NAMES[level]} {i}" for i in unit_ix]
+
+    lowest["population"] = np.round(rng.lognormal(11, 1.5, n_lowest))
+    lowest["latitude"] = np.round(rng.uniform(25, 50, n_lowest), 3)
+    lowest["longitude"] = np.round(rng.uniform(-125, -70, n_lowest), 3)
+
+    tables = dict()
+    for level in range(1, MAX_ADM_LEVEL + 1):
+        adm_fields = ["adm0_name"] + cpop.get_adm_fields(level)
+        if level > max_level:
+            tables[level] = pd.DataFrame(
+                columns=adm_fields + ["latitude", "longitude", "population"]
+            )
+            continue
+        tables[level] = (
+            lowest.groupby(adm_fields, sort=False)
+            .agg({"latitude": "mean", "longitude": "mean", "population": "sum"})
+            .round(3)
+            .reset_index()
+        )
+    return tables
+
+
+def get_max_level(adm_tables):
+    """Lowest adm-level (highest number) with any units in `adm_tables`"""
+    return max(level for level, df in adm_tables.items() if len(df) > 0)
+
+
+def default_cases_level(adm_tables):
+    """Lowest adm-level of the processed datasets (adm2 if present, else adm1)"""
+    return min(get_max_level(adm_tables), 2)
+
+
+def write_adm_tables(adm_tables, adm_dir):
+    """Write tables from `make_adm_tables` to `adm_dir` in the layout read by `src.pop`
+
+    Args:
+        adm_tables (dict of int to pandas.DataFrame): Output of `make_adm_tables`
+        adm_dir (str or pathlib.Path): Directory to write ``adm[level]/adm[level].csv`` to
+
+    Returns:
+        pathlib.Path: `adm_dir`
+    """
+    adm_dir = Path(adm_dir)
+    for level, df in adm_tables.items():
+        out_dir = adm_dir / f"adm{level}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        df.to_csv(out_dir / f"adm{level}.csv", index=False)
+    return adm_dir
+
+
+@contextmanager
+def use_adm_dir(adm_dir):
+    """Temporarily read adm-unit populations from `adm_dir` instead of ``data/interim/adm``"""
+    old_adm_dir = cpop.ADM_DIR
+    cpop.ADM_DIR = Path(adm_dir)
+    try:
+        yield
+    finally:
+        cpop.ADM_DIR = old_adm_dir
+
+
+def make_cases(adm_tables, cases_level, n_days, start_date="2020-03-01", seed=0):
+    """Make a balanced panel of cumulative cases and deaths
+
+    Args:
+        adm_tables (dict of int to pandas.DataFrame): Output of `make_adm_tables`
+        cases_level (int): Adm-level of the panel
+        n_days (int): Number of days in the panel
+        start_date (str): First date of the panel
+        seed (int): Seed for case counts
+
+    Returns:
+        pandas.DataFrame: Panel with columns "date", "adm0_name", ..., "adm{cases_level}_name",
+            "cum_confirmed_cases" and "cum_deaths", sorted by unit and date
+    """
+    rng = np.random.RandomState(seed)
+    units = adm_tables[cases_level]
+    adm_fields = ["adm0_name"] + cpop.get_adm_fields(cases_level)
+    dates = pd.date_range(start_date, periods=n_days)
+
+    cases = units.loc[np.repeat(units.index, n_days), adm_fields].reset_index(drop=True)
+    cases.insert(0, "date", np.tile(dates, len(units)))
+
+    # exponential growth at a unit-specific rate (capped, so that long horizons don't
+    # overflow), with Poisson noise
+    growth = rng.uniform(0.02, 0.3, (len(units), 1))
+    new_cases = rng.poisson(np.minimum(np.exp(growth * np.arange(n_days)), 1e4))
+    cum_cases = new_cases.cumsum(axis=1)
+    cases["cum_confirmed_cases"] = cum_cases.flatten()
+    cases["cum_deaths"] = rng.binomial(cum_cases, 0.02).flatten()
+    return cases
+
+
+def make_policies(
+    adm_tables,
+    n_days,
+    n_policies=len(cmerge.us_intensity_rules),
+    density=1.0,
+    level_weights=None,
+    p_optional=0.2,
+    cases_level=None,
+    start_date="2020-03-01",
+    seed=0,
+):
+    """Make a policy table in the format of the policy data sources files
+
+    Policy categories are taken from the US intensity coding rules first (with
+    "intensity_group" columns drawn from the groups defined for each one, so that
+    ``method="USA"`` can be used), then padded with generic categories if `n_policies`
+    is larger than the number of categories with rules.
+
+    Args:
+        adm_tables (dict of int to pandas.DataFrame): Output of `make_adm_tables`
+        n_days (int): Number of days over which policies are enacted
+        n_policies (int): Number of policy categories
+        density (float): Expected number of policies per policy category and adm-unit
+            at each level (adm0 is treated as a single unit)
+        level_weights (list of float): Relative density at each adm-level, from adm0 down.
+            Defaults to equal weights
+        p_optional (float): Share of policies that are optional
+        cases_level (int): Adm-level of the cases panel the policies will be assigned to.
+            Units below this level get at most one policy per category, as
+            `src.merge.get_intensities` adds up the pop-weighted intensities of all
+            sub-unit policies. Defaults to `default_cases_level`
+        start_date (str): Earliest possible policy date
+        seed (int): Seed for policy placement, dates, and intensities
+
+    Returns:
+        pandas.DataFrame: Policies with columns `POLICY_COLUMNS`. Columns are filled with
+            "All" above the adm-level at which each policy is enacted
+    """
+    rng = np.random.RandomState(seed)
+    max_level = get_max_level(adm_tables)
+    if level_weights is None:
+        level_weights = [1] * (max_level + 1)
+    if len(level_weights) != max_level + 1:
+        raise ValueError(f"Need one level weight for each of adm0 to adm{max_level}")
+    if cases_level is None:
+        cases_level = default_cases_level(adm_tables)
+
+    rule_policies = list(cmerge.us_intensity_rules)
+    policy_names = rule_policies[:n_policies] + [
+        f"policy_{i}" for i in range(n_policies - len(rule_policies))
+    ]
+
+    country_code = adm_tables[1]["adm0_name"].iloc[0]
+    adm_fields = cpop.get_adm_fields(MAX_ADM_LEVEL)
+    frames = []
+    for level in range(max_level + 1):
+        if level == 0:
+            units = pd.DataFrame({"adm0_name": [country_code]})
+        else:
+            units = adm_tables[level]
+        n_enacted = rng.poisson(
+            density * level_weights[level], (len(units), len(policy_names))
+        )
+        if level > cases_level:
+            n_enacted = np.minimum(n_enacted, 1)
+        unit_ix, policy_ix = np.nonzero(n_enacted)
+        n_repeats = n_enacted[unit_ix, policy_ix]
+        unit_ix = np.repeat(unit_ix, n_repeats)
+        policy_ix = np.repeat(policy_ix, n_repeats)
+
+        level_df = units.iloc[unit_ix][["adm0_name"] + adm_fields[:level]]
+        level_df = level_df.reset_index(drop=True)
+        for field in adm_fields[level:]:
+            level_df[field] = "All"
+        level_df["policy"] = np.array(policy_names)[policy_ix]
+        frames.append(level_df)
+
+    policies = pd.concat(frames, ignore_index=True)
+    n = len(policies)
+
+    policies["adm1_id"] = "All"
+    in_adm1 = policies["adm1_name"] != "All"
+    adm1_ix = policies.loc[in_adm1, "adm1_name"].str.split(" ").str[-1].astype(int)
+    policies.loc[in_adm1, "adm1_id"] = adm1_ix.apply(_adm_id).values
+
+    policies["date"] = pd.to_datetime(start_date) + pd.to_timedelta(
+        rng.randint(n_days, size=n), unit="D"
+    )
+    policies["optional"] = np.where(rng.uniform(size=n) < p_optional, "Y", "N")
+    policies["policy_intensity"] = rng.choice([0.25, 0.5, 0.75, 1.0], n)
+
+    for i in range(N_INTENSITY_GROUPS):
+        policies["intensity_group" + ("" if i == 0 else str(i + 1))] = np.nan
+    for policy in [p for p in policy_names if p in rule_policies]:
+        groups = list(cmerge.us_intensity_rules[policy]["weights"])
+        is_policy = policies["policy"] == policy
+        policies.loc[is_policy, "intensity_group"] = rng.choice(groups, is_policy.sum())
+        # a few policies carry a second intensity group
+        has_group2 = is_policy & (rng.uniform(size=n) < 0.1)
+        policies.loc[has_group2, "intensity_group2"] = rng.choice(
+            groups, has_group2.sum()
+        )
+
+    policies["travel_ban_intl_out_country_list"] = np.nan
+    policies["travel_ban_intl_in_country_list"] = np.nan
+    policies["no_gathering_size"] = np.nan
+    policies["notes"] = "synthetic"
+    policies["source"] = "synthetic"
+    policies["access_date"] = pd.to_datetime(start_date) + pd.to_timedelta(
+        n_days, unit="D"
+    )
+    policies["implied_policy"] = False
+
+    return (
+        policies[POLICY_COLUMNS]
+        .sort_values(["date", "policy"], kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+
+def prepare_policies_for_merge(policies):
+    """Rename and parse date columns as done by the merge scripts before calling
+    `src.merge.assign_policies_to_panel`"""
+    policies = policies.rename(columns={"date": "date_start"})
+    policies["date_start"] = pd.to_datetime(policies["date_start"])
+    policies["date_end"] = pd.to_datetime("2099-12-31")
+    return policies
+
+
+def make_panel_inputs(
+    n_adm1,
+    n_adm2,
+    n_days,
+    n_adm3=0,
+    cases_level=None,
+    start_date="2020-03-01",
+    unique_names=True,
+    seed=0,
+    **policy_kwargs,
+):
+    """Make matching population tables, cases panel, and policies
+
+    Args:
+        n_adm1, n_adm2, n_adm3 (int): Number of units at each level, as in `make_adm_tables`
+        n_days (int): Number of days in the cases panel and over which policies are enacted
+        cases_level (int): Adm-level of the cases panel. Defaults to `default_cases_level`
+        start_date (str): First date of the panel
+        unique_names (bool): Passed to `make_adm_tables`
+        seed (int): Seed for all tables
+        policy_kwargs: Passed to `make_policies`
+
+    Returns:
+        tuple of (dict, pandas.DataFrame, pandas.DataFrame): Population tables, cases,
+            and policies (ready for `src.merge.assign_policies_to_panel`)
+    """
+    adm_tables = make_adm_tables(
+        n_adm1, n_adm2, n_adm3, unique_names=unique_names, seed=seed
+    )
+    if cases_level is None:
+        cases_level = default_cases_level(adm_tables)
+    cases = make_cases(adm_tables, cases_level, n_days, start_date, seed=seed)
+    policies = make_policies(
+        adm_tables,
+        n_days,
+        cases_level=cases_level,
+        start_date=start_date,
+        seed=seed,
+        **policy_kwargs,
+    )
+    return adm_tables, cases, prepare_policies_for_merge(policies)
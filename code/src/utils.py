@@ -1,11 +1,15 @@
+import hashlib
+import inspect
 import json
+import os
 from pathlib import Path
 
 import pandas as pd
-import requests
+import xarray as xr
 from bs4 import BeautifulSoup
 
 from . import __file__ as pkg_init_name
+from . import download
 
 HOME = Path(pkg_init_name).parent.parent.parent
 DATA = HOME / "data"
@@ -26,34 +30,97 @@ PROCESSED_DATA_DATE_CUTOFF = False
 
 COLORS = {"effect": "#27408B", "no_policy_growth_rate": "#8B0000"}
 
+# Record of files fetched by `download_file(s)`, used to revalidate them
+DOWNLOAD_MANIFEST = HOME / ".cache" / "download_manifest.json"
+
+# Tables extracted from scraped pages by `get_scraped_table`
+SCRAPE_CACHE = HOME / ".cache" / "scraped"
+# Bump to invalidate all cached scraped tables, e.g. when `table_cells` or `parse_int`
+# change
+SCRAPE_CACHE_VERSION = 1
+
 
 def zipify_path(path):
     return "zip://" + str(path)
 
 
+def download_files(downloads, overwrite=False, **kwargs):
+    """Download (url, out_path) pairs concurrently. See `src.download.download_files`"""
+    return download.download_files(
+        downloads, overwrite=overwrite, manifest_path=DOWNLOAD_MANIFEST, **kwargs
+    )
+
+
 def download_file(url, out_path, overwrite=False):
-    out_path = Path(out_path)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    if (not out_path.exists()) or overwrite:
-        r = requests.get(url, allow_redirects=True)
-        if Path(out_path).suffix in [".csv", ".txt"]:
-            with open(out_path, "w") as f:
-                f.write(r.text)
-        else:
-            with open(out_path, "wb") as f:
-                f.write(r.content)
+    download_files([(url, out_path)], overwrite=overwrite)
     return None
 
 
 def get_scraped_text(url, out_path, overwrite=False):
-    if (not out_path.exists()) or overwrite:
-        with open(out_path, "w") as f:
-            f.write(requests.get(url).text)
+    download_files([(url, out_path)], overwrite=overwrite, text=True)
     with open(out_path, "r") as f:
         text = BeautifulSoup(f.read(), "lxml")
     return text
 
 
+def source_sha256(*objs):
+    """Checksum of the source code of functions, classes or modules"""
+    sha256 = hashlib.sha256()
+    for obj in objs:
+        sha256.update(inspect.getsource(obj).encode())
+    return sha256.hexdigest()
+
+
+def get_scraped_table(url, out_path, extract, overwrite=False):
+    """Get a table extracted from a scraped page
+
+    Extracted tables are cached as netCDF files in `SCRAPE_CACHE`, keyed by the
+    checksum of the saved page, the name of `extract`, the source code of `extract` and
+    of the module defining it (so that edits to the helpers it calls count too) and
+    `SCRAPE_CACHE_VERSION`, so that pages are only parsed again when they or the code
+    extracting them change.
+
+    Args:
+        url (str): URL of the page
+        out_path (pathlib.Path): where the page is saved
+        extract (function): takes the parsed page (`bs4.BeautifulSoup`) and returns
+            the table as a `pandas.DataFrame` with a range index, and columns of
+            numbers or strings
+        overwrite (bool): passed to `get_scraped_text`
+
+    Returns:
+        pandas.DataFrame: output of `extract`
+    """
+    download_files([(url, out_path)], overwrite=overwrite, text=True)
+    sha256 = download.file_sha256(out_path)
+    extract_sha256 = source_sha256(extract, inspect.getmodule(extract))
+    cache_path = SCRAPE_CACHE / (
+        f"{Path(out_path).stem}.{extract.__name__}.v{SCRAPE_CACHE_VERSION}."
+        f"{sha256[:16]}.{extract_sha256[:16]}.nc"
+    )
+    if cache_path.exists():
+        with xr.open_dataset(cache_path) as ds:
+            return ds.to_dataframe().reset_index(drop=True)
+
+    with open(out_path, "r") as f:
+        table = extract(BeautifulSoup(f.read(), "lxml")).reset_index(drop=True)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    xr.Dataset.from_dataframe(table).to_netcdf(tmp_path)
+    os.replace(tmp_path, cache_path)
+    return table
+
+
+def table_cells(element):
+    """Text of the cells ("td" elements) of each row ("tr" element) in `element`"""
+    return [[td.text for td in tr.find_all("td")] for tr in element.find_all("tr")]
+
+
+def parse_int(text):
+    """Parse an integer written with thousands separators (e.g. "1,234")"""
+    return int(text.strip().replace(",", ""))
+
+
 def iso_to_dirname(iso3):
     mapping = {
         "FRA": "france",
@@ -0,0 +1,23 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+CODE = Path(__file__).parents[1] / "code"
+
+
+@pytest.fixture
+def load_script(monkeypatch):
+    """Function loading a script as a module, given its path relative to "code".
+    Scripts that parse their arguments when they are loaded get none."""
+
+    def load(path):
+        path = CODE / path
+        monkeypatch.setattr(sys, "argv", [str(path)])
+        spec = importlib.util.spec_from_file_location(path.stem, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
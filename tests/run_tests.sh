@@ -9,4 +9,4 @@ black . --check
 python -m ipykernel install --user --name gpl-covid
 
 # run tests
-pytest tests/tests.py
\ No newline at end of file
+pytest tests
\ No newline at end of file
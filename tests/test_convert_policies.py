@@ -0,0 +1,197 @@
+import operator
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.utils as cutil
+
+
+@pytest.fixture
+def convert(load_script):
+    return load_script("data/multi_country/convert-policies-raw-to-interim.py")
+
+
+# The implementation the script used before compiling rules into plans, which
+# concatenated and re-sorted the policies after each rule
+
+op_dict = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "=": operator.eq,
+}
+
+
+def is_already_in_df(adm1_name, adm2_name, dst_policy, df):
+    found = (
+        (df["policy"] == dst_policy)
+        & (df["adm1_name"] == adm1_name)
+        & (df["adm2_name"] == adm2_name)
+    )
+    return found.sum() > 0
+
+
+def apply_rule(df, src_policy, op_str, src_val, dst_rule, country_code):
+    dst_policy, dst_val, *dst_args = dst_rule
+    op = op_dict[op_str]
+
+    mask = df["policy"] == src_policy
+    mask = (mask) & (df["optional"] != "Y")
+    if country_code not in ["CHN", "IRN"]:
+        mask = (mask) & (op(df["policy_intensity"], src_val))
+
+    pcopy = df[mask].copy()
+
+    if country_code == "CHN":
+        already_in_df_mask = pcopy.apply(
+            lambda row: is_already_in_df(
+                row["adm1_name"], row["adm2_name"], dst_policy, df
+            ),
+            axis=1,
+        )
+        pcopy = pcopy[~already_in_df_mask].copy()
+
+    pcopy["policy"] = dst_policy
+    pcopy["implied_policy"] = True
+    if dst_policy == "no_gathering" and len(dst_args) > 0:
+        pcopy["no_gathering_size"] = dst_args[0]
+
+    if country_code not in ["CHN", "IRN"]:
+        pcopy["policy_intensity"] = dst_val
+
+    df = pd.concat([df, pcopy], ignore_index=True).sort_values(
+        "date_start", ascending=True
+    )
+
+    return df
+
+
+def apply_usa_rule(df, src_policy, dst_policies):
+    src_category, src_group = src_policy.split(".")
+
+    intensity_cols = [c for c in df.columns if c.startswith("intensity_group")]
+    src_category_mask = df["policy"] == src_category
+
+    psrc = df[src_category_mask].copy()
+
+    src_group_mask = np.zeros_like(psrc.columns[0], dtype=bool)
+    for c in intensity_cols:
+        src_group_mask = (src_group_mask) | (psrc[c] == src_group)
+
+    psrc = psrc[src_group_mask].copy()
+
+    for dst_policy in dst_policies:
+        dst_category, dst_group = dst_policy.split(".")
+        pcopy = psrc.copy()
+        pcopy["policy"] = dst_category
+        pcopy["implied_policy"] = True
+        pcopy[intensity_cols[0]] = dst_group
+        for c in intensity_cols[1:]:
+            pcopy[c] = np.nan
+
+        df = pd.concat([df, pcopy], ignore_index=True).sort_values(
+            "date", ascending=True
+        )
+
+    return df
+
+
+def reference_apply_implies(df, implies, country_code):
+    for rule in implies:
+        if country_code == "USA":
+            df = apply_usa_rule(df, rule, implies[rule])
+        else:
+            src_policy, op_str, src_val, dst_rules_list = rule
+            for dst_rule in dst_rules_list:
+                df = apply_rule(df, src_policy, op_str, src_val, dst_rule, country_code)
+
+    return df
+
+
+def assert_same_implies(convert, df, implies, country_code):
+    df["implied_policy"] = False
+    expected = reference_apply_implies(df.copy(), implies, country_code)
+    result = convert.apply_implies(df.copy(), implies, country_code)
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True)
+    )
+    return result
+
+
+def make_policies(n, policies, seed=0):
+    """Random policies with many tied start dates"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "adm1_name": rng.choice(["A", "B", "C"], n),
+            "adm2_name": rng.choice(["a", "b", "c", "d"], n),
+            "date_start": pd.Series(pd.date_range("2020-03-01", periods=5))
+            .dt.strftime("%Y-%m-%d")
+            .sample(n, replace=True, random_state=seed)
+            .values,
+            "policy": rng.choice(policies, n),
+            "policy_intensity": rng.choice([0.25, 0.5, 1.0], n),
+            "optional": rng.choice(["N", "Y", np.nan], n, p=[0.7, 0.1, 0.2]),
+            "no_gathering_size": np.nan,
+        }
+    )
+
+
+def test_apply_implies_chained(convert):
+    # later rules select rows implied by earlier ones, including a rule implying
+    # its own source policy
+    implies = [
+        ["home_isolation", ">", 0, [["no_gathering", 1], ["social_distance", 1]]],
+        ["no_gathering", ">=", 1, [["event_cancel", 1], ["home_isolation", 0.5]]],
+        ["home_isolation", "=", 0.5, [["work_from_home", 1], ["no_gathering", 1, 50]]],
+        ["event_cancel", "<", 1, [["event_cancel", 1]]],
+    ]
+    policies = ["home_isolation", "no_gathering", "event_cancel", "school_closure"]
+    result = assert_same_implies(convert, make_policies(300, policies), implies, "ITA")
+    assert result["implied_policy"].sum() > 300
+
+
+def test_apply_implies_skip_existing(convert):
+    df = make_policies(200, ["home_isolation", "travel_ban_local", "social_distance"])
+    df = df.drop(columns=["policy_intensity"])
+    # policies without a location never count as existing
+    df.loc[df.index % 7 == 0, "adm1_name"] = np.nan
+    df.loc[df.index % 5 == 0, "adm2_name"] = np.nan
+    implies = [
+        ["home_isolation", "=", 1, [["travel_ban_local", 1], ["travel_ban_local", 1]]],
+        ["travel_ban_local", "=", 1, [["work_from_home", 1], ["home_isolation", 1]]],
+        ["social_distance", "=", 1, [["work_from_home", 1]]],
+    ]
+    result = assert_same_implies(convert, df, implies, "CHN")
+    assert result["implied_policy"].any()
+
+
+def test_apply_implies_usa(convert):
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame(
+        {
+            "date": rng.choice(["2020-03-10", "2020-03-11", "2020-03-12"], n),
+            "policy": rng.choice(["home_isolation", "no_gathering", "event_cancel"], n),
+            "intensity_group": rng.choice(["mandatory", "advisory", "x"], n),
+            "intensity_group_2": rng.choice(["mandatory", "y", np.nan], n),
+        }
+    )
+    implies = {
+        "home_isolation.mandatory": ["no_gathering.x", "work_from_home.wfh"],
+        "no_gathering.x": ["event_cancel.x", "home_isolation.mandatory"],
+    }
+    assert_same_implies(convert, df, implies, "USA")
+
+
+@pytest.mark.parametrize("country_code", ["CHN", "FRA", "ITA", "USA"])
+def test_apply_implies_rules(convert, country_code):
+    filename = f"{country_code}_policy_data_sources.csv"
+    path = cutil.DATA_RAW / cutil.iso_to_dirname(country_code) / filename
+    df = pd.read_csv(path, encoding="latin1")
+    if country_code == "USA":
+        df = convert.clean_intensities_usa(df)
+    implies = convert.read_implies()[country_code]
+    assert_same_implies(convert, df, implies, country_code)
@@ -0,0 +1,31 @@
+import json
+
+import numpy as np
+
+
+def test_process_snapshot(load_script, tmp_path):
+    covidtracking = load_script("data/usa/download_latest_covidtrackingdotcom_data.py")
+    records = [
+        dict(date=20200316, state="WA", positive=904, negative=None, death=48),
+        dict(date=20200316, state="VI", positive=1, negative=None, death=0),
+        dict(date=20200315, state="WA", positive=642, negative=None, death=40),
+        dict(date=20200315, state="VI", positive=1, negative=2, death=0),
+        dict(date=20200314, state="WA", positive=568, negative=6001, death=37),
+    ]
+    snapshot = tmp_path / "states_daily.jsonl"
+    snapshot.write_text("\n".join(json.dumps(r) for r in records))
+
+    raw = covidtracking.download_and_save_data_raw(False, snapshot=snapshot)
+    states_data = covidtracking.process_and_save_data_int(raw, save_locally=False)
+
+    assert states_data["date"].tolist() == ["2020-03-16"] * 2 + ["2020-03-15"] * 2 + [
+        "2020-03-14"
+    ]
+    assert states_data["adm1_name"].tolist() == ["Washington", "Virgin Islands"] * 2 + [
+        "Washington"
+    ]
+    # rows are newest first, so missing negatives are filled with earlier reports of
+    # the same state
+    np.testing.assert_array_equal(
+        states_data["cumulative_tests"], [6905, 3, 6643, 3, 6569]
+    )
@@ -0,0 +1,90 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.utils as cutil
+from src import cube
+
+
+def read_processed(adm_level, country):
+    df = pd.read_csv(
+        cutil.DATA_PROCESSED / f"adm{adm_level}" / f"{country}_processed.csv"
+    )
+    return df.assign(date=pd.to_datetime(df["date"]))
+
+
+def sort_panel(df, adm_col):
+    return df.sort_values(["date", adm_col]).reset_index(drop=True)
+
+
+def test_policy_list_ita():
+    df = read_processed(2, "ITA")
+    policies = cube.get_policy_list(df)
+    assert "social_distance" in policies and "testing_regime" in policies
+    assert not any(p.endswith("_opt") or p.endswith("_popwt") for p in policies)
+
+
+@pytest.mark.parametrize("adm_level,country", [(1, "USA"), (2, "ITA")])
+def test_roundtrip(adm_level, country):
+    df = read_processed(adm_level, country)
+    c = cube.panel_to_cube(df, adm_level)
+
+    assert c["policy_values"].dims == ("adm", "date", "policy", "variant")
+    assert c["policy_values"].dtype == np.float32
+    assert c["present"].values.all()
+
+    adm_col = f"adm{adm_level}_name"
+    pd.testing.assert_frame_equal(
+        cube.cube_to_panel(c), sort_panel(df, adm_col), check_exact=False, rtol=1e-6,
+    )
+
+
+def test_roundtrip_unbalanced_binary():
+    df = read_processed(2, "CHN")
+    df = df.drop(df.sample(frac=0.1, random_state=0).index)
+    policies = ["travel_ban_local", "emergency_declaration", "home_isolation"]
+    c = cube.panel_to_cube(df, 2, policy_list=policies, adm_col="adm2_id")
+
+    assert c["policy_values"].dtype == np.uint8
+    assert c["has_variant"].sel(variant="indicator").all()
+    assert not c["has_variant"].sel(variant="popwt").any()
+    assert c["present"].sum() == len(df)
+
+    pd.testing.assert_frame_equal(cube.cube_to_panel(c), sort_panel(df, "adm2_id"))
+
+
+def test_compact_allocation():
+    n_adm, n_date = 300, 120
+    policies = [f"policy_{i}" for i in range(6)]
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "adm1_name": np.repeat([f"adm_{i}" for i in range(n_adm)], n_date),
+            "date": np.tile(pd.date_range("2020-03-01", periods=n_date), n_adm),
+            "population": np.repeat(np.arange(n_adm), n_date),
+            **{
+                p + suffix: rng.integers(0, 2, n_adm * n_date).astype(float)
+                for p in policies
+                for suffix in cube.VARIANTS.values()
+            },
+        }
+    )
+
+    tracemalloc.start()
+    try:
+        c = cube.panel_to_cube(df, 1, policy_list=policies)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # the cube is never held as float64
+    assert c["policy_values"].dtype == np.uint8
+    assert peak < c["policy_values"].size * np.dtype(np.float64).itemsize
+
+
+def test_duplicated_rows():
+    df = read_processed(1, "USA").head(10)
+    with pytest.raises(ValueError):
+        cube.panel_to_cube(pd.concat([df, df]), 1)
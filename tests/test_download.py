@@ -0,0 +1,106 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src import download
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves `server.files` (path -> bytes) with ETags, counting full responses"""
+
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.server.n_sent += 1
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Type", self.server.content_types.get(self.path, ""))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.files = {f"/file_{i}.zip": bytes([i]) * (100000 + i) for i in range(5)}
+    server.content_types = dict()
+    server.n_sent = 0
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_files(server, tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    downloads = [(server.url + name, tmp_path / name[1:]) for name in server.files]
+
+    outcomes = download.download_files(downloads, manifest_path=manifest_path)
+    assert outcomes == [download.DOWNLOADED] * len(downloads)
+    manifest = download.DownloadManifest(manifest_path)
+    for url, path in downloads:
+        body = server.files[url[len(server.url) :]]
+        assert path.read_bytes() == body
+        assert manifest.get(path)["sha256"] == hashlib.sha256(body).hexdigest()
+
+    # existing files are kept without a request, unless overwritten
+    assert download.download_files(downloads, manifest_path=manifest_path) == [
+        download.EXISTS
+    ] * len(downloads)
+    assert server.n_sent == len(downloads)
+
+    # unchanged files are revalidated rather than downloaded again
+    server.files["/file_0.zip"] = b"changed"
+    (tmp_path / "file_1.zip").write_bytes(b"corrupted")
+    outcomes = download.download_files(
+        downloads, overwrite=True, manifest_path=manifest_path
+    )
+    assert outcomes == [download.DOWNLOADED] * 2 + [download.NOT_MODIFIED] * 3
+    assert server.n_sent == len(downloads) + 2
+    assert (tmp_path / "file_0.zip").read_bytes() == b"changed"
+    assert (tmp_path / "file_1.zip").read_bytes() == server.files["/file_1.zip"]
+
+
+def test_download_text(server, tmp_path):
+    server.files["/page.txt"] = "Valle d'Aosta/Vallée d'Aoste".encode("latin-1")
+    server.content_types["/page.txt"] = "text/plain; charset=ISO-8859-1"
+    out_path = tmp_path / "page.txt"
+    download.download(server.url + "/page.txt", out_path)
+    assert out_path.read_text(encoding="utf-8") == "Valle d'Aosta/Vallée d'Aoste"
+
+    # text of unknown encoding is written unchanged
+    server.files["/data.csv"] = "name\nVallée d'Aoste\n".encode("latin-1")
+    server.content_types["/data.csv"] = "application/octet-stream"
+    manifest_path = tmp_path / "manifest.json"
+    out_path = tmp_path / "data.csv"
+    download.download_files(
+        [(server.url + "/data.csv", out_path)], manifest_path=manifest_path
+    )
+    assert out_path.read_bytes() == server.files["/data.csv"]
+    assert (
+        download.DownloadManifest(manifest_path).get(out_path)["sha256"]
+        == hashlib.sha256(server.files["/data.csv"]).hexdigest()
+    )
+
+
+def test_download_error(server, tmp_path):
+    out_path = tmp_path / "missing.zip"
+    with pytest.raises(requests.HTTPError):
+        download.download_files([(server.url + "/missing.zip", out_path)])
+    assert not out_path.exists()
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from statsmodels.api import OLS
+
+from src.models import epi
+
+N_DAYS = 40
+
+
+def run_small_sim(kind, pop=1e5, save_dir=None):
+    return epi.simulate_and_regress(
+        pop,
+        0.4,
+        [-0.05, -0.1, -0.2],
+        [[], [], []],
+        [5, 20],
+        N_DAYS,
+        4,
+        10,
+        ["I", "EI", "IR"],
+        [0, 2],
+        [0.2],
+        10,
+        sigma_to_test=[0.33],
+        measurement_noise_on="normal",
+        measurement_noise_sd=0.05,
+        kind=kind,
+        I0=1,
+        E0=0,
+        random_end=True,
+        save_dir=save_dir,
+    )
+
+
+def test_fit_ols_batched_matches_statsmodels():
+    rng = np.random.RandomState(0)
+    n_reg, n_t = 5, 40
+    X = np.concatenate(
+        [np.ones((n_reg, n_t, 1)), rng.randint(0, 2, (n_reg, n_t, 3))], axis=-1
+    )
+    X[0, :, 3] = 0  # rank-deficient design
+    y = rng.normal(size=(n_reg, n_t)) + X @ [0.3, -0.1, 0.2, 0]
+    y[1, n_t - 3] = np.nan  # last valid day, so HAC lags are unaffected
+    y[2, 10] = np.nan
+    valid = np.zeros((n_reg, n_t), dtype=bool)
+    for i in range(n_reg):
+        valid[i, i : n_t - 2 * i] = True
+
+    params, mse_resid, cov = epi.fit_ols_batched(y, X, valid, hac_maxlags=3)
+    for i in range(n_reg):
+        fit_kwargs = [{}, dict(cov_type="HC1")]
+        if i != 2:
+            # HAC lags are in calendar time, not in rows of the data with NaNs dropped
+            fit_kwargs.append(dict(cov_type="HAC", cov_kwds=dict(maxlags=3)))
+        for cx, kwargs in enumerate(fit_kwargs):
+            res = OLS(y[i, valid[i]], X[i, valid[i]], missing="drop").fit(**kwargs)
+            np.testing.assert_allclose(params[i], res.params, atol=1e-12)
+            np.testing.assert_allclose(mse_resid[i], res.mse_resid)
+            np.testing.assert_allclose(cov[cx, i], res.cov_params(), atol=1e-12)
+
+
+def test_standard_errors_and_coverage(tmp_path):
+    for kind in ["SIR", "SEIR"]:
+        for pop in [1e5, 1e6]:
+            ds = run_small_sim(kind, pop, save_dir=tmp_path / kind / "regression")
+
+    assert list(ds.cov_type.values) == epi.COV_TYPES
+    assert ds.coefficient_se.dims == ("cov_type",) + ds.coefficient.dims
+    for v in ["coefficient_se", "Intercept_se", "policy_effect_se", "cum_effect_se"]:
+        assert (ds[v] >= 0).all()
+
+    coeffs = epi.load_and_combine_reg_results(
+        tmp_path, cols_to_keep=["effect", "Intercept", "rmse"]
+    )
+    coeffs = epi.calc_cum_effects(coeffs)
+    assert list(coeffs.policy.values) == ["p1", "p2", "p3", "Intercept", "cum_effect"]
+    # SIR results don't have an "EI" LHS var, so check NaNs line up with coefficients
+    has_se = coeffs.coefficient_se.notnull()
+    assert (has_se == coeffs.coefficient.notnull()).all()
+    assert has_se.any()
+
+    coeffs = coeffs.sel(LHS=["I", "IR"])
+    coverage = epi.calc_ci_coverage(coeffs, alpha=0.05)
+    assert "sample" not in coverage.coverage.dims
+    assert ((coverage.coverage >= 0) & (coverage.coverage <= 1)).all()
+    wider = epi.calc_ci_coverage(coeffs, alpha=0.01)
+    assert (wider.coverage >= coverage.coverage).all()
+    assert (wider.ci_width > coverage.ci_width).all()
+
+
+def test_build_lag_design_matches_shift():
+    rng = np.random.RandomState(0)
+    indicators = (rng.uniform(size=(4, 20, 3)) > 0.5).astype(int)
+    reg_lag_days = [0, 1, 5, 14]
+    X = epi.build_lag_design(indicators, reg_lag_days)
+
+    assert X.shape == (4, 20, 1 + 3 * len(reg_lag_days))
+    assert (X[..., 0] == 1).all()
+    for lx, lag in enumerate(reg_lag_days):
+        shifted = np.zeros_like(indicators)
+        shifted[:, lag:] = indicators[:, : 20 - lag]
+        np.testing.assert_array_equal(X[..., 1 + 3 * lx : 1 + 3 * (lx + 1)], shifted)
+
+
+def test_build_lag_design_no_lags():
+    indicators = np.ones((4, 20, 3), dtype=int)
+    X = epi.build_lag_design(indicators, [])
+    assert X.shape == (4, 20, 1)
+    assert (X == 1).all()
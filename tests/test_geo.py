@@ -0,0 +1,120 @@
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import MultiPolygon, Point, box
+
+from src import geo as cgeo
+
+
+def test_pick_tolerance():
+    assert cgeo.pick_tolerance(0) is None
+    assert cgeo.pick_tolerance(0.001) == 0.001
+    assert cgeo.pick_tolerance(0.02) == 0.01
+    assert cgeo.pick_tolerance(1) == max(cgeo.SIMPLIFY_TOLERANCES)
+    assert cgeo.pick_tolerance(0.02, available=[0.05]) is None
+
+
+def test_load_adm_centroids(tmp_path):
+    centroids = pd.DataFrame(
+        {
+            "adm0_name": ["USA", "USA", "ITA"],
+            "adm1_name": ["Washington", "NA", "Lombardia"],
+            "latitude": [47.4, None, 45.6],
+            "longitude": [-120.5, None, 9.8],
+            "area_km2": [184827.0, None, 23863.0],
+        }
+    )
+    path = cgeo.get_centroids_path(1, adm_dir=tmp_path)
+    path.parent.mkdir()
+    centroids.to_csv(path, index=False)
+
+    pd.testing.assert_frame_equal(
+        cgeo.load_adm_centroids(1, "USA", adm_dir=tmp_path), centroids.iloc[:2]
+    )
+
+
+def make_adm1(adm_dir):
+    """Write a small full-resolution adm1 shapefile to `adm_dir`"""
+    circle = Point(10, 45).buffer(1, resolution=64)
+    islands = MultiPolygon(
+        [Point(-120, 47).buffer(0.5, resolution=32), box(-118, 46, -117.5, 46.5)]
+    )
+    gdf = gpd.GeoDataFrame(
+        {
+            "adm0_name": ["ITA", "USA", "USA"],
+            "adm1_name": ["Lombardia", "Washington", "NA"],
+            "latitude": [45.123456, 47.4, None],
+            "longitude": [9.87654321, -120.5, None],
+            "area_km2": [23863.0, 184827.0, None],
+            "population": [1e7, 7.6e6, None],
+            "geometry": [circle, islands, None],
+        },
+        crs="EPSG:4326",
+    )
+    path = cgeo.get_full_path(1, adm_dir)
+    path.parent.mkdir()
+    gdf.to_file(path)
+    return gdf
+
+
+def n_vertices(geom):
+    polygons = getattr(geom, "geoms", [geom])
+    return sum(len(p.exterior.coords) for p in polygons)
+
+
+def test_write_simplified_adm(tmp_path):
+    full = make_adm1(tmp_path)
+    tolerances = [0.01, 0.1]
+    cgeo.write_simplified_adm(1, tolerances, adm_dir=tmp_path)
+
+    cols = ["adm0_name", "adm1_name"] + cgeo.CENTROID_COLS
+    pd.testing.assert_frame_equal(
+        cgeo.load_adm_centroids(1, adm_dir=tmp_path), pd.DataFrame(full[cols])
+    )
+
+    prev_vertices = [n_vertices(g) for g in full.geometry[:2]]
+    for tolerance in tolerances:
+        simplified = gpd.read_file(cgeo.get_simplified_path(1, tolerance, tmp_path))
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(simplified.drop(columns="geometry")),
+            pd.DataFrame(full.drop(columns="geometry")),
+        )
+        assert simplified.geometry[2] is None
+        vertices = []
+        for geom, full_geom in zip(simplified.geometry[:2], full.geometry[:2]):
+            assert geom.is_valid
+            assert geom.hausdorff_distance(full_geom) <= tolerance
+            vertices.append(n_vertices(geom))
+        assert all(v < p for v, p in zip(vertices, prev_vertices))
+        prev_vertices = vertices
+
+    # the finest simplified file within the tolerance, or the full geometries
+    usa = cgeo.load_adm_geometries(
+        1, tolerance=0.05, country_code="USA", adm_dir=tmp_path
+    )
+    assert usa["adm1_name"].tolist() == ["Washington", "NA"]
+    assert n_vertices(usa.geometry[0]) == n_vertices(
+        gpd.read_file(cgeo.get_simplified_path(1, 0.01, tmp_path)).geometry[1]
+    )
+    assert (
+        cgeo.load_adm_geometries(1, adm_dir=tmp_path)
+        .geometry[0]
+        .equals(full.geometry[0])
+    )
+
+
+def test_load_adm_centroids_fallback(tmp_path):
+    full = make_adm1(tmp_path)
+    cols = ["adm0_name", "adm1_name"] + cgeo.CENTROID_COLS
+    table = pd.DataFrame(full.drop(columns="geometry"))
+    table.to_csv(cgeo.get_table_path(1, tmp_path), index=False, float_format="%.3f")
+
+    # without the centroid table, from the full-resolution shapefile
+    pd.testing.assert_frame_equal(
+        cgeo.load_adm_centroids(1, "ITA", adm_dir=tmp_path), table[cols][:1]
+    )
+
+    # without either, from the attribute table, rounded to 3 decimals
+    cgeo.get_full_path(1, tmp_path).unlink()
+    pd.testing.assert_frame_equal(
+        cgeo.load_adm_centroids(1, adm_dir=tmp_path), table[cols].round(3)
+    )
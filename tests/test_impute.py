@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import impute as cimpute
+
+
+def make_groups(rng):
+    """Interleaved groups of cumulative counts"""
+    groups = rng.permutation(np.repeat(np.arange(5), rng.integers(1, 30, 5)))
+    values = np.abs(np.cumsum(rng.integers(-3, 10, len(groups)))).astype(float)
+    return values, groups
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_by_group_matches_per_group(seed):
+    rng = np.random.default_rng(seed)
+    values, groups = make_groups(rng)
+
+    monotonic = cimpute.convert_non_monotonic_to_nan_by_group(values, groups)
+    with_gaps = np.where(rng.random(len(values)) < 0.3, np.nan, monotonic)
+    # keep at least one value in each group
+    for g in np.unique(groups):
+        with_gaps[np.flatnonzero(groups == g)[-1]] = monotonic[groups == g][-1]
+    imputed = cimpute.log_interpolate_by_group(with_gaps, groups)
+
+    for g in np.unique(groups):
+        in_group = groups == g
+        np.testing.assert_array_equal(
+            monotonic[in_group], cimpute.convert_non_monotonic_to_nan(values[in_group]),
+        )
+        np.testing.assert_array_equal(
+            imputed[in_group], cimpute.log_interpolate(with_gaps[in_group])
+        )
+
+
+def test_log_interpolate_by_group_without_values():
+    with pytest.raises(ValueError):
+        cimpute.log_interpolate_by_group([1, np.nan], ["a", "b"])
+
+
+def test_impute_cumulative_df():
+    df = pd.DataFrame(
+        {"adm": ["a", "b", "a", "a", "b", "a", "b"], "cum": [0, 5, np.nan, 3, 4, 2, 9],}
+    )
+    out = cimpute.impute_cumulative_df(df.copy(), "cum", "cum_imputed", "adm")
+    np.testing.assert_array_equal(out["cum"], [0, np.nan, np.nan, np.nan, 4, 2, 9])
+    np.testing.assert_array_equal(out["cum_imputed"], [0, 4, 0, 1, 4, 2, 9])
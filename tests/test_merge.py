@@ -0,0 +1,323 @@
+import numpy as np
+import pandas as pd
+
+from src import merge, synthetic
+from src import pop as cpop
+
+
+def assign_synthetic(tmp_path, **kwargs):
+    adm_tables, cases, policies = synthetic.make_panel_inputs(
+        3, 3, 20, n_policies=6, density=0.5
+    )
+    synthetic.write_adm_tables(adm_tables, tmp_path)
+    with synthetic.use_adm_dir(tmp_path):
+        return merge.assign_policies_to_panel(cases, policies, 2, **kwargs)
+
+
+def test_parallel_assignment_matches_sequential(tmp_path):
+    for method in ["ITA", "USA"]:
+        sequential = assign_synthetic(tmp_path, method=method)
+        parallel = assign_synthetic(tmp_path, method=method, n_jobs=3)
+        pd.testing.assert_frame_equal(sequential, parallel)
+
+
+def test_policy_interval_index():
+    _, cases, policies = synthetic.make_panel_inputs(
+        3, 3, 20, n_policies=6, density=0.5
+    )
+    rng = np.random.RandomState(0)
+    ends = policies["date_start"] + pd.to_timedelta(
+        rng.randint(0, 10, len(policies)), "D"
+    )
+    policies["date_end"] = policies["date_end"].where(
+        rng.uniform(size=len(ends)) < 0.5, ends
+    )
+
+    panel = merge.initialize_panel(cases, 2, [], [])
+    index = merge.PolicyIntervalIndex(policies, 2)
+    indexed = index.policies
+    for policy in policies["policy"].unique():
+        for _, row in panel.iterrows():
+            expected = (
+                (indexed["policy"] == policy)
+                & indexed["adm1_name"].isin(["All", "all", row["adm1_name"]])
+                & indexed["adm2_name"].isin(["All", "all", row["adm2_name"]])
+                & (indexed["date_start"] <= row["date"])
+                & (indexed["date_end"] >= row["date"])
+            )
+            unit = (row["adm1_name"], row["adm2_name"])
+            active = index.active_positions(unit, policy, row["date"])
+            np.testing.assert_array_equal(active, np.flatnonzero(expected))
+
+
+def test_repeated_adm_names(tmp_path):
+    # As with US counties, lower-level names are only unique within their parent unit
+    for cases_level in [2, 3]:
+        merged = dict()
+        for unique_names in [True, False]:
+            adm_tables, cases, policies = synthetic.make_panel_inputs(
+                3,
+                2,
+                15,
+                n_adm3=2,
+                cases_level=cases_level,
+                unique_names=unique_names,
+                n_policies=6,
+                density=0.5,
+            )
+            adm_dir = tmp_path / f"adm{cases_level}_{unique_names}"
+            synthetic.write_adm_tables(adm_tables, adm_dir)
+            with synthetic.use_adm_dir(adm_dir):
+                merged[unique_names] = merge.assign_policies_to_panel(
+                    cases, policies, cases_level, get_latlons=False, method="USA"
+                ).drop(columns=cpop.get_adm_fields(cases_level))
+        pd.testing.assert_frame_equal(merged[True], merged[False])
+
+
+def test_intensity_cache(tmp_path, monkeypatch):
+    cache_path = tmp_path / "intensities.sqlite"
+    uncached = assign_synthetic(tmp_path, method="USA")
+
+    calls = []
+    calculate = merge.calculate_intensities_batched
+
+    def counting_calculate(policies_by_state, *args, **kwargs):
+        calls.extend(policies_by_state)
+        return calculate(policies_by_state, *args, **kwargs)
+
+    monkeypatch.setattr(merge, "calculate_intensities_batched", counting_calculate)
+
+    first = assign_synthetic(tmp_path, method="USA", intensity_cache_path=cache_path)
+    n_first = len(calls)
+    assert n_first > 0
+    pd.testing.assert_frame_equal(first, uncached)
+
+    second = assign_synthetic(tmp_path, method="USA", intensity_cache_path=cache_path)
+    assert len(calls) == n_first
+    pd.testing.assert_frame_equal(second, uncached)
+
+
+def test_incremental_assignment(tmp_path):
+    for method in ["ITA", "USA"]:
+        full = assign_synthetic(tmp_path, method=method)
+        last_date = full["date"].max() - pd.Timedelta(days=5)
+        previous = full[
+            (full["date"] <= last_date) & (full["adm2_name"] != full["adm2_name"][0])
+        ]
+        incremental = assign_synthetic(tmp_path, method=method, previous_panel=previous)
+        pd.testing.assert_frame_equal(incremental, full)
+
+        # Policies missing from the previous panel are computed for all rows
+        previous = previous.drop(columns=["social_distance", "travel_ban_intl_in"])
+        incremental = assign_synthetic(tmp_path, method=method, previous_panel=previous)
+        pd.testing.assert_frame_equal(incremental, full)
+
+
+def reference_policy_level(row):
+    # Per-policy adm-level, as computed before `PolicySchema`
+    adm_levels = sorted(
+        [
+            int(col[3])
+            for col in row.keys()
+            if col.startswith("adm") and col.endswith("name")
+        ],
+        reverse=True,
+    )
+    for level in adm_levels:
+        if row[f"adm{level}_name"].lower() != "all":
+            return level
+    return 0
+
+
+def reference_intensities(policies, adm_level):
+    # Intensities of a single set of policies, as computed one set at a time before
+    # `get_intensities_batched`
+    if len(policies) == 0:
+        return (0, 0)
+
+    adm_levels = sorted(
+        [
+            int(col[3])
+            for col in policies.columns
+            if col.startswith("adm") and col.endswith("name")
+        ]
+    )
+    adm_lower_levels = [l for l in adm_levels if l <= adm_level]
+    adm_higher_levels = [l for l in adm_levels if l > adm_level]
+
+    default_policy_intensity = np.nanmax(
+        [
+            policies.loc[
+                policies["policy_level"].isin(adm_lower_levels), "policy_intensity"
+            ].max(),
+            0,
+        ]
+    )
+
+    total_intensity = default_policy_intensity
+    max_intensity = policies["policy_intensity"].max()
+
+    level2_adm_intensities = pd.DataFrame()
+    for level in adm_higher_levels:
+        if level == 3 and len(adm_higher_levels) == 2:
+            has_adm2_intensity = (policies["policy_level"] == 3) & (
+                policies["adm2_name"].isin(level2_adm_intensities.index)
+            )
+
+            policies["adm2_policy_intensity"] = 0
+            policies.loc[has_adm2_intensity, "adm2_policy_intensity"] = policies.loc[
+                has_adm2_intensity, "adm2_name"
+            ].apply(lambda x: level2_adm_intensities.loc[x, "policy_intensity"])
+
+            use_adm3_and_has_adm2 = (has_adm2_intensity) & (
+                policies["policy_intensity"] > policies["adm2_policy_intensity"]
+            )
+
+            additional_policy_intensities = (
+                policies.loc[use_adm3_and_has_adm2, "policy_intensity"]
+                - policies.loc[use_adm3_and_has_adm2, "adm2_policy_intensity"]
+            ) * (
+                policies.loc[use_adm3_and_has_adm2, f"adm3_pop"]
+                / policies.loc[use_adm3_and_has_adm2, f"adm{adm_level}_pop"]
+            )
+
+            total_intensity += additional_policy_intensities.sum()
+            policies.loc[use_adm3_and_has_adm2, "policy_intensity"] = 0
+
+        elif level == 2 and len(adm_higher_levels) == 2:
+            level2_adm_intensities = (
+                policies[policies["policy_level"] == 2]
+                .groupby("adm2_name")[["policy_intensity"]]
+                .max()
+            )
+
+        this_adm_higher_than_adm = (policies["policy_level"] == level) & (
+            policies["policy_intensity"] > default_policy_intensity
+        )
+        additional_policy_intensities = (
+            policies.loc[this_adm_higher_than_adm, "policy_intensity"]
+            - default_policy_intensity
+        ) * (
+            policies.loc[this_adm_higher_than_adm, f"adm{level}_pop"]
+            / policies.loc[this_adm_higher_than_adm, f"adm{adm_level}_pop"]
+        )
+
+        total_intensity += additional_policy_intensities.sum()
+
+    return total_intensity, max_intensity
+
+
+def test_batched_intensities(tmp_path):
+    adm_tables, cases, policies = synthetic.make_panel_inputs(
+        3, 3, 20, n_adm3=4, cases_level=1, n_policies=6, density=0.5
+    )
+    synthetic.write_adm_tables(adm_tables, tmp_path)
+    with synthetic.use_adm_dir(tmp_path):
+        policies, _ = cpop.assign_all_populations(policies, cases, 1, get_latlons=False)
+    rng = np.random.RandomState(0)
+    # policies scoped to a whole unit are coded as either "All" or "all"
+    for col in ["adm2_name", "adm3_name"]:
+        is_all = policies[col] == "All"
+        policies.loc[is_all & (rng.uniform(size=len(policies)) < 0.5), col] = "all"
+    policies["policy_level"] = merge.PolicySchema(policies).policy_level
+    np.testing.assert_array_equal(
+        policies["policy_level"], policies.apply(reference_policy_level, axis=1)
+    )
+    policies["policy_intensity"] = rng.uniform(0, 0.3, len(policies))
+
+    # sets of policies with adm1, adm2 and adm3 policies, where adm3 policies are both
+    # above and below those of their adm2
+    states = [
+        policies.iloc[np.flatnonzero(rng.uniform(size=len(policies)) < 0.3)]
+        for _ in range(20)
+    ]
+    assert any(
+        (state["policy_level"] == 2).any() and (state["policy_level"] == 3).any()
+        for state in states
+    )
+    batched = merge.get_intensities_batched(
+        pd.concat([s.assign(state=i) for i, s in enumerate(states)]), 1
+    )
+    for i, state in enumerate(states):
+        if len(state) == 0:
+            assert i not in batched.index
+        else:
+            # totals are now capped at the highest intensity of the set
+            total, max_intensity = reference_intensities(state.copy(), 1)
+            np.testing.assert_allclose(
+                batched.loc[i].values, [min(total, max_intensity), max_intensity]
+            )
+
+
+def test_intensity_population_weights():
+    # An adm1 policy, a stricter one in one of its adm2s, and policies in two adm3s
+    # of that adm2, one above the adm2 policy and one below it
+    policies = pd.DataFrame(
+        {
+            "adm0_name": "SYN",
+            "adm1_name": "Region",
+            "adm2_name": ["All", "District", "District", "District"],
+            "adm3_name": ["all", "All", "Town 1", "Town 2"],
+            "policy_intensity": [0.1, 0.3, 0.5, 0.2],
+            "adm1_pop": 1000.0,
+            "adm2_pop": [np.nan, 400.0, 400.0, 400.0],
+            "adm3_pop": [np.nan, np.nan, 100.0, 50.0],
+            "state": 0,
+        }
+    )
+    policies["policy_level"] = merge.PolicySchema(policies).policy_level
+    np.testing.assert_array_equal(policies["policy_level"], [1, 2, 3, 3])
+
+    # The adm2 policy counts beyond the adm1 policy over 40% of the population. Town 1
+    # counts beyond the adm2 policy over 10%, and Town 2 beyond the adm1 policy over 5%
+    expected = 0.1 + 0.2 * 0.4 + 0.2 * 0.1 + 0.1 * 0.05
+    intensities = merge.get_intensities_batched(policies, 1)
+    np.testing.assert_allclose(intensities.loc[0].values, [expected, 0.5])
+    np.testing.assert_allclose(
+        reference_intensities(policies.copy(), 1), [expected, 0.5]
+    )
+
+
+def test_intensity_population_caps():
+    # New York City (state 0) has more people than New York County, in which its
+    # policies are coded. Two cities (state 1) have more people together than their
+    # county, as where cities cross county borders
+    policies = pd.DataFrame(
+        {
+            "adm0_name": "USA",
+            "adm1_name": ["New York"] * 3 + ["Oklahoma"] * 2,
+            "adm2_name": ["All", "New York", "New York", "Oklahoma", "Oklahoma"],
+            "adm3_name": ["All", "New York City", "Town", "City 1", "City 2"],
+            "policy_intensity": [0.2, 0.5, 0.9, 0.6, 0.4],
+            "adm2_pop": [1.6e6, 1.6e6, 1.6e6, 8e5, 8e5],
+            "adm3_pop": [np.nan, 8.3e6, 1.6e4, 6e5, 5e5],
+            "state": [0, 0, 0, 1, 1],
+        }
+    )
+    policies["policy_level"] = merge.PolicySchema(policies).policy_level
+    intensities = merge.get_intensities_batched(policies, 2)
+
+    # New York City covers all of its county, rather than 5 times over, and the town
+    # 1% of it
+    np.testing.assert_allclose(intensities.loc[0].values, [0.2 + 0.3 + 0.007, 0.9])
+    # 0.6 * 0.75 + 0.4 * 0.625 is more than any of the policies, so it is capped
+    np.testing.assert_allclose(intensities.loc[1].values, [0.6, 0.6])
+
+
+def test_policy_schema():
+    _, _, policies = synthetic.make_panel_inputs(
+        3, 3, 20, n_adm3=4, cases_level=1, n_policies=6, density=0.5
+    )
+    policies.loc[0, "adm2_name"] = "all"
+    schema = merge.PolicySchema(policies)
+
+    assert schema.adm_levels == [0, 1, 2, 3]
+    np.testing.assert_array_equal(
+        schema.policy_level, policies.apply(merge.get_policy_level, axis=1)
+    )
+    np.testing.assert_array_equal(
+        schema.is_specified_at(2), ~policies["adm2_name"].isin(["All", "all"])
+    )
+
+    sub = schema.take([2, 0])
+    np.testing.assert_array_equal(sub.policy_level, schema.policy_level[[2, 0]])
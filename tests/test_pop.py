@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+
+from src import pop
+
+
+def write_adm1(path, populations):
+    pd.DataFrame(
+        {
+            "adm0_name": ["AAA", "AAA", "BBB"],
+            "adm1_name": ["a1", "a2", "b1"],
+            "latitude": [1.0, 2.0, 3.0],
+            "longitude": [4.0, 5.0, 6.0],
+            "population": populations,
+        }
+    ).to_csv(path, index=False)
+
+
+def test_adm_pop_registry(tmp_path):
+    registry = pop.AdmPopRegistry()
+    path = tmp_path / "adm1.csv"
+    write_adm1(path, [10, 20, 30])
+
+    pops = registry.get_pops(path, 1, "AAA", latlons=True)
+    assert list(pops.columns) == ["adm1_pop", "lat", "lon"]
+    assert pops.index.names == ["adm1_name"]
+    assert pops["adm1_pop"].to_dict() == {"a1": 10, "a2": 20}
+    assert len(registry.get_pops(path, 1, "CCC")) == 0
+
+    # lookups are cached, and callers can't modify the cached copy
+    pops.loc["a1", "adm1_pop"] = -1
+    assert registry.get_pops(path, 1, "AAA")["adm1_pop"].to_dict() == {
+        "a1": 10,
+        "a2": 20,
+    }
+
+    # changing the file invalidates the cache
+    write_adm1(path, [11, 21, 31])
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert registry.get_pops(path, 1, "BBB")["adm1_pop"].to_dict() == {"b1": 31}
+    assert registry.get_pops(path, 1, "AAA")["adm1_pop"].to_dict() == {
+        "a1": 11,
+        "a2": 21,
+    }
@@ -0,0 +1,46 @@
+import json
+
+from src import profiling
+from src.models import epi
+
+
+def run_small_sim():
+    return epi.simulate_and_regress(
+        1e5,
+        0.4,
+        [-0.1, -0.2],
+        [[], []],
+        [5, 15],
+        30,
+        4,
+        5,
+        ["I", "IR"],
+        [0],
+        [0.2],
+        10,
+        kind="SIR",
+        I0=1,
+        E0=0,
+    )
+
+
+def test_profiling_off_by_default(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV_VAR, raising=False)
+    assert "profile" not in run_small_sim().attrs
+
+
+def test_profiling_records_stages(tmp_path):
+    log_path = tmp_path / "profile.jsonl"
+    with profiling.profiling(log_path=log_path):
+        ds = run_small_sim()
+
+    records = json.loads(ds.attrs["profile"])
+    stages = [r["stage"] for r in records]
+    for stage in ["policy_dummies", "noise", "integration", "lags", "ols"]:
+        assert stage in stages
+    assert all(r["kind"] == "SIR" and r["pop"] == 1e5 for r in records)
+    assert all(r["wall_s"] >= 0 and r["cpu_s"] >= 0 for r in records)
+
+    with open(log_path) as f:
+        logged = [json.loads(l) for l in f]
+    assert logged == records
@@ -0,0 +1,39 @@
+from src import merge, pop, synthetic
+
+
+def test_policy_schema():
+    adm_tables = synthetic.make_adm_tables(3, 4, 2)
+    assert [len(adm_tables[l]) for l in [1, 2, 3]] == [3, 12, 24]
+    assert adm_tables[1]["population"].sum() == adm_tables[3]["population"].sum()
+
+    policies = synthetic.make_policies(adm_tables, 30, n_policies=20, density=2)
+    assert list(policies.columns) == synthetic.POLICY_COLUMNS
+    assert policies["policy"].nunique() == 20
+    assert set(policies["optional"]) == {"Y", "N"}
+
+    # policies are scoped at every adm-level, with "All" above the scoped level
+    levels = policies.apply(merge.get_policy_level, axis=1)
+    assert set(levels) == {0, 1, 2, 3}
+    assert (policies.loc[levels == 1, ["adm2_name", "adm3_name"]] == "All").all().all()
+
+    # only one policy per category within units below the (default adm2) cases level
+    assert not policies[levels == 3].duplicated(["adm3_name", "policy"]).any()
+
+
+def test_assign_synthetic_policies_to_panel(tmp_path):
+    adm_tables, cases, policies = synthetic.make_panel_inputs(
+        2, 3, 20, n_policies=4, density=0.5
+    )
+    synthetic.write_adm_tables(adm_tables, tmp_path)
+
+    with synthetic.use_adm_dir(tmp_path):
+        assert pop.ADM_DIR == tmp_path
+        merged = merge.assign_policies_to_panel(cases, policies, 2, method="USA")
+    assert pop.ADM_DIR != tmp_path
+
+    assert len(merged) == len(cases)
+    assert merged["population"].notnull().all()
+    for policy in policies["policy"].unique():
+        assert merged[policy].between(0, 1).all()
+        if policy not in merge.exclude_from_popweights:
+            assert merged[policy + "_popwt"].between(0, 1).all()
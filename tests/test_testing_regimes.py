@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+SCRIPT = "data/usa/add_testing_regimes_to_covidtrackingdotcom_data.py"
+
+
+def reference_testing_changes(state_data):
+    """Changes of one state, as the script computed them state by state"""
+    state_data_sorted = state_data.sort_values("date", inplace=False)
+    timeseries_state_data = pd.Series(
+        state_data_sorted["cumulative_tests"].values,
+        pd.DatetimeIndex([pd.to_datetime(x) for x in state_data_sorted["date"].values]),
+    )
+    return pd.DataFrame(
+        {
+            "pct_change": timeseries_state_data.pct_change(freq="D").values,
+            "abs_change": timeseries_state_data.diff().values,
+        },
+        index=state_data_sorted.index,
+    )
+
+
+def reference_testing_regimes(state_data, pct_chg_thresh, abs_chg_thresh):
+    """Regimes of one state, as the script computed them state by state"""
+    changes = reference_testing_changes(state_data)
+
+    testing_regimes = np.zeros(len(changes))
+    regime = 0
+    for i, (pct_change, abs_change) in enumerate(
+        zip(changes["pct_change"], changes["abs_change"])
+    ):
+        if pct_change > pct_chg_thresh and abs_change > abs_chg_thresh:
+            regime += 1
+        testing_regimes[i] = regime
+    return pd.Series(testing_regimes, index=changes.index)
+
+
+def make_states_data(seed=0):
+    """Shuffled rows of several states, with gaps in the dates and missing counts"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for state in ["Alaska", "New York", "Ohio", "Washington"]:
+        dates = pd.date_range("2020-03-01", periods=60)
+        # drop some days, including runs of consecutive days
+        dates = dates[rng.random(len(dates)) > 0.25]
+        # mostly steady growth, with occasional jumps in testing
+        daily = rng.integers(0, 100, len(dates)) * np.where(
+            rng.random(len(dates)) < 0.15, 40, 1
+        )
+        tests = np.cumsum(daily).astype(float)
+        tests[rng.random(len(dates)) < 0.15] = np.nan
+        if state == "Alaska":
+            # first counts missing, then zero
+            tests[:2] = [np.nan, 0]
+        frames.append(
+            pd.DataFrame(
+                {
+                    "adm1_name": state,
+                    "date": dates.strftime("%Y-%m-%d"),
+                    "cumulative_tests": tests,
+                }
+            )
+        )
+    states_data = pd.concat(frames, ignore_index=True)
+    return states_data.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def test_testing_regimes(load_script):
+    regimes = load_script(SCRIPT)
+    states_data = make_states_data()
+    testing_changes = regimes.get_testing_changes(states_data)
+
+    expected_changes = pd.concat(
+        [
+            reference_testing_changes(state_data)
+            for _, state_data in states_data.groupby("adm1_name")
+        ]
+    )
+    pd.testing.assert_frame_equal(
+        testing_changes[["pct_change", "abs_change"]].sort_index(),
+        expected_changes.sort_index(),
+    )
+
+    n_changes = []
+    for pct_thresh in regimes.pct_change_thresh_grid:
+        for abs_thresh in regimes.abs_change_thresh_grid:
+            expected = pd.concat(
+                [
+                    reference_testing_regimes(state_data, pct_thresh, abs_thresh)
+                    for _, state_data in states_data.groupby("adm1_name")
+                ]
+            )
+            result = regimes.calculate_testing_regimes(
+                testing_changes, pct_chg_thresh=pct_thresh, abs_chg_thresh=abs_thresh
+            )
+            pd.testing.assert_series_equal(
+                result.sort_index().astype(float),
+                expected.sort_index(),
+                check_names=False,
+            )
+            n_changes.append(result.groupby(testing_changes["adm1_name"]).max())
+
+    # the thresholds actually separate regimes
+    assert pd.concat(n_changes).nunique() > 2
+
+
+def test_sweep_testing_regimes(load_script):
+    regimes = load_script(SCRIPT)
+    testing_changes = regimes.get_testing_changes(make_states_data(seed=1))
+    pct_threshs = regimes.pct_change_thresh_grid
+    abs_threshs = regimes.abs_change_thresh_grid
+
+    sweep = regimes.sweep_testing_regimes(testing_changes, pct_threshs, abs_threshs)
+    assert sweep.index.names == ["pct_chg_thresh", "abs_chg_thresh", "adm1_name"]
+    assert len(sweep) == len(pct_threshs) * len(abs_threshs) * 4
+
+    for pct_thresh in pct_threshs:
+        for abs_thresh in abs_threshs:
+            expected = (
+                regimes.calculate_testing_regimes(
+                    testing_changes,
+                    pct_chg_thresh=pct_thresh,
+                    abs_chg_thresh=abs_thresh,
+                )
+                .groupby(testing_changes["adm1_name"])
+                .max()
+            )
+            pd.testing.assert_series_equal(
+                sweep.loc[(pct_thresh, abs_thresh)],
+                expected,
+                check_names=False,
+                check_dtype=False,
+            )
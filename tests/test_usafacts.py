@@ -0,0 +1,51 @@
+import pandas as pd
+
+
+def test_read_usafacts_counties(load_script, tmp_path, monkeypatch, capsys):
+    merge_policy_and_cases = load_script("data/usa/merge_policy_and_cases.py")
+    pd.DataFrame(
+        {
+            "adm1_name": ["Alabama", "Alabama", "Alaska"],
+            "adm2_name": ["Autauga", "Baldwin", "Kusilvak"],
+            "fips": ["01001", "01003", "02158"],
+            "population": [54571, 182265, 7459],
+        }
+    ).to_csv(tmp_path / "adm2_pop_fips.csv", index=False)
+    monkeypatch.setattr(merge_policy_and_cases, "int_data_dir", str(tmp_path))
+
+    # statewide unallocated counts (0), a county listed twice (1003), Wade Hampton
+    # Census Area (2270, now Kusilvak) and a county missing from the table (1005)
+    pd.DataFrame(
+        {
+            "countyFIPS": [0, 1001, 1003, 1003, 2270, 1005],
+            "County Name": ["Unallocated", "Autauga", "Baldwin", "Baldwin", "WH", "B"],
+            "State": ["AL", "AL", "AL", "AL", "AK", "AL"],
+            "3/1/20": [5, 1, 2, 0, 0, 9],
+            "3/2/20": [6, 3, 4, 7, 1, 9],
+        }
+    ).to_csv(tmp_path / "confirmed.csv", index=False)
+    pd.DataFrame(
+        {
+            "countyFIPS": [1001, 1003, 2270],
+            "County Name": ["Autauga", "Baldwin", "WH"],
+            "2020-03-01": [0, 0, 0],
+            "2020-03-02": [1, 2, 0],
+        }
+    ).to_csv(tmp_path / "deaths.csv", index=False)
+
+    cases = merge_policy_and_cases.read_usafacts_counties(
+        tmp_path / "confirmed.csv", tmp_path / "deaths.csv"
+    )
+    expected = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2020-03-01", "2020-03-02"] * 3),
+            "adm0_name": "USA",
+            "adm1_name": ["Alabama"] * 4 + ["Alaska"] * 2,
+            "adm2_name": ["Autauga"] * 2 + ["Baldwin"] * 2 + ["Kusilvak"] * 2,
+            "cum_confirmed_cases": [1, 3, 2, 7, 0, 1],
+            # counties missing from either file get missing counts, so these are floats
+            "cum_deaths": [0.0, 1.0, 0.0, 2.0, 0.0, 0.0],
+        }
+    )
+    pd.testing.assert_frame_equal(cases, expected)
+    assert "['01005']" in capsys.readouterr().out
@@ -0,0 +1,112 @@
+import importlib.util
+import sys
+
+import pandas as pd
+
+import src.utils as cutil
+
+PAGE = """<html><body><table><tbody>
+<tr><td>Alabama</td><td>4,903,185</td></tr>
+<tr><td>Alaska</td><td>731,545</td></tr>
+</tbody></table></body></html>"""
+
+
+def extract_pops(soup):
+    rows = cutil.table_cells(soup.table.tbody)
+    return pd.DataFrame(
+        {
+            "adm1_name": [r[0] for r in rows],
+            "population": [cutil.parse_int(r[1]) for r in rows],
+        }
+    )
+
+
+def test_get_scraped_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(cutil, "SCRAPE_CACHE", tmp_path / "cache")
+    monkeypatch.setattr(cutil, "DOWNLOAD_MANIFEST", tmp_path / "manifest.json")
+    page_path = tmp_path / "pops.html"
+    page_path.write_text(PAGE)
+    calls = []
+
+    def extract(soup):
+        calls.append(soup)
+        return extract_pops(soup)
+
+    # the page exists, so it isn't downloaded
+    expected = pd.DataFrame(
+        {"adm1_name": ["Alabama", "Alaska"], "population": [4903185, 731545]}
+    )
+    df = cutil.get_scraped_table("http://unused", page_path, extract)
+    pd.testing.assert_frame_equal(df, expected)
+
+    # cached tables are reused without parsing the page
+    df = cutil.get_scraped_table("http://unused", page_path, extract)
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(calls) == 1
+
+    # and extracted again when the page changes
+    page_path.write_text(PAGE.replace("731,545", "731,546"))
+    df = cutil.get_scraped_table("http://unused", page_path, extract)
+    assert df.population.tolist() == [4903185, 731546]
+    assert len(calls) == 2
+
+    # or when `extract` is edited
+    def extract(soup):
+        calls.append(soup)
+        return extract_pops(soup).assign(population=lambda df: df.population + 1)
+
+    df = cutil.get_scraped_table("http://unused", page_path, extract)
+    assert df.population.tolist() == [4903186, 731547]
+    assert len(calls) == 3
+
+    # or when the cache version is bumped
+    monkeypatch.setattr(cutil, "SCRAPE_CACHE_VERSION", cutil.SCRAPE_CACHE_VERSION + 1)
+    cutil.get_scraped_table("http://unused", page_path, extract)
+    assert len(calls) == 4
+
+
+EXTRACTORS = """
+import pandas as pd
+
+import src.utils as cutil
+
+
+def extract_pop_table(soup, pop_col):
+    rows = cutil.table_cells(soup.table.tbody)
+    return pd.DataFrame({"population": [cutil.parse_int(r[pop_col]) for r in rows]})
+
+
+def extract_pops(soup):
+    return extract_pop_table(soup, 0)
+"""
+
+
+def load_extractors(path, source, monkeypatch):
+    path.write_text(source)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, path.stem, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_get_scraped_table_helpers(tmp_path, monkeypatch):
+    monkeypatch.setattr(cutil, "SCRAPE_CACHE", tmp_path / "cache")
+    monkeypatch.setattr(cutil, "DOWNLOAD_MANIFEST", tmp_path / "manifest.json")
+    page_path = tmp_path / "pops.html"
+    page_path.write_text(PAGE.replace("<tr>", "<tr><td>1000</td>"))
+    extractors_path = tmp_path / "extractors.py"
+
+    extractors = load_extractors(extractors_path, EXTRACTORS, monkeypatch)
+    df = cutil.get_scraped_table("http://unused", page_path, extractors.extract_pops)
+    assert df.population.tolist() == [1000, 1000]
+
+    # editing a helper of the extractor, but not the extractor itself, extracts the
+    # table again
+    extractors = load_extractors(
+        extractors_path,
+        EXTRACTORS.replace("r[pop_col]", "r[pop_col + 2]"),
+        monkeypatch,
+    )
+    df = cutil.get_scraped_table("http://unused", page_path, extractors.extract_pops)
+    assert df.population.tolist() == [4903185, 731545]